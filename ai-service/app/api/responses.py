@@ -0,0 +1,69 @@
+"""
+Fast JSON responses for routes that return our own response models.
+
+By default FastAPI validates each returned model against the route's
+response_model before serializing it. On older FastAPI releases, and on any
+route with a custom response class, it dumps the model to a dict, validates
+that dict again and encodes it with the stdlib json module. Our routes only
+return CamelModel instances they have just built, so the validation is
+redundant.
+
+`ModelRoute` wraps each endpoint so that a returned model (or list of models)
+goes straight to `ModelJSONResponse`. That response dumps it by alias and
+encodes it with orjson. `response_model` still drives the OpenAPI schema.
+Endpoints that return a Response themselves are left alone.
+"""
+import functools
+from typing import Any, Callable
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(by_alias=True)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """orjson encoding that serializes pydantic models by alias."""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class ModelJSONResponse(JSONResponse):
+    """JSONResponse that takes models as content and encodes with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ModelRoute(APIRoute):
+    """
+    APIRoute whose endpoint results skip response_model validation.
+
+    A status code or headers set on an injected `response: Response`
+    parameter are carried over, as FastAPI does for regular returns.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        status_code = kwargs.get("status_code") or 200
+
+        @functools.wraps(endpoint)
+        async def wrapped(*args: Any, **values: Any) -> Any:
+            result = await endpoint(*args, **values)
+            if isinstance(result, Response):
+                return result
+            response = ModelJSONResponse(result, status_code=status_code)
+            for value in values.values():
+                if isinstance(value, Response):
+                    if value.status_code:
+                        response.status_code = value.status_code
+                    response.headers.update(value.headers)
+            return response
+
+        super().__init__(path, wrapped, **kwargs)
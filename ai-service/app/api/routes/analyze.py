@@ -1,15 +1,23 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime, timezone
+from fastapi import APIRouter, Header, HTTPException, Response
 import logging
-from app.models.schemas import AnalyzeRequest, AnalyzeResponse
+from app.api.responses import ModelRoute
+from app.models.schemas import AnalyzeRequest, AnalyzeResponse, AnalyzeJobResponse
+from app.services import analysis_jobs
 from app.services.content_analyzer import analyze_content
 from app.config import get_settings
+from app.utils.embedding_codec import EmbeddingFormat, format_from_accept
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/analyze", tags=["analysis"])
+router = APIRouter(prefix="/analyze", tags=["analysis"], route_class=ModelRoute)
+
+
+def _embedding_format(request: AnalyzeRequest, accept: str | None) -> EmbeddingFormat:
+    return request.embedding_format or format_from_accept(accept) or "json"
 
 
 @router.post("/content", response_model=AnalyzeResponse, response_model_by_alias=True)
-async def analyze(request: AnalyzeRequest) -> AnalyzeResponse:
+async def analyze(request: AnalyzeRequest, accept: str | None = Header(default=None)) -> AnalyzeResponse:
     """
     Full content analysis: description, tags, embedding.
     Called async by BullMQ worker after post creation.
@@ -20,10 +28,64 @@ async def analyze(request: AnalyzeRequest) -> AnalyzeResponse:
             caption=request.caption,
             post_id=request.post_id,
             creator_wallet=request.creator_wallet,
+            created_at=request.created_at,
+            embedding_format=_embedding_format(request, accept),
         )
+    except HTTPException:
+        # Upstream timeouts (504) and overload (503) keep their status
+        raise
     except Exception as e:
         # SECURITY: Log full error but only expose generic message in production
         logger.exception("Content analysis failed")
         settings = get_settings()
         detail = str(e) if settings.environment != "production" else "Content analysis service error"
         raise HTTPException(status_code=500, detail=detail)
+
+
+def _job_response(job: dict) -> AnalyzeJobResponse:
+    settings = get_settings()
+    error = job["error"]
+    if error and settings.environment == "production":
+        error = "Content analysis service error"
+    return AnalyzeJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        post_id=job["post_id"],
+        attempts=job["attempts"],
+        created_at=datetime.fromtimestamp(job["created_at"], tz=timezone.utc),
+        updated_at=datetime.fromtimestamp(job["updated_at"], tz=timezone.utc),
+        result=job["result"],
+        error=error,
+    )
+
+
+@router.post("/jobs", response_model=AnalyzeJobResponse, response_model_by_alias=True, status_code=202)
+async def submit_analysis_job(
+    request: AnalyzeRequest,
+    response: Response,
+    accept: str | None = Header(default=None),
+) -> AnalyzeJobResponse:
+    """
+    Queue a content analysis and return its job ID immediately.
+    Resubmitting a post that already has a job returns that job (200).
+    The embedding format is fixed at submission; the result is stored encoded.
+    """
+    job_request = request.model_dump(mode="json")
+    job_request["embedding_format"] = _embedding_format(request, accept)
+    try:
+        job, created = await analysis_jobs.submit(job_request)
+    except Exception:
+        logger.exception("Failed to queue analysis job")
+        raise HTTPException(status_code=500, detail="Failed to queue analysis job")
+    if not created:
+        response.status_code = 200
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=AnalyzeJobResponse, response_model_by_alias=True)
+async def get_analysis_job(job_id: str) -> AnalyzeJobResponse:
+    """Poll an analysis job; `result` is set once status is `succeeded`."""
+    job = await analysis_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from app.api.responses import ModelRoute
+from app.models.schemas import BudgetUsageResponse
+from app.services import budget
+
+router = APIRouter(prefix="/budget", tags=["budget"], route_class=ModelRoute)
+
+
+@router.get("/usage", response_model=BudgetUsageResponse, response_model_by_alias=True)
+async def get_usage() -> BudgetUsageResponse:
+    """
+    Upstream quota state per provider (Gemini models, Voyage) and request /
+    token usage per endpoint since startup.
+    """
+    return BudgetUsageResponse(**budget.usage_report())
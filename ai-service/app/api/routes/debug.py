@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.api.responses import ModelRoute
+from app.config import get_settings
+from app.models.schemas import EventLoopReport, StartupReport
+from app.utils import loop_monitor, profiler, startup
+
+router = APIRouter(prefix="/debug", tags=["debug"], route_class=ModelRoute)
+
+
+@router.get("/event-loop", response_model=EventLoopReport, response_model_by_alias=True)
+async def get_event_loop_report(limit: int = Query(default=20, ge=1, le=100)) -> EventLoopReport:
+    """
+    Event-loop lag, and the code sites that blocked the loop longer than
+    LOOP_MONITOR_SLOW_SECONDS, with stack samples of the most recent stalls.
+    """
+    return EventLoopReport(**loop_monitor.get_monitor().report(limit))
+
+
+@router.get("/startup", response_model=StartupReport, response_model_by_alias=True)
+async def get_startup_report() -> StartupReport:
+    """
+    Time to import the app, to accept connections and to be ready, with the
+    warm-up broken down by component and SDK import.
+    """
+    return StartupReport(**startup.report())
+
+
+def _check_profile_window(seconds: float) -> None:
+    settings = get_settings()
+    # Stacks expose internals; without a key the middleware lets everyone through
+    if settings.environment == "production" and not settings.internal_api_key:
+        raise HTTPException(status_code=403, detail="Profiling requires INTERNAL_API_KEY in production")
+    if seconds > settings.profiler_max_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be at most {settings.profiler_max_seconds:g}",
+        )
+
+
+@router.get("/profile/cpu", response_class=PlainTextResponse)
+async def get_cpu_profile(
+    seconds: float = Query(default=10.0, gt=0),
+    interval_ms: float = Query(default=10.0, ge=1, le=1000),
+    include_idle: bool = False,
+) -> PlainTextResponse:
+    """
+    Sample every thread's stack for `seconds` and return collapsed stacks,
+    weighted by sample count, for flamegraph.pl or speedscope.
+    """
+    _check_profile_window(seconds)
+    stacks, samples = await profiler.profile_cpu(seconds, interval_ms / 1000, include_idle)
+    return PlainTextResponse(stacks, headers={"X-Profile-Samples": str(samples)})
+
+
+@router.get("/profile/memory", response_class=PlainTextResponse)
+async def get_memory_profile(seconds: float = Query(default=10.0, gt=0)) -> PlainTextResponse:
+    """
+    Trace allocations for `seconds` and return collapsed stacks of those
+    still alive at the end, weighted by bytes.
+    """
+    _check_profile_window(seconds)
+    stacks, total = await profiler.profile_memory(seconds)
+    return PlainTextResponse(stacks, headers={"X-Profile-Bytes": str(total)})
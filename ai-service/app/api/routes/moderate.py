@@ -1,17 +1,27 @@
 from fastapi import APIRouter, HTTPException
+import asyncio
 import logging
+import time
+from app.api.responses import ModelRoute
 from app.models.schemas import (
     ModerationRequest,
     ModerationResponse,
+    ModerationBatchRequest,
+    ModerationBatchItem,
+    ModerationBatchResponse,
     HashCheckRequest,
     HashCheckResponse,
+    HashBatchCheckRequest,
+    HashBatchCheckResult,
+    HashBatchCheckResponse,
+    ModerationStatsResponse,
 )
-from app.services.moderator import moderate_content
-from app.services.database import check_blocked_hash
+from app.services.moderator import moderate_content, tier_stats
+from app.services import hash_blocklist
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/moderate", tags=["moderation"])
+router = APIRouter(prefix="/moderate", tags=["moderation"], route_class=ModelRoute)
 
 
 @router.post("/check", response_model=ModerationResponse, response_model_by_alias=True)
@@ -22,6 +32,9 @@ async def check_content(request: ModerationRequest) -> ModerationResponse:
     """
     try:
         return await moderate_content(request.image_base64, request.caption)
+    except HTTPException:
+        # Upstream timeouts (504) and overload (503) keep their status
+        raise
     except Exception as e:
         # SECURITY: Log full error but only expose generic message in production
         logger.exception("Moderation check failed")
@@ -30,18 +43,71 @@ async def check_content(request: ModerationRequest) -> ModerationResponse:
         raise HTTPException(status_code=500, detail=detail)
 
 
+@router.post("/batch", response_model=ModerationBatchResponse, response_model_by_alias=True)
+async def check_content_batch(request: ModerationBatchRequest) -> ModerationBatchResponse:
+    """
+    Moderate several images in one call (multi-image posts, bulk imports).
+    Items run concurrently up to moderation_batch_concurrency; a failure in
+    one item is reported in its `error` field and does not fail the batch.
+    """
+    start_time = time.time()
+    settings = get_settings()
+    semaphore = asyncio.Semaphore(settings.moderation_batch_concurrency)
+
+    async def run(index: int, item: ModerationRequest) -> ModerationBatchItem:
+        async with semaphore:
+            try:
+                result = await moderate_content(item.image_base64, item.caption)
+                return ModerationBatchItem(index=index, result=result)
+            except Exception as e:
+                logger.exception(f"Moderation failed for batch item {index}")
+                detail = str(e) if settings.environment != "production" else "Content moderation service error"
+                return ModerationBatchItem(index=index, error=detail)
+
+    results = await asyncio.gather(*(run(i, item) for i, item in enumerate(request.items)))
+    return ModerationBatchResponse(
+        results=list(results),
+        processing_time_ms=int((time.time() - start_time) * 1000),
+    )
+
+
 @router.post("/check-hash", response_model=HashCheckResponse, response_model_by_alias=True)
 async def check_hash(request: HashCheckRequest) -> HashCheckResponse:
     """
     Check perceptual hash against blocked content database.
     Instant response for known bad content.
     
-    This provides a fast check against previously blocked content hashes
-    stored in the Supabase blocked_content_hashes table.
+    Answered from an in-memory index of the Supabase blocked_content_hashes
+    table, so re-encoded or slightly altered copies of blocked content match
+    within a Hamming distance. `distance` reports how far the match was.
     """
-    result = await check_blocked_hash(request.image_hash)
+    result = await hash_blocklist.check_hash(request.image_hash, request.max_distance)
     return HashCheckResponse(
         known_bad=result["known_bad"],
         reason=result["reason"],
         blocked_at=result["blocked_at"],
+        distance=result["distance"],
+    )
+
+
+@router.post("/check-hash/batch", response_model=HashBatchCheckResponse, response_model_by_alias=True)
+async def check_hash_batch(request: HashBatchCheckRequest) -> HashBatchCheckResponse:
+    """
+    Check many perceptual hashes in one call. Results keep request order.
+    """
+    results = await hash_blocklist.check_hashes(request.image_hashes, request.max_distance)
+    return HashBatchCheckResponse(
+        results=[
+            HashBatchCheckResult(image_hash=image_hash, **results[image_hash])
+            for image_hash in request.image_hashes
+        ]
     )
+
+
+@router.get("/stats", response_model=ModerationStatsResponse, response_model_by_alias=True)
+async def moderation_stats() -> ModerationStatsResponse:
+    """
+    Moderation cascade statistics: decisions per tier, hit rates, mean
+    latency, and how many Gemini calls the hash/local tiers avoided.
+    """
+    return ModerationStatsResponse(**tier_stats())
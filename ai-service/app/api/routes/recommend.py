@@ -1,11 +1,13 @@
 from fastapi import APIRouter, HTTPException
 import logging
-from app.models.schemas import RecommendRequest, RecommendResponse
+from app.api.responses import ModelRoute
+from app.models.schemas import RecommendRequest, RecommendResponse, RecommendResult, SimilarPostsRequest
+from app.services import neighbors
 from app.services.recommender import recommend
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/recommend", tags=["recommendations"])
+router = APIRouter(prefix="/recommend", tags=["recommendations"], route_class=ModelRoute)
 
 
 @router.post("/feed", response_model=RecommendResponse, response_model_by_alias=True)
@@ -19,10 +21,32 @@ async def get_recommendations(request: RecommendRequest) -> RecommendResponse:
             liked_post_ids=request.liked_post_ids,
             limit=request.limit,
             exclude_seen=request.exclude_seen,
+            include_taste_profile=request.include_taste_profile,
         )
+    except HTTPException:
+        # Upstream timeouts (504) and overload (503) keep their status
+        raise
     except Exception as e:
         # SECURITY: Log full error but only expose generic message in production
         logger.exception("Recommendation generation failed")
         settings = get_settings()
         detail = str(e) if settings.environment != "production" else "Recommendation service error"
         raise HTTPException(status_code=500, detail=detail)
+
+
+@router.post("/similar", response_model=list[RecommendResult], response_model_by_alias=True)
+async def similar_posts(request: SimilarPostsRequest) -> list[RecommendResult]:
+    """
+    "More like this": posts most similar to one post, from its precomputed
+    neighbor list.
+    """
+    try:
+        similar = await neighbors.similar_posts(request.post_id, request.limit, set(request.exclude_ids))
+    except Exception as e:
+        logger.exception("Similar posts lookup failed")
+        settings = get_settings()
+        detail = str(e) if settings.environment != "production" else "Recommendation service error"
+        raise HTTPException(status_code=500, detail=detail)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return [RecommendResult(post_id=post_id, score=score, reason="Similar post") for post_id, score in similar]
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException
 import logging
+from app.api.responses import ModelRoute
 from app.models.schemas import SearchRequest, SearchResponse
 from app.services.semantic_search import search
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/search", tags=["search"])
+router = APIRouter(prefix="/search", tags=["search"], route_class=ModelRoute)
 
 
 @router.post("/semantic", response_model=SearchResponse, response_model_by_alias=True)
@@ -18,7 +19,13 @@ async def semantic_search(request: SearchRequest) -> SearchResponse:
             query=request.query,
             limit=request.limit,
             rerank=request.rerank,
+            since=request.since,
+            recency=request.recency,
+            collapse_duplicates=request.collapse_duplicates,
         )
+    except HTTPException:
+        # Upstream timeouts (504) and overload (503) keep their status
+        raise
     except Exception as e:
         # SECURITY: Log full error but only expose generic message in production
         logger.exception("Semantic search failed")
@@ -1,5 +1,7 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -9,9 +11,9 @@ class Settings(BaseSettings):
     # Voyage AI for embeddings
     voyage_api_key: str
     
-    # Qdrant vector database
-    qdrant_url: str
-    qdrant_api_key: str
+    # Qdrant vector database (not needed with VECTOR_STORE=local)
+    qdrant_url: str | None = None
+    qdrant_api_key: str | None = None
     
     # Backend service
     backend_url: str = "http://localhost:3001"
@@ -34,18 +36,201 @@ class Settings(BaseSettings):
     gemini_flash_model: str = "gemini-2.0-flash"
     gemini_pro_model: str = "gemini-1.5-pro"
     
+    # Gemini overload protection (per model): adaptive concurrency + circuit breaker
+    gemini_initial_concurrency: int = 8
+    gemini_min_concurrency: int = 1
+    gemini_max_concurrency: int = 64
+    # Calls slower than this shrink the concurrency limit
+    gemini_target_latency_seconds: float = 15.0
+    # Calls that would wait longer than this for a slot fail fast with 503
+    gemini_max_queue_seconds: float = 2.0
+    gemini_breaker_failure_threshold: int = 5
+    gemini_breaker_reset_seconds: float = 30.0
+    
+    # Upstream quotas (requests / tokens per minute) for the budget scheduler
+    gemini_flash_rpm: int = 2000
+    gemini_flash_tpm: int = 4_000_000
+    gemini_pro_rpm: int = 1000
+    gemini_pro_tpm: int = 4_000_000
+    voyage_rpm: int = 2000
+    voyage_tpm: int = 8_000_000
+    # How long a call may wait for quota before being shed with 503
+    budget_max_wait_seconds: float = 5.0
+    budget_background_max_wait_seconds: float = 30.0
+
+    # Priority scheduler in front of all upstream calls
+    scheduler_max_concurrency: int = 48
+    # Slots only the given class may use; the rest are shared by weight
+    scheduler_reserved_interactive: int = 8
+    scheduler_reserved_standard: int = 4
+    scheduler_weight_interactive: float = 8.0
+    scheduler_weight_standard: float = 4.0
+    scheduler_weight_background: float = 1.0
+    # How long a call may queue for a slot before being shed with 503
+    scheduler_max_queue_seconds: float = 5.0
+    scheduler_background_max_queue_seconds: float = 60.0
+    
+    # Async analysis jobs (SQLite queue + in-process workers)
+    analyze_job_db_path: str = "data/analyze_jobs.db"
+    analyze_job_workers: int = 2
+    analyze_job_max_attempts: int = 3
+    # Retry delay doubles per attempt, starting here
+    analyze_job_retry_base_seconds: float = 5.0
+    # Idle workers check for due retries this often
+    analyze_job_poll_seconds: float = 1.0
+    # Finished jobs are deleted after this long
+    analyze_job_retention_seconds: int = 7 * 86400
+
     # Voyage embeddings
     voyage_model: str = "voyage-3.5"
     voyage_dimensions: int = 1024
     
+    # Vector store backend: "qdrant", "local" (in-process, no Qdrant needed)
+    # or "replica" (Qdrant writes, in-process reads)
+    vector_store: Literal["qdrant", "local", "replica"] = "qdrant"
+    local_vector_store_path: str = "data/vectors"
+    # IVF index is built once the local store holds this many vectors
+    local_vector_ivf_min_points: int = 4096
+    local_vector_ivf_nprobe: int = 8
+    local_vector_snapshot_seconds: float = 60.0
+    local_vector_replica_sync_seconds: float = 600.0
+
+    # Freshness: recency-boosted scores are
+    # (1 - weight) * similarity + weight * 0.5 ** (age / half_life)
+    recency_weight: float = 0.3
+    recency_half_life_seconds: float = 259200.0
+    # Recency-boosted searches fetch this many times the limit before rescoring
+    recency_candidates: int = 3
+    # Feeds only consider posts created within this window
+    feed_window_seconds: float = 1209600.0
+
+    # Index-time near-duplicate detection (see app/services/dedup.py)
+    dedup_enabled: bool = True
+    dedup_candidates: int = 10
+    # Embedding similarity needed when the perceptual hashes also match
+    dedup_similarity_threshold: float = 0.85
+    # Embedding similarity needed when either post has no perceptual hash
+    dedup_similarity_only_threshold: float = 0.98
+    # Hamming distance per 64 bits of phash
+    dedup_phash_max_distance: int = 8
+
+    # Precomputed item-to-item neighbor lists ("more like this")
+    neighbor_index_path: str = "data/neighbors.npz"
+    neighbor_k: int = 50
+    neighbor_rebuild_seconds: float = 21600.0
+    # Memory budget for one similarity block during a full rebuild
+    neighbor_chunk_mb: int = 256
+
+    # Request tracing (see app/utils/tracing.py)
+    tracing_enabled: bool = True
+    # Share of requests exported when the caller did not send a sampled traceparent
+    trace_sample_rate: float = 0.01
+    # Sampled spans are appended here as Zipkin JSON lines ("" to disable)
+    trace_export_path: str = "data/traces.jsonl"
+    # Optional Zipkin-compatible collector, e.g. http://localhost:9411/api/v2/spans
+    trace_export_url: str = ""
+    trace_flush_seconds: float = 5.0
+    trace_buffer_size: int = 10_000
+
+    # Event-loop lag monitor (see app/utils/loop_monitor.py)
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval_seconds: float = 0.05
+    # Stalls longer than this are recorded with stack samples
+    loop_monitor_slow_seconds: float = 0.1
+    loop_monitor_history: int = 100
+    # Upper bound on GET /api/debug/profile/* windows (see app/utils/profiler.py)
+    profiler_max_seconds: float = 60.0
+
     # Qdrant collection
     qdrant_collection: str = "solshare_posts"
+    # "scalar" (int8), "binary" or "none". Quantized vectors stay in RAM and
+    # the float32 originals go to disk, used only to rescore candidates.
+    qdrant_quantization: Literal["none", "scalar", "binary"] = "scalar"
+    qdrant_vectors_on_disk: bool = True
+    qdrant_hnsw_m: int = 16
+    qdrant_hnsw_ef_construct: int = 128
+    qdrant_hnsw_ef: int = 128
+    # Fetch limit * oversampling candidates from the quantized index, then
+    # rescore them with the original vectors
+    qdrant_oversampling: float = 2.0
+    qdrant_rescore: bool = True
+    # New collections get a "coarse" named vector with this many leading
+    # dimensions of the embedding (0 = single full vector). Searches retrieve
+    # limit * qdrant_coarse_candidates points on it, then rescore with "full".
+    qdrant_coarse_dimensions: int = 256
+    qdrant_coarse_candidates: int = 4
 
     # Moderation settings
     moderation_escalation_threshold: float = 4.0
+    # Max images moderated in parallel per /moderate/batch request
+    moderation_batch_concurrency: int = 4
+
+    # Moderation cascade (hash -> local classifier -> Flash -> Pro)
+    moderation_cascade_enabled: bool = True
+    moderation_decision_cache_size: int = 50_000
+    moderation_decision_cache_ttl_seconds: float = 86400.0
+    moderation_known_hashes_max_size: int = 200_000
+    # Near-duplicates of allowed content reuse the decision within this distance
+    moderation_allow_match_max_distance: int = 4
+    # Optional local classifier as "module:function(image_bytes, caption) -> scores dict"
+    moderation_local_classifier: str | None = None
+    moderation_local_allow_max_score: float = 1.0
+    # Start the Pro call alongside Flash when escalation looks likely
+    moderation_speculative_escalation: bool = False
+
+    # Blocked hash index (Hamming distance threshold is per 64 bits of hash)
+    hash_match_max_distance: int = 6
+    blocked_hash_refresh_seconds: float = 30.0
+    blocked_hash_full_reload_seconds: float = 3600.0
+    # Exact Supabase lookup on every index miss once the index is loaded, to
+    # cover hashes blocked since the last refresh. Off by default: most checks
+    # miss, and the refresh bounds staleness to BLOCKED_HASH_REFRESH_SECONDS.
+    # Before the first load, misses are always looked up live.
+    blocked_hash_live_lookup: bool = False
+
+    # Supabase access (PostgREST over a pooled async client)
+    supabase_timeout_seconds: float = 2.0
+    supabase_breaker_failure_threshold: int = 5
+    supabase_breaker_reset_seconds: float = 30.0
+    hash_cache_max_size: int = 100_000
+    hash_cache_positive_ttl_seconds: float = 3600.0
+    hash_cache_negative_ttl_seconds: float = 30.0
+
+    # Dependency prober behind /ready (see app/services/health.py)
+    health_probe_seconds: float = 10.0
+    health_probe_timeout_seconds: float = 3.0
+    # Probes kept per dependency for the rolling error rate and latency
+    health_window: int = 30
+    health_down_after: int = 3
+    health_degraded_error_rate: float = 0.2
+    health_slow_seconds: float = 2.0
+    # Paid probes (Voyage) run only after this long without real calls, while up
+    health_idle_probe_seconds: float = 300.0
+    # Comma-separated; /ready fails while any of these is down. Gemini and
+    # Voyage outages are handled by shedding their calls instead, so a
+    # third-party incident does not pull every instance out of rotation
+    ready_required_dependencies: str = "vector_store"
+
+    # Admission control (see app/utils/admission.py); per-route caps are CONCURRENCY_LIMITS in main
+    admission_enabled: bool = True
+    admission_max_in_flight: int = 256
+    # Request bodies in flight, by Content-Length; bounds memory under image bursts
+    admission_max_body_bytes: int = 256 * 1024 * 1024
+    # Assumed size of a body sent without Content-Length (chunked)
+    admission_default_body_bytes: int = 1024 * 1024
+    # CoDel: queue time allowed once a standing queue has lasted one interval
+    admission_target_queue_seconds: float = 0.1
+    admission_interval_seconds: float = 0.5
+    admission_max_queue_seconds: float = 2.0
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
+    @model_validator(mode="after")
+    def _require_qdrant(self) -> "Settings":
+        if self.vector_store != "local" and not self.qdrant_url:
+            raise ValueError("QDRANT_URL is required unless VECTOR_STORE=local")
+        return self
+
 
 @lru_cache
 def get_settings() -> Settings:
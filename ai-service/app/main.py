@@ -1,15 +1,27 @@
+# First, so the startup report's import timer covers the rest of the app
+from app.utils import startup
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from contextlib import asynccontextmanager
 from collections import defaultdict
+import asyncio
 import logging
 import time
 
-from app.api.routes import moderate, analyze, search, recommend
-from app.services import vector_db
+from app.api.routes import moderate, analyze, search, recommend, budget, debug
+from app.services import vector_db, hash_blocklist, database, analysis_jobs, neighbors, health
 from app.config import get_settings
+from app.utils import admission, loop_monitor, metrics, tracing
+from app.utils.errors import UpstreamUnavailableError
+from app.utils.limiter import OverloadedError
+from app.utils.request_context import (
+    PRIORITY_HEADER,
+    current_endpoint,
+    current_priority,
+    priority_for_request,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -59,10 +71,30 @@ rate_limiter = RateLimiter()
 # Rate limits per endpoint (requests per minute)
 RATE_LIMITS = {
     "/api/moderate": 10,
+    "/api/moderate/batch": 10,
+    "/api/moderate/check-hash/batch": 60,
     "/api/analyze": 5,
+    "/api/analyze/jobs": 30,
     "/api/search": 20,
     "/api/recommend": 20,
+    "/api/recommend/similar": 60,
+}
+
+
+# Requests in flight per route, on top of ADMISSION_MAX_IN_FLIGHT, so a burst
+# on one route cannot take every slot. Memory is bounded separately by the
+# body-byte budget; routes that carry images or fan out get the tightest caps
+CONCURRENCY_LIMITS = {
+    "/api/analyze/content": 32,
+    "/api/analyze/jobs": 32,
+    "/api/moderate/check": 64,
+    "/api/moderate/batch": 8,
+    "/api/search/semantic": 64,
+    "/api/recommend/feed": 64,
+    "/api/recommend/similar": 128,
 }
+# Never queued or shed: probes, scrapes and diagnostics must answer under load
+ADMISSION_EXEMPT_PATHS = {"/health", "/ready", "/metrics"}
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
@@ -88,17 +120,143 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         return await call_next(request)
 
 
+class AdmissionMiddleware(BaseHTTPMiddleware):
+    """
+    Admits a request only when there is room for it in flight, before its
+    body is read; otherwise it queues briefly or gets a fast 503 with
+    Retry-After. See app.utils.admission.
+    """
+    async def dispatch(self, request: Request, call_next):
+        settings = get_settings()
+        path = request.url.path
+        if (
+            not settings.admission_enabled
+            or request.method == "OPTIONS"
+            or path in ADMISSION_EXEMPT_PATHS
+            or path.startswith("/api/debug/")
+        ):
+            return await call_next(request)
+
+        # Uncapped routes share one key, so arbitrary paths add no state or series
+        route = path if path in CONCURRENCY_LIMITS else "other"
+        length = request.headers.get("content-length")
+        if length is not None and length.isdigit():
+            size = int(length)
+        elif request.method in ("POST", "PUT", "PATCH"):
+            size = settings.admission_default_body_bytes
+        else:
+            size = 0
+
+        controller = admission.get_controller(CONCURRENCY_LIMITS)
+        try:
+            async with controller.slot(route, size):
+                return await call_next(request)
+        except OverloadedError as e:
+            logger.warning(f"Shedding {request.method} {path}: {e}")
+            error = UpstreamUnavailableError("Service is overloaded. Please try again later.", e.retry_after)
+            return JSONResponse(status_code=503, content={"detail": error.detail}, headers=error.headers)
+
+
+class RequestContextMiddleware(BaseHTTPMiddleware):
+    """
+    Records the route and its priority class in contextvars so upstream
+    clients can account cost per endpoint and prioritise interactive work.
+    An X-Priority header (interactive, standard, background) overrides the
+    route's default class.
+    """
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        current_endpoint.set(path)
+        current_priority.set(priority_for_request(path, request.headers.get(PRIORITY_HEADER)))
+        return await call_next(request)
+
+
+def route_template(scope: dict) -> str:
+    """
+    The matched route's template, e.g. /api/analyze/jobs/{job_id}, rebuilt
+    from the path and its path params once routing has run. Unmatched paths
+    share one label so scanners cannot blow up the series count.
+    """
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope["path"]
+    params = scope.get("path_params")
+    if not params:
+        return path
+    names = {str(value): name for name, value in params.items()}
+    return "/".join(f"{{{names[s]}}}" if s in names else s for s in path.split("/"))
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """
+    Starts a trace per request from the caller's traceparent / X-Request-ID,
+    answers with a Server-Timing breakdown of its spans and echoes the
+    request ID. See app.utils.tracing.
+    """
+    async def dispatch(self, request: Request, call_next):
+        if not get_settings().tracing_enabled:
+            return await call_next(request)
+        request_id = request.headers.get(tracing.REQUEST_ID_HEADER)
+        trace = tracing.start_trace(
+            f"{request.method} {request.url.path}",
+            request.headers.get(tracing.TRACEPARENT_HEADER),
+            request_id,
+        )
+        tracing.current_trace.set(trace)
+        tracing.current_span.set(trace.root)
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            trace.root.name = f"{request.method} {route_template(request.scope)}"
+            tracing.finish_trace(
+                trace,
+                status=status,
+                request_bytes=request.headers.get("content-length", 0),
+            )
+        response.headers["Server-Timing"] = tracing.server_timing(trace)
+        if request_id:
+            response.headers[tracing.REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """
+    Records request count, latency and in-flight requests per route.
+    """
+    async def dispatch(self, request: Request, call_next):
+        in_flight = metrics.gauge("http_requests_in_flight")
+        in_flight.inc()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            in_flight.dec()
+            path = route_template(request.scope)
+            metrics.histogram("http_request_seconds", route=path).observe(time.perf_counter() - start)
+            metrics.counter("http_requests_total", route=path, method=request.method, status=str(status)).inc()
+
+
+# Paths reachable without the internal API key
+UNAUTHENTICATED_PATHS = {"/health", "/ready", "/metrics"}
+
+
 class InternalAPIKeyMiddleware(BaseHTTPMiddleware):
     """
     SECURITY: Validates internal API key for service-to-service communication.
     This prevents unauthorized access if the internal network is compromised.
-    Health check is excluded to allow orchestrators to verify service status.
+    Health checks and metrics are excluded so orchestrators and Prometheus can
+    reach them.
     """
     async def dispatch(self, request: Request, call_next):
         settings = get_settings()
         
-        # Skip auth for health check endpoint (needed for orchestration)
-        if request.url.path == "/health":
+        # Skip auth for health checks and metrics endpoints (needed for orchestration)
+        if request.url.path in UNAUTHENTICATED_PATHS:
             return await call_next(request)
         
         # In production, require internal API key
@@ -115,8 +273,28 @@ class InternalAPIKeyMiddleware(BaseHTTPMiddleware):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await vector_db.ensure_collection()
+    # Nothing here waits on an upstream; SDK imports and the Qdrant round trip
+    # happen in the warm-up, and tasks that need them start after it
+    warm_up_task = asyncio.create_task(startup.warm_up())
+    vector_task = asyncio.create_task(startup.after_warm_up(vector_db.run_background))
+    blocklist_task = asyncio.create_task(hash_blocklist.run_refresh_loop())
+    jobs_task = asyncio.create_task(startup.after_warm_up(analysis_jobs.run_workers))
+    neighbors_task = asyncio.create_task(startup.after_warm_up(neighbors.run_rebuild_loop))
+    trace_task = asyncio.create_task(tracing.run_exporter())
+    loop_monitor_task = asyncio.create_task(loop_monitor.run())
+    health_task = asyncio.create_task(startup.after_warm_up(health.run_prober))
+    startup.mark("serving")
     yield
+    warm_up_task.cancel()
+    health_task.cancel()
+    loop_monitor_task.cancel()
+    trace_task.cancel()
+    blocklist_task.cancel()
+    jobs_task.cancel()
+    neighbors_task.cancel()
+    vector_task.cancel()
+    await vector_db.close()
+    await database.close()
 
 
 app = FastAPI(
@@ -136,21 +314,62 @@ app.add_middleware(
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["POST", "GET"],  # Only allow methods actually used by the service
-    allow_headers=["Content-Type", "Authorization", "X-Internal-API-Key"],
+    allow_headers=[
+        "Content-Type",
+        "Authorization",
+        "X-Internal-API-Key",
+        PRIORITY_HEADER,
+        tracing.TRACEPARENT_HEADER,
+        tracing.REQUEST_ID_HEADER,
+    ],
 )
 
+# Admission control, inside auth and rate limiting so rejected callers never take a slot
+app.add_middleware(AdmissionMiddleware)
+
 # Add internal API key authentication middleware
 app.add_middleware(InternalAPIKeyMiddleware)
 
 # Add rate limiting middleware
 app.add_middleware(RateLimitMiddleware)
 
+# Request context for priority and cost accounting
+app.add_middleware(RequestContextMiddleware)
+
+# Request metrics, so rate-limited and rejected requests are counted too
+app.add_middleware(MetricsMiddleware)
+
+# Outermost: tracing, so the root span and Server-Timing cover the whole request
+app.add_middleware(TracingMiddleware)
+
 app.include_router(moderate.router, prefix="/api")
 app.include_router(analyze.router, prefix="/api")
 app.include_router(search.router, prefix="/api")
 app.include_router(recommend.router, prefix="/api")
+app.include_router(budget.router, prefix="/api")
+app.include_router(debug.router, prefix="/api")
 
 
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up and its event loop answers."""
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: warm-up has finished and no required dependency is down.
+    Served from the prober's cached state (app/services/health.py).
+    """
+    status_code, body = health.readiness()
+    return JSONResponse(status_code=status_code, content=body)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# Last line of the module: everything above, routes included, is import time
+startup.mark("imported")
@@ -1,6 +1,16 @@
-from pydantic import BaseModel, Field, ConfigDict, field_validator
+from pydantic import BaseModel, Field, ConfigDict, field_validator, model_validator
 from typing import Literal
+from datetime import datetime
 import re
+from app.utils.embedding_codec import EmbeddingFormat
+
+# 50MB max image = ~67M chars in base64 encoding
+MAX_IMAGE_BASE64_CHARS = 67_000_000
+
+# Batch limits: a batch may carry several images but no more bytes in total
+# than a single max-size upload, so request body limits stay the same.
+MAX_MODERATION_BATCH_ITEMS = 10
+MAX_HASH_BATCH_ITEMS = 500
 
 
 def to_camel(string: str) -> str:
@@ -22,8 +32,7 @@ class ModerationScores(CamelModel):
 
 
 class ModerationRequest(BaseModel):
-    # 50MB max image = ~67M chars in base64 encoding
-    image_base64: str = Field(..., max_length=67_000_000)
+    image_base64: str = Field(..., max_length=MAX_IMAGE_BASE64_CHARS)
     caption: str | None = Field(default=None, max_length=10_000)
     wallet: str | None = None
 
@@ -36,24 +45,91 @@ class ModerationResponse(CamelModel):
     processing_time_ms: int
     blocked_category: str | None = None
     violation_id: str | None = None
+    # Cascade tier that produced the decision
+    tier: Literal["hash", "local", "flash", "pro"] | None = None
+
+
+class ModerationBatchRequest(BaseModel):
+    items: list[ModerationRequest] = Field(..., min_length=1, max_length=MAX_MODERATION_BATCH_ITEMS)
+
+    @model_validator(mode='after')
+    def validate_total_size(self) -> "ModerationBatchRequest":
+        """Cap the whole batch at the size of one max-size image."""
+        total = sum(len(item.image_base64) for item in self.items)
+        if total > MAX_IMAGE_BASE64_CHARS:
+            raise ValueError(f'total image_base64 size must not exceed {MAX_IMAGE_BASE64_CHARS} characters')
+        return self
+
+
+class ModerationBatchItem(CamelModel):
+    index: int
+    result: ModerationResponse | None = None
+    error: str | None = None
+
+
+class ModerationBatchResponse(CamelModel):
+    results: list[ModerationBatchItem]
+    processing_time_ms: int
+
+
+class ModerationTierStats(CamelModel):
+    decisions: int
+    hit_rate: float
+    mean_latency_ms: float
+
+
+class ModerationStatsResponse(CamelModel):
+    total: int
+    tiers: dict[str, ModerationTierStats]
+    gemini_calls_avoided: int
+
+
+def validate_hex_hash(v: str) -> str:
+    """Validate that an image hash contains only hexadecimal characters."""
+    if not re.fullmatch(r'[a-fA-F0-9]+', v):
+        raise ValueError('image_hash must contain only hexadecimal characters')
+    return v.lower()
 
 
 class HashCheckRequest(BaseModel):
     image_hash: str = Field(..., min_length=16, max_length=128)
+    # Hamming distance per 64 bits of hash; defaults to hash_match_max_distance
+    max_distance: int | None = Field(default=None, ge=0, le=16)
 
     @field_validator('image_hash')
     @classmethod
     def validate_hex_format(cls, v: str) -> str:
         """Validate that image_hash contains only hexadecimal characters."""
-        if not re.fullmatch(r'[a-fA-F0-9]+', v):
-            raise ValueError('image_hash must contain only hexadecimal characters')
-        return v.lower()
+        return validate_hex_hash(v)
 
 
 class HashCheckResponse(CamelModel):
     known_bad: bool
     reason: str | None = None
     blocked_at: str | None = None
+    distance: int | None = None
+
+
+class HashBatchCheckRequest(BaseModel):
+    image_hashes: list[str] = Field(..., min_length=1, max_length=MAX_HASH_BATCH_ITEMS)
+    max_distance: int | None = Field(default=None, ge=0, le=16)
+
+    @field_validator('image_hashes')
+    @classmethod
+    def validate_hex_format(cls, v: list[str]) -> list[str]:
+        """Validate each hash is 16-128 hexadecimal characters."""
+        for image_hash in v:
+            if not 16 <= len(image_hash) <= 128:
+                raise ValueError('each image_hash must be 16-128 characters')
+        return [validate_hex_hash(image_hash) for image_hash in v]
+
+
+class HashBatchCheckResult(HashCheckResponse):
+    image_hash: str
+
+
+class HashBatchCheckResponse(CamelModel):
+    results: list[HashBatchCheckResult]
 
 
 class AnalyzeRequest(BaseModel):
@@ -61,6 +137,11 @@ class AnalyzeRequest(BaseModel):
     caption: str | None = Field(default=None, max_length=10_000)
     post_id: str | None = None
     creator_wallet: str | None = None
+    # When the post was created; defaults to when it is analysed
+    created_at: datetime | None = None
+    # How to return the embedding (see app/utils/embedding_codec.py); overrides
+    # an `embedding=` parameter on the Accept header. Defaults to "json".
+    embedding_format: EmbeddingFormat | None = None
 
 
 class AnalyzeResponse(CamelModel):
@@ -73,12 +154,34 @@ class AnalyzeResponse(CamelModel):
     safety_score: float
     alt_text: str
     embedding: list[float] | None = None
+    # Set instead of `embedding` for the "f32" / "f16" embedding formats
+    embedding_base64: str | None = None
+    embedding_encoding: Literal["f32", "f16"] | None = None
+    # Post this one was found to be a near-duplicate of, when indexed
+    duplicate_of: str | None = None
+
+
+class AnalyzeJobResponse(CamelModel):
+    job_id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    post_id: str | None = None
+    attempts: int = 0
+    created_at: datetime
+    updated_at: datetime
+    result: AnalyzeResponse | None = None
+    error: str | None = None
 
 
 class SearchRequest(BaseModel):
     query: str
     limit: int = Field(default=50, le=100)
     rerank: bool = True
+    # Only posts created at or after this time
+    since: datetime | None = None
+    # Rank fresher posts higher
+    recency: bool = False
+    # Return only the best post of each near-duplicate cluster
+    collapse_duplicates: bool = True
 
 
 class SearchResult(CamelModel):
@@ -86,6 +189,7 @@ class SearchResult(CamelModel):
     score: float
     description: str | None = None
     creator_wallet: str | None = None
+    cluster_id: str | None = None
 
 
 class SearchResponse(CamelModel):
@@ -98,6 +202,14 @@ class RecommendRequest(BaseModel):
     liked_post_ids: list[str] = []
     limit: int = Field(default=50, le=100)
     exclude_seen: list[str] = []
+    # Skip the LLM taste profile and serve from neighbor lists only
+    include_taste_profile: bool = True
+
+
+class SimilarPostsRequest(BaseModel):
+    post_id: str
+    limit: int = Field(default=20, le=100)
+    exclude_ids: list[str] = []
 
 
 class RecommendResult(CamelModel):
@@ -109,3 +221,70 @@ class RecommendResult(CamelModel):
 class RecommendResponse(CamelModel):
     recommendations: list[RecommendResult]
     taste_profile: str | None = None
+
+
+class BlockingSite(CamelModel):
+    site: str
+    count: int
+    total_ms: float
+    max_ms: float
+
+
+class SlowCallbackReport(CamelModel):
+    started_at: float
+    duration_ms: float
+    task: str | None = None
+    site: str | None = None
+    # Stack samples taken during the stall, frames innermost last
+    samples: list[list[str]] = []
+
+
+class EventLoopReport(CamelModel):
+    interval_ms: float
+    threshold_ms: float
+    mean_lag_ms: float
+    max_lag_ms: float
+    slow_callbacks: int
+    sites: list[BlockingSite]
+    recent: list[SlowCallbackReport]
+
+
+class StartupComponent(CamelModel):
+    ready: bool
+    ms: float | None = None
+    attempts: int = 0
+    error: str | None = None
+
+
+class StartupReport(CamelModel):
+    ready: bool
+    # Milliseconds from the start of the app import to each phase
+    import_ms: float | None = None
+    serving_ms: float | None = None
+    ready_ms: float | None = None
+    components: dict[str, StartupComponent]
+    # SDK imports done by the warm-up, and heavy modules still not imported
+    imports_ms: dict[str, float]
+    deferred_modules: list[str]
+
+
+class ProviderBudgetStatus(CamelModel):
+    provider: str
+    rpm_limit: int
+    tpm_limit: int
+    available_requests: int
+    available_tokens: int
+    queued: int
+
+
+class EndpointUsage(CamelModel):
+    endpoint: str
+    provider: str
+    requests: int
+    estimated_tokens: int
+    tokens: int
+
+
+class BudgetUsageResponse(CamelModel):
+    providers: list[ProviderBudgetStatus]
+    endpoints: list[EndpointUsage]
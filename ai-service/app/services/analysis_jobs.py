@@ -0,0 +1,311 @@
+"""
+Durable job queue for content analysis.
+
+`/api/analyze/content` holds the HTTP connection open for the whole download,
+Gemini, Voyage and Qdrant pipeline. When that outlives the backend's timeout
+the work is lost and repeated. In job mode the request is written to a local
+SQLite queue and answered immediately with a job ID. In-process workers run
+the pipeline, and the caller polls for the result.
+
+- Jobs survive restarts: anything left `running` by a crash is requeued on
+  startup.
+- Submissions are idempotent on post_id. A post that already has a queued,
+  running or finished job gets that job back instead of a new one. Only a
+  failed job is requeued.
+- Failures are retried with exponential backoff up to the configured number
+  of attempts. Client errors (4xx, or a URI rejected by SSRF checks) are
+  not retried.
+- Finished jobs are pruned after the retention period.
+
+SQLite calls are blocking, so they run in a worker thread behind a lock.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from fastapi import HTTPException
+from app.config import get_settings
+from app.services import content_analyzer
+from app.utils.image import SSRFProtectionError
+from app.utils.request_context import Priority, current_endpoint, current_priority
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyze_jobs (
+    id TEXT PRIMARY KEY,
+    post_id TEXT UNIQUE,
+    request TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    run_after REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyze_jobs_ready ON analyze_jobs (status, run_after);
+"""
+
+
+class JobStore:
+    """SQLite-backed job table. Methods are blocking; call them via to_thread."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row | None) -> dict[str, Any] | None:
+        if row is None:
+            return None
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, request: dict[str, Any]) -> tuple[dict[str, Any], bool]:
+        """Insert a job, or return the existing one for the same post_id. Returns (job, created)."""
+        now = time.time()
+        post_id = request.get("post_id")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if post_id:
+                    row = self._conn.execute(
+                        "SELECT * FROM analyze_jobs WHERE post_id = ?", (post_id,)
+                    ).fetchone()
+                    if row is not None and row["status"] != FAILED:
+                        self._conn.execute("COMMIT")
+                        return self._to_dict(row), False
+                    if row is not None:
+                        # Resubmitting a failed post starts it over
+                        self._conn.execute(
+                            "UPDATE analyze_jobs SET request = ?, status = ?, attempts = 0, result = NULL,"
+                            " error = NULL, updated_at = ?, run_after = ? WHERE id = ?",
+                            (json.dumps(request), QUEUED, now, now, row["id"]),
+                        )
+                        job = self._conn.execute(
+                            "SELECT * FROM analyze_jobs WHERE id = ?", (row["id"],)
+                        ).fetchone()
+                        self._conn.execute("COMMIT")
+                        return self._to_dict(job), True
+
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT INTO analyze_jobs (id, post_id, request, status, created_at, updated_at, run_after)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, post_id, json.dumps(request), QUEUED, now, now, now),
+                )
+                job = self._conn.execute("SELECT * FROM analyze_jobs WHERE id = ?", (job_id,)).fetchone()
+                self._conn.execute("COMMIT")
+                return self._to_dict(job), True
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM analyze_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def claim(self) -> dict[str, Any] | None:
+        """Mark the oldest runnable queued job as running and return it."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE analyze_jobs SET status = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE id = (SELECT id FROM analyze_jobs WHERE status = ? AND run_after <= ?"
+                " ORDER BY run_after LIMIT 1) RETURNING *",
+                (RUNNING, now, QUEUED, now),
+            ).fetchone()
+        return self._to_dict(row)
+
+    def complete(self, job_id: str, result: dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analyze_jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (SUCCEEDED, json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str, retry_in: float | None) -> None:
+        """Requeue the job after retry_in seconds, or mark it failed if retry_in is None."""
+        now = time.time()
+        with self._lock:
+            if retry_in is None:
+                self._conn.execute(
+                    "UPDATE analyze_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (FAILED, error, now, job_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE analyze_jobs SET status = ?, error = ?, updated_at = ?, run_after = ? WHERE id = ?",
+                    (QUEUED, error, now, now + retry_in, job_id),
+                )
+
+    def requeue_running(self) -> int:
+        """Requeue jobs a previous process left running. Returns how many."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE analyze_jobs SET status = ?, updated_at = ?, run_after = ? WHERE status = ?",
+                (QUEUED, now, now, RUNNING),
+            )
+        return cursor.rowcount
+
+    def prune(self, older_than: float) -> int:
+        """Delete finished jobs last updated before `older_than`. Returns how many."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM analyze_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (SUCCEEDED, FAILED, older_than),
+            )
+        return cursor.rowcount
+
+
+_store: JobStore | None = None
+_wakeup: asyncio.Event | None = None
+
+
+def get_store() -> JobStore:
+    global _store
+    if _store is None:
+        _store = JobStore(get_settings().analyze_job_db_path)
+    return _store
+
+
+def _get_wakeup() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+async def submit(request: dict[str, Any]) -> tuple[dict[str, Any], bool]:
+    """Queue an analysis request. Returns (job, created)."""
+    job, created = await asyncio.to_thread(get_store().submit, request)
+    if created:
+        _get_wakeup().set()
+    return job, created
+
+
+async def get_job(job_id: str) -> dict[str, Any] | None:
+    return await asyncio.to_thread(get_store().get, job_id)
+
+
+def _retry_delay(attempts: int) -> float | None:
+    settings = get_settings()
+    if attempts >= settings.analyze_job_max_attempts:
+        return None
+    return settings.analyze_job_retry_base_seconds * 2 ** (attempts - 1)
+
+
+async def run_job(job: dict[str, Any]) -> None:
+    """Run one claimed job and record its outcome."""
+    store = get_store()
+    request = job["request"]
+    # Retries can run long after submission, so default to the submission time
+    if request.get("created_at"):
+        created_at = datetime.fromisoformat(request["created_at"])
+    else:
+        created_at = datetime.fromtimestamp(job["created_at"], tz=timezone.utc)
+    try:
+        response = await content_analyzer.analyze_content(
+            content_uri=request["content_uri"],
+            caption=request.get("caption"),
+            post_id=request.get("post_id"),
+            creator_wallet=request.get("creator_wallet"),
+            created_at=created_at,
+            embedding_format=request.get("embedding_format") or "json",
+        )
+    except HTTPException as e:
+        # Client errors will fail the same way again
+        retry_in = _retry_delay(job["attempts"]) if e.status_code >= 500 else None
+        await asyncio.to_thread(store.fail, job["id"], str(e.detail), retry_in)
+        logger.warning(f"Analysis job {job['id']} failed (attempt {job['attempts']}): {e.detail}")
+    except SSRFProtectionError as e:
+        await asyncio.to_thread(store.fail, job["id"], str(e), None)
+        logger.warning(f"Analysis job {job['id']} rejected: {e}")
+    except Exception as e:
+        await asyncio.to_thread(store.fail, job["id"], str(e), _retry_delay(job["attempts"]))
+        logger.exception(f"Analysis job {job['id']} failed (attempt {job['attempts']})")
+    else:
+        await asyncio.to_thread(store.complete, job["id"], response.model_dump())
+
+
+async def _worker() -> None:
+    settings = get_settings()
+    store = get_store()
+    wakeup = _get_wakeup()
+    current_endpoint.set("/api/analyze/jobs")
+    current_priority.set(Priority.BACKGROUND)
+    while True:
+        try:
+            job = await asyncio.to_thread(store.claim)
+        except Exception:
+            logger.exception("Failed to claim analysis job")
+            job = None
+        if job is None:
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=settings.analyze_job_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await run_job(job)
+        except Exception:
+            # Recording the outcome failed; the job stays running until the
+            # next restart requeues it, but this worker keeps going
+            logger.exception(f"Failed to record outcome of analysis job {job['id']}")
+
+
+async def _pruner() -> None:
+    settings = get_settings()
+    while True:
+        try:
+            removed = await asyncio.to_thread(
+                get_store().prune, time.time() - settings.analyze_job_retention_seconds
+            )
+            if removed:
+                logger.info(f"Pruned {removed} finished analysis jobs")
+        except Exception:
+            logger.exception("Failed to prune analysis jobs")
+        await asyncio.sleep(3600)
+
+
+async def run_workers() -> None:
+    """Recover interrupted jobs and run the worker pool until cancelled."""
+    settings = get_settings()
+    requeued = await asyncio.to_thread(get_store().requeue_running)
+    if requeued:
+        logger.info(f"Requeued {requeued} interrupted analysis jobs")
+
+    tasks = [asyncio.create_task(_worker()) for _ in range(settings.analyze_job_workers)]
+    tasks.append(asyncio.create_task(_pruner()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
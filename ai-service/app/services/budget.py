@@ -0,0 +1,256 @@
+"""
+Upstream quota budgeter shared by Gemini and Voyage calls.
+
+Each provider (one per Gemini model, plus Voyage) has request-per-minute and
+token-per-minute token buckets. Callers reserve an estimated token cost
+before calling the provider; if the buckets cannot cover it the call waits in
+a priority queue, so upload-path moderation is admitted before search, and
+search before background analysis and reranking. Calls that would wait past
+their priority's deadline are shed with a 503 instead of hitting the
+provider's own rate limit.
+
+After the call the reservation is reconciled with the provider's reported
+usage; a reservation whose request was never sent is refunded in full and
+not counted. Requests / tokens / queue time are recorded per endpoint in
+app.utils.metrics.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from io import BytesIO
+from app.config import get_settings
+from app.utils import metrics
+from app.utils.errors import UpstreamUnavailableError
+from app.utils.request_context import Priority, current_endpoint, current_priority
+
+# Gemini bills images in 768x768 tiles of 258 tokens (one tile up to 384px)
+GEMINI_IMAGE_TILE_TOKENS = 258
+GEMINI_IMAGE_TILE_SIZE = 768
+# Rough text tokenization ratio used for estimates
+CHARS_PER_TOKEN = 4
+
+
+def estimate_text_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(image_bytes: bytes) -> int:
+    """Estimate Gemini image tokens from the image header (no full decode)."""
+    try:
+        from PIL import Image
+        width, height = Image.open(BytesIO(image_bytes)).size
+    except Exception:
+        return GEMINI_IMAGE_TILE_TOKENS
+    if max(width, height) <= 384:
+        return GEMINI_IMAGE_TILE_TOKENS
+    tiles = math.ceil(width / GEMINI_IMAGE_TILE_SIZE) * math.ceil(height / GEMINI_IMAGE_TILE_SIZE)
+    return tiles * GEMINI_IMAGE_TILE_TOKENS
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit / self.rate) if self.rate else math.inf
+
+
+class ProviderBudget:
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        # (priority, seq, tokens, future)
+        self._queue: list[tuple[int, int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _affordable(self, tokens: int) -> bool:
+        # A request larger than the whole bucket is admitted once it is full
+        return self.requests.level >= 1 and self.tokens.level >= min(tokens, self.tokens.capacity)
+
+    def _take(self, tokens: int) -> None:
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+    def _drain(self) -> None:
+        """Admit queued callers in priority order while the buckets allow."""
+        self._timer = None
+        self._refill()
+        while self._queue:
+            _, _, tokens, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if not self._affordable(tokens):
+                wait = max(self.requests.time_until(1), self.tokens.time_until(tokens))
+                self._timer = asyncio.get_running_loop().call_later(wait, self._drain)
+                return
+            heapq.heappop(self._queue)
+            self._take(tokens)
+            future.set_result(None)
+
+    async def acquire(self, tokens: int, priority: Priority, max_wait: float) -> None:
+        self._refill()
+        if not self._queue and self._affordable(tokens):
+            self._take(tokens)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._seq), tokens, future))
+        if self._timer is None:
+            self._drain()
+        try:
+            await asyncio.wait_for(future, timeout=max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Admitted in the same loop iteration the deadline passed
+                self.refund(tokens)
+            raise UpstreamUnavailableError(
+                f"{self.name} quota exhausted. Please try again later.",
+                retry_after=max(self.requests.time_until(1), self.tokens.time_until(tokens)),
+            ) from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller went away; give the budget back
+                self.refund(tokens)
+            raise
+
+    def refund(self, reserved: int) -> None:
+        """Give back a whole reservation whose request was never sent."""
+        self.requests.level = min(self.requests.capacity, self.requests.level + 1)
+        self.reconcile(reserved, 0)
+
+    def reconcile(self, reserved: int, actual: int) -> None:
+        """Return over-reserved tokens (or charge the shortfall)."""
+        self._refill()
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - actual)
+        if self._queue and self._timer is None:
+            self._drain()
+
+
+class Reservation:
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        # Set from the provider's usage report when available
+        self.actual_tokens: int | None = None
+        # Set by the caller just before the request goes out; a reservation
+        # released unsent (shed, breaker open, failed early) is refunded
+        self.sent = False
+
+
+_budgets: dict[str, ProviderBudget] = {}
+
+
+def _limits(provider: str) -> tuple[int, int]:
+    settings = get_settings()
+    if provider == "voyage":
+        return settings.voyage_rpm, settings.voyage_tpm
+    if provider == f"gemini:{settings.gemini_pro_model}":
+        return settings.gemini_pro_rpm, settings.gemini_pro_tpm
+    return settings.gemini_flash_rpm, settings.gemini_flash_tpm
+
+
+def get_budget(provider: str) -> ProviderBudget:
+    budget = _budgets.get(provider)
+    if budget is None:
+        rpm, tpm = _limits(provider)
+        budget = _budgets[provider] = ProviderBudget(provider, rpm, tpm)
+    return budget
+
+
+def _max_wait(priority: Priority) -> float:
+    settings = get_settings()
+    if priority >= Priority.BACKGROUND:
+        return settings.budget_background_max_wait_seconds
+    return settings.budget_max_wait_seconds
+
+
+@asynccontextmanager
+async def reserve(provider: str, tokens: int, priority: Priority | None = None):
+    """
+    Reserve budget for one upstream call.
+
+    Args:
+        provider: "gemini:<model>" or "voyage"
+        tokens: Estimated total tokens (input + max output)
+        priority: Defaults to the current request's priority class
+    """
+    if priority is None:
+        priority = current_priority.get()
+    endpoint = current_endpoint.get()
+    budget = get_budget(provider)
+
+    start = time.perf_counter()
+    await budget.acquire(tokens, priority, _max_wait(priority))
+    metrics.histogram("upstream_budget_wait_seconds", provider=provider, priority=priority.name.lower()).observe(
+        time.perf_counter() - start
+    )
+
+    reservation = Reservation(tokens)
+    try:
+        yield reservation
+    finally:
+        if reservation.sent or reservation.actual_tokens is not None:
+            # Sent but no usage report (timeout, error): charge the estimate
+            actual = reservation.actual_tokens if reservation.actual_tokens is not None else tokens
+            budget.reconcile(tokens, actual)
+            metrics.counter("upstream_requests_total", provider=provider, endpoint=endpoint).inc()
+            metrics.counter("upstream_tokens_estimated_total", provider=provider, endpoint=endpoint).inc(tokens)
+            metrics.counter("upstream_tokens_total", provider=provider, endpoint=endpoint).inc(actual)
+        else:
+            budget.refund(tokens)
+
+
+def usage_report() -> dict:
+    """Provider budget state plus cost accounting per endpoint."""
+    providers = []
+    for name, budget in sorted(_budgets.items()):
+        budget._refill()
+        providers.append({
+            "provider": name,
+            "rpm_limit": int(budget.requests.capacity),
+            "tpm_limit": int(budget.tokens.capacity),
+            "available_requests": int(budget.requests.level),
+            "available_tokens": int(budget.tokens.level),
+            "queued": budget.queued,
+        })
+
+    endpoints: dict[tuple[str, str], dict] = {}
+    for metric, field in (
+        ("upstream_requests_total", "requests"),
+        ("upstream_tokens_estimated_total", "estimated_tokens"),
+        ("upstream_tokens_total", "tokens"),
+    ):
+        for labels, counter in metrics.collect(metric).items():
+            label_map = dict(labels)
+            key = (label_map["endpoint"], label_map["provider"])
+            row = endpoints.setdefault(key, {
+                "endpoint": key[0], "provider": key[1],
+                "requests": 0, "estimated_tokens": 0, "tokens": 0,
+            })
+            row[field] = int(counter.value)
+
+    return {"providers": providers, "endpoints": sorted(endpoints.values(), key=lambda r: (r["endpoint"], r["provider"]))}
@@ -1,7 +1,16 @@
-from app.services import llm, embeddings, vector_db
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pydantic import BaseModel
+from app.services import llm, embeddings, vector_db, neighbors, dedup
 from app.models.schemas import AnalyzeResponse
-from app.utils.image import download_image, image_to_base64
+from app.utils import embedding_codec
+from app.utils.embedding_codec import EmbeddingFormat
+from app.utils.image import download_image, image_to_base64, compute_phash
 from app.config import get_settings
+from app.utils.tracing import annotate, traced
+
+logger = logging.getLogger(__name__)
 
 ANALYSIS_PROMPT = """Analyze this image for social media indexing. Provide JSON:
 {
@@ -16,30 +25,60 @@ ANALYSIS_PROMPT = """Analyze this image for social media indexing. Provide JSON:
 }"""
 
 
+class AnalysisModelOutput(BaseModel):
+    """Response schema for the Gemini analysis call."""
+    description: str = ""
+    tags: list[str] = []
+    scene_type: str = "unknown"
+    objects: list[str] = []
+    mood: str = ""
+    colors: list[str] = []
+    safety_score: float = 10
+    alt_text: str = ""
+
+
+@traced("content_analyzer.analyze_content")
 async def analyze_content(
     content_uri: str,
     caption: str | None = None,
     post_id: str | None = None,
     creator_wallet: str | None = None,
+    created_at: datetime | None = None,
+    embedding_format: EmbeddingFormat = "json",
 ) -> AnalyzeResponse:
     """Full content analysis pipeline."""
     settings = get_settings()
 
     image_bytes = await download_image(content_uri, settings.ipfs_gateway)
     image_base64 = image_to_base64(image_bytes)
+    annotate(image_bytes=len(image_bytes))
 
     prompt = ANALYSIS_PROMPT
     if caption:
         prompt += f"\n\nCaption: {caption}"
 
-    result = await llm.analyze_image(image_base64, prompt, use_thinking=False)
+    result = await llm.analyze_image(
+        image_base64, prompt, use_thinking=False, response_schema=AnalysisModelOutput
+    )
 
     description = result.get("description", "")
     embed_text = f"{description} {caption or ''}".strip()
     embedding = await embeddings.generate_embedding(embed_text)
 
+    duplicate_of = None
     if post_id:
         await vector_db.ensure_collection()
+        try:
+            phash = await asyncio.to_thread(compute_phash, image_bytes)
+        except Exception:
+            phash = None
+        try:
+            cluster = await dedup.assign_cluster(post_id, embedding, phash)
+        except Exception:
+            # Index the post as its own cluster rather than fail the analysis
+            logger.exception(f"Duplicate check failed for {post_id}")
+            cluster = dedup.ClusterAssignment(cluster_id=post_id)
+        duplicate_of = cluster.duplicate_of
         await vector_db.upsert_post(
             post_id=post_id,
             embedding=embedding,
@@ -50,9 +89,18 @@ async def analyze_content(
                 "scene_type": result.get("scene_type", "unknown"),
                 "mood": result.get("mood", ""),
                 "creator_wallet": creator_wallet,
-                "timestamp": 0,
+                # Post creation time (Unix seconds) for time-window filters and recency ranking
+                "timestamp": int((created_at or datetime.now(timezone.utc)).timestamp()),
+                "phash": phash,
+                # Canonical post of the near-duplicate cluster; search collapses on it
+                "cluster_id": cluster.cluster_id,
             },
         )
+        try:
+            await neighbors.add_post(post_id, embedding)
+        except Exception:
+            # The next full rebuild picks the post up; analysis itself succeeded
+            logger.exception(f"Failed to update neighbor lists for {post_id}")
 
     return AnalyzeResponse(
         description=description,
@@ -63,5 +111,14 @@ async def analyze_content(
         colors=result.get("colors", []),
         safety_score=result.get("safety_score", 10),
         alt_text=result.get("alt_text", ""),
-        embedding=embedding,
+        duplicate_of=duplicate_of,
+        **_embedding_fields(embedding, embedding_format),
     )
+
+
+def _embedding_fields(embedding: list[float], fmt: EmbeddingFormat) -> dict:
+    if fmt == "none":
+        return {}
+    if fmt == "json":
+        return {"embedding": embedding}
+    return {"embedding_base64": embedding_codec.encode(embedding, fmt), "embedding_encoding": fmt}
@@ -2,78 +2,230 @@
 Database service for AI service - Supabase integration.
 Used primarily for checking blocked content hashes.
 
-Note: The Supabase Python client handles connection pooling internally via httpx.
-We use a module-level singleton pattern for efficiency across requests.
+Talks to Supabase's PostgREST API through a single pooled httpx.AsyncClient so
+lookups never block the event loop. Hash lookups are cached (hits and misses
+with separate TTLs) and all calls go through a circuit breaker with a short
+timeout, so a slow Supabase degrades to "unavailable" quickly instead of
+holding requests open.
 """
-from supabase import create_client, Client
-from app.config import get_settings
-from typing import Optional
+import asyncio
 import logging
+import httpx
+from app.config import get_settings
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker
 
 logger = logging.getLogger(__name__)
 
-# Singleton Supabase client - handles connection pooling internally
-_supabase_client: Optional[Client] = None
+BLOCKED_HASHES_TABLE = "blocked_content_hashes"
+POSTS_TABLE = "posts"
+# Hashes per `in.(...)` lookup; keeps the query string well under proxy and
+# PostgREST URL limits even for 128-char hashes
+HASH_LOOKUP_CHUNK = 100
+
+
+class DatabaseUnavailableError(Exception):
+    """Raised when Supabase is not configured, failing, or the breaker is open."""
+    pass
 
 
-def get_supabase_client() -> Optional[Client]:
-    """Get or create a Supabase client. Returns None if not configured."""
-    global _supabase_client
-    
-    if _supabase_client is not None:
-        return _supabase_client
-    
+# Singleton HTTP client - pooled keep-alive connections to PostgREST
+_http_client: httpx.AsyncClient | None = None
+_breaker: CircuitBreaker | None = None
+_hash_cache: TTLCache | None = None
+
+
+def is_configured() -> bool:
     settings = get_settings()
-    
-    if not settings.supabase_url or not settings.supabase_service_role_key:
+    return bool(settings.supabase_url and settings.supabase_service_role_key)
+
+
+def _get_http_client() -> httpx.AsyncClient | None:
+    """Get or create the PostgREST client. Returns None if not configured."""
+    global _http_client
+
+    if _http_client is not None:
+        return _http_client
+
+    if not is_configured():
         logger.warning("Supabase not configured - hash check will fall back to local cache only")
         return None
-    
+
+    settings = get_settings()
+    key = settings.supabase_service_role_key
+    _http_client = httpx.AsyncClient(
+        base_url=f"{settings.supabase_url.rstrip('/')}/rest/v1",
+        headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        timeout=settings.supabase_timeout_seconds,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+    logger.info("Supabase client initialized successfully")
+    return _http_client
+
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        settings = get_settings()
+        _breaker = CircuitBreaker(
+            "supabase",
+            failure_threshold=settings.supabase_breaker_failure_threshold,
+            reset_timeout=settings.supabase_breaker_reset_seconds,
+        )
+    return _breaker
+
+
+def _get_hash_cache() -> TTLCache:
+    global _hash_cache
+    if _hash_cache is None:
+        _hash_cache = TTLCache(max_size=get_settings().hash_cache_max_size, name="blocked_hashes")
+    return _hash_cache
+
+
+async def close():
+    """Close pooled connections (called on shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def _select(table: str, params: dict) -> list[dict]:
+    """Run a PostgREST select through the circuit breaker."""
+    client = _get_http_client()
+    if client is None:
+        raise DatabaseUnavailableError("Supabase not configured")
+
+    breaker = get_breaker()
+    if not breaker.allow_request():
+        raise DatabaseUnavailableError("Supabase circuit breaker is open")
+
+    settings = get_settings()
     try:
-        _supabase_client = create_client(
-            settings.supabase_url,
-            settings.supabase_service_role_key
+        response = await asyncio.wait_for(
+            client.get(f"/{table}", params=params),
+            timeout=settings.supabase_timeout_seconds,
         )
-        logger.info("Supabase client initialized successfully")
-        return _supabase_client
-    except Exception as e:
-        logger.error(f"Failed to initialize Supabase client: {e}")
-        return None
+        response.raise_for_status()
+        rows = response.json()
+    except (asyncio.TimeoutError, httpx.HTTPError, ValueError) as e:
+        breaker.record_failure()
+        raise DatabaseUnavailableError(f"Supabase request failed: {e!r}") from e
+    except BaseException:
+        # Cancelled mid-call: no verdict on Supabase, but a half-open probe
+        # must be handed back or the breaker rejects every call from now on
+        breaker.release_probe()
+        raise
+
+    breaker.record_success()
+    return rows
+
+
+async def ping() -> None:
+    """Health probe: select one row, bypassing the breaker and cache."""
+    client = _get_http_client()
+    if client is None:
+        raise DatabaseUnavailableError("Supabase not configured")
+    response = await client.get(f"/{BLOCKED_HASHES_TABLE}", params={"select": "image_hash", "limit": "1"})
+    response.raise_for_status()
 
 
 async def check_blocked_hash(image_hash: str) -> dict:
     """
     Check if an image hash exists in the blocked_content_hashes table.
-    
+
     Returns:
         dict with keys:
         - known_bad: bool - True if hash is blocked
         - reason: str | None - Reason for block if blocked
         - blocked_at: str | None - Timestamp when blocked
+
+    Raises:
+        DatabaseUnavailableError: Supabase is not configured, slow or failing.
+        Callers should fall back to their last snapshot.
     """
-    client = get_supabase_client()
-    
-    if client is None:
-        # Supabase not configured - return not blocked
-        # The backend also checks this table directly, so this is a defense-in-depth measure
-        return {"known_bad": False, "reason": None, "blocked_at": None}
-    
-    try:
-        response = client.table("blocked_content_hashes").select(
-            "reason, created_at"
-        ).eq("image_hash", image_hash).maybe_single().execute()
-        
-        if response.data:
-            return {
+    results = await check_blocked_hashes([image_hash])
+    return results[image_hash]
+
+
+async def check_blocked_hashes(image_hashes: list[str]) -> dict[str, dict]:
+    """
+    Batch version of check_blocked_hash.
+
+    Cached answers are served locally; the rest are resolved with
+    `image_hash=in.(...)` queries of up to HASH_LOOKUP_CHUNK hashes each, run
+    concurrently. Returns a dict keyed by hash.
+    """
+    cache = _get_hash_cache()
+    results: dict[str, dict] = {}
+    missing: list[str] = []
+    for image_hash in image_hashes:
+        cached = cache.get(image_hash)
+        if cached is not None:
+            results[image_hash] = cached
+        elif image_hash not in results:
+            missing.append(image_hash)
+
+    if not missing:
+        return results
+
+    missing = list(dict.fromkeys(missing))
+    chunks = [missing[i:i + HASH_LOOKUP_CHUNK] for i in range(0, len(missing), HASH_LOOKUP_CHUNK)]
+    pages = await asyncio.gather(*(
+        _select(BLOCKED_HASHES_TABLE, {
+            "select": "image_hash,reason,blocked_at",
+            "image_hash": f"in.({','.join(chunk)})",
+        })
+        for chunk in chunks
+    ))
+    found = {row["image_hash"].lower(): row for rows in pages for row in rows if row.get("image_hash")}
+
+    settings = get_settings()
+    for image_hash in missing:
+        row = found.get(image_hash)
+        if row:
+            result = {
                 "known_bad": True,
-                "reason": response.data.get("reason"),
-                "blocked_at": response.data.get("created_at"),
+                "reason": row.get("reason"),
+                "blocked_at": row.get("blocked_at"),
             }
-        
-        return {"known_bad": False, "reason": None, "blocked_at": None}
-        
-    except Exception as e:
-        logger.error(f"Error checking blocked hash: {e}")
-        # On error, return not blocked but log the issue
-        # The backend has its own check as a fallback
-        return {"known_bad": False, "reason": None, "blocked_at": None}
+            cache.set(image_hash, result, settings.hash_cache_positive_ttl_seconds)
+        else:
+            result = {"known_bad": False, "reason": None, "blocked_at": None}
+            cache.set(image_hash, result, settings.hash_cache_negative_ttl_seconds)
+        results[image_hash] = result
+    return results
+
+
+async def fetch_blocked_hashes(since: str | None = None, limit: int = 1000, offset: int = 0) -> list[dict]:
+    """
+    Fetch a page of blocked hashes ordered by blocked_at.
+
+    Used to (re)build the in-memory blocklist index. When `since` is given only
+    rows blocked at or after that timestamp are returned, so callers can refresh
+    incrementally from a watermark.
+
+    Raises DatabaseUnavailableError so the caller can keep its previous snapshot.
+    """
+    params = {
+        "select": "image_hash,reason,blocked_at",
+        "order": "blocked_at.asc",
+        "offset": str(offset),
+        "limit": str(limit),
+    }
+    if since is not None:
+        params["blocked_at"] = f"gte.{since}"
+
+    return await _select(BLOCKED_HASHES_TABLE, params)
+
+
+async def fetch_post_timestamps(post_ids: list[str]) -> dict[str, str]:
+    """
+    Creation time (ISO 8601) of each post found, keyed by post ID. Used to
+    backfill vector payloads indexed before they carried a timestamp; pass
+    at most HASH_LOOKUP_CHUNK IDs per call.
+    """
+    if not post_ids:
+        return {}
+    rows = await _select(POSTS_TABLE, {"select": "id,timestamp", "id": f"in.({','.join(post_ids)})"})
+    return {row["id"]: row["timestamp"] for row in rows if row.get("timestamp")}
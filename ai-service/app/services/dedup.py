@@ -0,0 +1,74 @@
+"""
+Index-time near-duplicate detection.
+
+Before a post is upserted, its embedding is looked up in the vector store.
+The top DEDUP_CANDIDATES hits are then checked against the post's
+perceptual hash:
+
+- Hashes on both sides: the hit is a duplicate if the hashes are within
+  DEDUP_PHASH_MAX_DISTANCE bits (per 64) and the embedding similarity is at
+  least DEDUP_SIMILARITY_THRESHOLD. Embeddings are built from the generated
+  description and caption, so a repost with a new caption still lands among
+  the top hits. The image hash confirms that it is the same picture.
+- Hash missing on either side (older posts, undecodable images): only an
+  embedding similarity of DEDUP_SIMILARITY_ONLY_THRESHOLD or more counts.
+
+A duplicate joins the cluster of the post it matched. Otherwise the post
+starts its own cluster. The cluster ID is the post ID of the cluster's first
+post, its canonical post, and is stored in the payload as `cluster_id`
+alongside `phash`, so search can collapse a cluster to its best hit inside
+the vector store.
+"""
+from dataclasses import dataclass
+from app.config import get_settings
+from app.services import vector_db
+from app.services.hash_blocklist import scaled_distance
+from app.utils.hash_index import hamming_distance, hex_to_int
+
+
+@dataclass
+class ClusterAssignment:
+    cluster_id: str
+    # Post this one duplicates, if any
+    duplicate_of: str | None = None
+    score: float | None = None
+
+
+def phash_distance(a: str, b: str) -> int | None:
+    """Hamming distance between two hex hashes, or None if their widths differ."""
+    value_a, bits_a = hex_to_int(a)
+    value_b, bits_b = hex_to_int(b)
+    if bits_a != bits_b:
+        return None
+    return hamming_distance(value_a, value_b)
+
+
+def is_duplicate(score: float, phash: str | None, other_phash: str | None) -> bool:
+    settings = get_settings()
+    if phash and other_phash:
+        distance = phash_distance(phash, other_phash)
+        return (
+            distance is not None
+            and distance <= scaled_distance(phash, settings.dedup_phash_max_distance)
+            and score >= settings.dedup_similarity_threshold
+        )
+    return score >= settings.dedup_similarity_only_threshold
+
+
+async def assign_cluster(post_id: str, embedding: list[float], phash: str | None) -> ClusterAssignment:
+    """Find the cluster a new post belongs to (its own if it duplicates nothing)."""
+    settings = get_settings()
+    if not settings.dedup_enabled:
+        return ClusterAssignment(cluster_id=post_id)
+
+    hits = await vector_db.search_similar(embedding, limit=settings.dedup_candidates, exclude_ids=[post_id])
+    for hit in hits:
+        if hit["score"] < min(settings.dedup_similarity_threshold, settings.dedup_similarity_only_threshold):
+            break
+        if is_duplicate(hit["score"], phash, hit.get("phash")):
+            return ClusterAssignment(
+                cluster_id=hit.get("cluster_id") or hit["post_id"],
+                duplicate_of=hit["post_id"],
+                score=hit["score"],
+            )
+    return ClusterAssignment(cluster_id=post_id)
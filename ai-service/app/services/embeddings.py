@@ -1,48 +1,84 @@
-import voyageai
+import time
+from typing import TYPE_CHECKING
 from app.config import get_settings
+from app.services import budget, health, scheduler
+from app.utils.metrics import instrument
+from app.utils.request_context import Priority
 
-_client: voyageai.AsyncClient | None = None
+if TYPE_CHECKING:
+    import voyageai
 
+_client: "voyageai.AsyncClient | None" = None
 
-def get_client() -> voyageai.AsyncClient:
+
+def get_client() -> "voyageai.AsyncClient":
     global _client
     if _client is None:
+        import voyageai
+
         settings = get_settings()
         _client = voyageai.AsyncClient(api_key=settings.voyage_api_key)
     return _client
 
 
+async def _embed(texts: list[str], input_type: str) -> list[list[float]]:
+    """Embed texts through the priority scheduler and the shared Voyage quota budget."""
+    health.check_available("voyage")
+    settings = get_settings()
+    estimated = sum(budget.estimate_text_tokens(t) for t in texts)
+    async with scheduler.slot(), budget.reserve("voyage", estimated) as reservation:
+        reservation.sent = True
+        start = time.perf_counter()
+        try:
+            result = await get_client().embed(
+                texts=texts,
+                model=settings.voyage_model,
+                input_type=input_type,
+                output_dimension=settings.voyage_dimensions,
+            )
+        except Exception as e:
+            from voyageai import error as voyage_errors
+
+            # Real calls keep Voyage's health current, so it rarely needs a paid
+            # probe; a request Voyage rejected says nothing about its health
+            if not isinstance(e, (voyage_errors.InvalidRequestError, voyage_errors.MalformedRequestError)):
+                health.record("voyage", False, time.perf_counter() - start, str(e) or type(e).__name__)
+            raise
+        health.record("voyage", True, time.perf_counter() - start)
+        reservation.actual_tokens = getattr(result, "total_tokens", None)
+    return result.embeddings
+
+
+async def ping() -> None:
+    """Health probe: embed one word, charged to the Voyage budget but outside the scheduler."""
+    settings = get_settings()
+    async with budget.reserve("voyage", 1, Priority.BACKGROUND) as reservation:
+        reservation.sent = True
+        result = await get_client().embed(
+            texts=["ping"],
+            model=settings.voyage_model,
+            input_type="query",
+            output_dimension=settings.voyage_dimensions,
+        )
+        reservation.actual_tokens = getattr(result, "total_tokens", None)
+
+
+@instrument("embeddings.generate_embedding")
 async def generate_embedding(text: str) -> list[float]:
     """Generate embedding using Voyage 3.5."""
-    settings = get_settings()
-    result = await get_client().embed(
-        texts=[text],
-        model=settings.voyage_model,
-        input_type="document",
-    )
-    return result.embeddings[0]
+    return (await _embed([text], "document"))[0]
 
 
+@instrument("embeddings.generate_query_embedding")
 async def generate_query_embedding(query: str) -> list[float]:
     """Generate embedding for search query."""
-    settings = get_settings()
-    result = await get_client().embed(
-        texts=[query],
-        model=settings.voyage_model,
-        input_type="query",
-    )
-    return result.embeddings[0]
+    return (await _embed([query], "query"))[0]
 
 
+@instrument("embeddings.generate_embeddings_batch")
 async def generate_embeddings_batch(texts: list[str]) -> list[list[float]]:
     """Generate embeddings for multiple texts."""
     if not texts:
         return []
 
-    settings = get_settings()
-    result = await get_client().embed(
-        texts=texts,
-        model=settings.voyage_model,
-        input_type="document",
-    )
-    return result.embeddings
+    return await _embed(texts, "document")
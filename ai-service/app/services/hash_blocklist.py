@@ -0,0 +1,191 @@
+"""
+In-process index of the Supabase blocked_content_hashes table.
+
+The table is loaded once at startup and then refreshed incrementally using the
+blocked_at column as a watermark, so hash checks are answered locally (exact or
+Hamming-distance near match) instead of costing a Supabase round-trip each.
+Rows removed from the table are picked up by a periodic full reload.
+
+Hashes blocked since the last refresh are covered by an exact lookup in
+Supabase (cached, behind a circuit breaker). When Supabase is slow or down the
+check is served from the last snapshot alone.
+"""
+import asyncio
+import logging
+import time
+from app.config import get_settings
+from app.services import database
+from app.utils.hash_index import HashIndex
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+_index = HashIndex()
+_watermark: str | None = None
+_loaded = False
+_last_full_reload = 0.0
+_refresh_lock = asyncio.Lock()
+
+
+def is_loaded() -> bool:
+    """True once the index holds a complete snapshot of the table."""
+    return _loaded
+
+
+def size() -> int:
+    return len(_index)
+
+
+def scaled_distance(image_hash: str, max_distance: int) -> int:
+    """Scale a distance threshold expressed per 64 bits to the hash's width."""
+    bits = len(image_hash) * 4
+    return max_distance * bits // 64
+
+
+async def _fetch_since(since: str | None) -> list[dict]:
+    rows: list[dict] = []
+    offset = 0
+    while True:
+        page = await database.fetch_blocked_hashes(since, PAGE_SIZE, offset)
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+
+def _apply(index: HashIndex, rows: list[dict], watermark: str | None) -> str | None:
+    for row in rows:
+        image_hash = row.get("image_hash")
+        if not image_hash:
+            continue
+        try:
+            index.add(image_hash, {
+                "image_hash": image_hash.lower(),
+                "reason": row.get("reason"),
+                "blocked_at": row.get("blocked_at"),
+            })
+        except ValueError:
+            logger.warning(f"Skipping non-hex blocked hash: {image_hash!r}")
+            continue
+        blocked_at = row.get("blocked_at")
+        if blocked_at and (watermark is None or blocked_at > watermark):
+            watermark = blocked_at
+    return watermark
+
+
+async def refresh(full: bool = False) -> int:
+    """
+    Pull new rows from Supabase into the index.
+
+    Incremental refreshes fetch rows with blocked_at >= the current watermark
+    (re-adding rows at the boundary is idempotent). A full reload builds a new
+    index and swaps it in so deletions are reflected.
+
+    Returns the number of rows fetched.
+    """
+    global _index, _watermark, _loaded, _last_full_reload
+
+    async with _refresh_lock:
+        if full or not _loaded:
+            rows = await _fetch_since(None)
+            index = HashIndex()
+            watermark = _apply(index, rows, None)
+            _index, _watermark = index, watermark
+            _loaded = True
+            _last_full_reload = time.monotonic()
+            logger.info(f"Loaded {len(index)} blocked hashes into memory")
+        else:
+            rows = await _fetch_since(_watermark)
+            _watermark = _apply(_index, rows, _watermark)
+        return len(rows)
+
+
+async def run_refresh_loop() -> None:
+    """Background task: keep the index in sync with Supabase."""
+    settings = get_settings()
+    if not database.is_configured():
+        logger.warning("Supabase not configured - blocked hash index disabled")
+        return
+
+    while True:
+        try:
+            full_due = time.monotonic() - _last_full_reload >= settings.blocked_hash_full_reload_seconds
+            await refresh(full=full_due)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Keep serving the previous snapshot
+            logger.error(f"Blocked hash refresh failed: {e}")
+        await asyncio.sleep(settings.blocked_hash_refresh_seconds)
+
+
+async def check_hash(image_hash: str, max_distance: int | None = None, live_lookup: bool = True) -> dict:
+    """
+    Check a hash against the blocklist, allowing near matches.
+
+    Args:
+        image_hash: Lowercase hex perceptual hash
+        max_distance: Hamming distance threshold per 64 bits (defaults to settings)
+        live_lookup: Fall back to Supabase on an index miss
+
+    Returns:
+        dict with keys known_bad, reason, blocked_at, distance
+    """
+    results = await check_hashes([image_hash], max_distance, live_lookup)
+    return results[image_hash]
+
+
+async def check_hashes(
+    image_hashes: list[str],
+    max_distance: int | None = None,
+    live_lookup: bool = True,
+) -> dict[str, dict]:
+    """
+    Check many hashes at once. Index hits are answered locally; misses share
+    one exact Supabase lookup. Returns a dict keyed by hash.
+    """
+    settings = get_settings()
+    if max_distance is None:
+        max_distance = settings.hash_match_max_distance
+
+    results: dict[str, dict] = {}
+    misses: list[str] = []
+    for image_hash in image_hashes:
+        if image_hash in results:
+            continue
+        match = None
+        if _loaded:
+            match = _index.find_nearest(image_hash, scaled_distance(image_hash, max_distance))
+        if match is None:
+            results[image_hash] = {"known_bad": False, "reason": None, "blocked_at": None, "distance": None}
+            misses.append(image_hash)
+            continue
+        distance, entry = match
+        results[image_hash] = {
+            "known_bad": True,
+            "reason": entry["reason"],
+            "blocked_at": entry["blocked_at"],
+            "distance": distance,
+        }
+
+    live_lookup = live_lookup and (not _loaded or settings.blocked_hash_live_lookup)
+    if not misses or not live_lookup or not database.is_configured():
+        return results
+
+    # Exact lookup catches hashes blocked since the last refresh
+    # (or everything, if the index has not loaded yet)
+    try:
+        found = await database.check_blocked_hashes(misses)
+    except database.DatabaseUnavailableError as e:
+        # Serve from the last snapshot; the backend also checks the table directly
+        logger.warning(f"Blocked hash lookup unavailable, using snapshot: {e}")
+        return results
+
+    for image_hash, result in found.items():
+        if not result["known_bad"]:
+            continue
+        if _loaded:
+            _index.add(image_hash, {**result, "image_hash": image_hash})
+        results[image_hash] = {**result, "distance": 0}
+    return results
@@ -0,0 +1,246 @@
+"""
+Dependency health: a background prober and the cached state behind /ready.
+
+Every HEALTH_PROBE_SECONDS the prober sends each dependency its cheapest
+request, all concurrently, each with a HEALTH_PROBE_TIMEOUT_SECONDS timeout:
+
+- vector_store: collection info from Qdrant; in-process stores always pass
+- gemini: the Flash model's metadata, which costs no tokens
+- voyage: an embedding of one word, charged to the Voyage budget
+- supabase: one blocked-hash row, only when Supabase is configured
+
+Voyage has no free endpoint to probe, so it is passive: real embedding calls
+report their outcome with `record`, and the prober only calls it when it has
+been up and idle for HEALTH_IDLE_PROBE_SECONDS, or while it is not up.
+
+Each dependency keeps its last HEALTH_WINDOW probe results. From them it
+gets a rolling error rate, p50/p95 latency and a status:
+
+- down: the last HEALTH_DOWN_AFTER probes all failed
+- degraded: the window's error rate is above HEALTH_DEGRADED_ERROR_RATE, or
+  its p95 latency is above HEALTH_SLOW_SECONDS
+- up: otherwise. The status is "unknown" until the first probe.
+
+The /ready body and status are rebuilt after every probe round. Answering a
+readiness check is a dict read and never reaches an upstream, however often
+the load balancer asks. Readiness fails while startup warm-up is running, or
+while any dependency in READY_REQUIRED_DEPENDENCIES is down.
+
+The same state drives shedding. `check_available` raises
+UpstreamUnavailableError while a dependency is down. llm and embeddings call
+it before queueing for a scheduler slot, so requests fail fast with 503 and
+Retry-After instead of waiting out timeouts.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable
+from app.config import get_settings
+from app.services import database
+from app.utils import metrics, startup
+from app.utils.errors import UpstreamUnavailableError
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN, UP, DEGRADED, DOWN = "unknown", "up", "degraded", "down"
+# Exported as dependency_status; degraded sits halfway so dashboards can threshold it
+STATUS_VALUES = {UNKNOWN: 1.0, UP: 1.0, DEGRADED: 0.5, DOWN: 0.0}
+
+
+async def _probe_vector_store() -> None:
+    from app.services import vector_db
+
+    await vector_db.ping()
+
+
+async def _probe_gemini() -> None:
+    from app.services import llm
+
+    await llm.ping()
+
+
+async def _probe_voyage() -> None:
+    from app.services import embeddings
+
+    await embeddings.ping()
+
+
+PROBES: dict[str, Callable[[], Awaitable[None]]] = {
+    "vector_store": _probe_vector_store,
+    "gemini": _probe_gemini,
+    "voyage": _probe_voyage,
+    "supabase": database.ping,
+}
+# Probes that cost money; status comes from real traffic while there is some
+PASSIVE = {"voyage"}
+
+
+class Dependency:
+    def __init__(self, name: str, window: int):
+        self.name = name
+        self.status = UNKNOWN
+        # (ok, latency seconds) from probes and real calls, oldest first
+        self.results: deque[tuple[bool, float]] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.checked_at: float | None = None
+        self._recorded_at = 0.0
+        self.last_error: str | None = None
+        self.error_rate = 0.0
+        self.p50 = 0.0
+        self.p95 = 0.0
+
+    def record(self, ok: bool, latency: float, error: str | None = None) -> None:
+        settings = get_settings()
+        self.results.append((ok, latency))
+        self.checked_at = time.time()
+        self._recorded_at = time.monotonic()
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error
+
+        latencies = sorted(latency for _, latency in self.results)
+        self.p50 = latencies[(len(latencies) - 1) // 2]
+        self.p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.error_rate = sum(1 for ok, _ in self.results if not ok) / len(self.results)
+        if self.consecutive_failures >= settings.health_down_after:
+            self.status = DOWN
+        elif self.error_rate > settings.health_degraded_error_rate or self.p95 > settings.health_slow_seconds:
+            self.status = DEGRADED
+        else:
+            self.status = UP
+
+    def needs_probe(self) -> bool:
+        if self.name not in PASSIVE or self.status != UP:
+            return True
+        return time.monotonic() - self._recorded_at >= get_settings().health_idle_probe_seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "errorRate": round(self.error_rate, 4),
+            "p50Ms": round(self.p50 * 1000, 1),
+            "p95Ms": round(self.p95 * 1000, 1),
+            "probes": len(self.results),
+            "checkedAt": self.checked_at,
+            "lastError": self.last_error,
+        }
+
+
+_dependencies: dict[str, Dependency] = {}
+# (status code, body) served by /ready; rebuilt after each probe round
+_snapshot: tuple[int, dict] | None = None
+
+
+def _required() -> set[str]:
+    return {name.strip() for name in get_settings().ready_required_dependencies.split(",") if name.strip()}
+
+
+def dependencies() -> dict[str, Dependency]:
+    if not _dependencies:
+        window = get_settings().health_window
+        for name in PROBES:
+            if name == "supabase" and not database.is_configured():
+                continue
+            _dependencies[name] = Dependency(name, window)
+    return _dependencies
+
+
+def _rebuild_snapshot() -> None:
+    global _snapshot
+    required = _required()
+    failing = sorted(n for n, d in dependencies().items() if n in required and d.status == DOWN)
+    body = {
+        "status": "unavailable" if failing else "ready",
+        "dependencies": {name: d.to_dict() for name, d in dependencies().items()},
+    }
+    if failing:
+        body["failing"] = failing
+    _snapshot = (503 if failing else 200, body)
+
+
+def readiness() -> tuple[int, dict]:
+    """Status code and body for /ready, from cached state."""
+    if not startup.is_ready():
+        components = {name: c.ready for name, c in startup.components().items()}
+        return 503, {"status": "starting", "components": components}
+    if _snapshot is None:
+        _rebuild_snapshot()
+    return _snapshot
+
+
+def status(name: str) -> str:
+    dependency = _dependencies.get(name)
+    return dependency.status if dependency is not None else UNKNOWN
+
+
+def check_available(name: str) -> None:
+    """Shed calls to a dependency the prober has marked down."""
+    if status(name) == DOWN:
+        raise UpstreamUnavailableError(
+            f"{name} is unavailable. Please try again later.",
+            retry_after=get_settings().health_probe_seconds,
+        )
+
+
+def _record(dependency: Dependency, ok: bool, latency: float, error: str | None = None) -> None:
+    before = dependency.status
+    dependency.record(ok, latency, error)
+    metrics.gauge("dependency_status", dependency=dependency.name).set(STATUS_VALUES[dependency.status])
+    if dependency.status != before and (before, dependency.status) != (UNKNOWN, UP):
+        log = logger.info if dependency.status == UP else logger.warning
+        log(
+            f"Dependency {dependency.name} is {dependency.status}"
+            f" (error rate {dependency.error_rate:.0%}, p95 {dependency.p95 * 1000:.0f} ms)"
+        )
+
+
+def record(name: str, ok: bool, latency: float, error: str | None = None) -> None:
+    """Report the outcome of a real call to a passive dependency."""
+    dependency = dependencies().get(name)
+    if dependency is not None:
+        _record(dependency, ok, latency, error[:200] if error else None)
+
+
+async def _probe(dependency: Dependency, timeout: float) -> None:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(PROBES[dependency.name](), timeout=timeout)
+    except asyncio.CancelledError:
+        raise
+    except UpstreamUnavailableError:
+        # Shed locally (e.g. no budget left): says nothing about the dependency
+        return
+    except Exception as e:
+        latency = time.perf_counter() - start
+        error = "timeout" if isinstance(e, asyncio.TimeoutError) else (str(e) or type(e).__name__)
+        metrics.counter("dependency_probe_failures_total", dependency=dependency.name).inc()
+        _record(dependency, False, latency, error[:200])
+    else:
+        latency = time.perf_counter() - start
+        _record(dependency, True, latency)
+    metrics.histogram("dependency_probe_seconds", dependency=dependency.name).observe(latency)
+
+
+async def probe_all() -> None:
+    """One probe round: every dependency that needs it concurrently, then a new snapshot."""
+    timeout = get_settings().health_probe_timeout_seconds
+    await asyncio.gather(*(_probe(d, timeout) for d in dependencies().values() if d.needs_probe()))
+    _rebuild_snapshot()
+
+
+async def run_prober() -> None:
+    """Probe every HEALTH_PROBE_SECONDS until cancelled; start after warm-up."""
+    interval = get_settings().health_probe_seconds
+    while True:
+        started = time.perf_counter()
+        await probe_all()
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+def reset() -> None:
+    global _snapshot
+    _dependencies.clear()
+    _snapshot = None
@@ -1,10 +1,23 @@
 import json
 import base64
 import asyncio
-from google import genai
-from google.genai import types
+import logging
+from typing import TYPE_CHECKING
 from fastapi import HTTPException
+from pydantic import BaseModel
 from app.config import get_settings
+from app.services import budget, health, scheduler
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.errors import UpstreamUnavailableError
+from app.utils.limiter import AdaptiveLimiter, OverloadedError
+from app.utils.metrics import instrument
+from app.utils.request_context import Priority, current_priority
+
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+logger = logging.getLogger(__name__)
 
 # Default timeout for Gemini API calls (in seconds)
 GEMINI_TIMEOUT_SECONDS = 60
@@ -14,13 +27,19 @@ class GeminiTimeoutError(Exception):
     """Raised when a Gemini API call times out."""
     pass
 
-_client: genai.Client | None = None
 
+_client: "genai.Client | None" = None
+# Per-model concurrency limiters and circuit breakers
+_limiters: dict[str, AdaptiveLimiter] = {}
+_breakers: dict[str, CircuitBreaker] = {}
 
-def _get_client() -> genai.Client:
-    """Get or create Gemini client."""
+
+def _get_client() -> "genai.Client":
+    """Get or create Gemini client. The SDK is imported here, on first use."""
     global _client
     if _client is None:
+        from google import genai
+
         settings = get_settings()
         _client = genai.Client(api_key=settings.gemini_api_key)
     return _client
@@ -32,18 +51,161 @@ def _get_model_name(use_thinking: bool = False) -> str:
     return settings.gemini_pro_model if use_thinking else settings.gemini_flash_model
 
 
-async def analyze_image(image_base64: str, prompt: str, use_thinking: bool = False) -> dict:
+def get_limiter(model_name: str) -> AdaptiveLimiter:
+    limiter = _limiters.get(model_name)
+    if limiter is None:
+        settings = get_settings()
+        limiter = _limiters[model_name] = AdaptiveLimiter(
+            f"gemini:{model_name}",
+            initial_limit=settings.gemini_initial_concurrency,
+            min_limit=settings.gemini_min_concurrency,
+            max_limit=settings.gemini_max_concurrency,
+            target_latency=settings.gemini_target_latency_seconds,
+            max_queue_time=settings.gemini_max_queue_seconds,
+        )
+    return limiter
+
+
+def get_breaker(model_name: str) -> CircuitBreaker:
+    breaker = _breakers.get(model_name)
+    if breaker is None:
+        settings = get_settings()
+        breaker = _breakers[model_name] = CircuitBreaker(
+            f"gemini:{model_name}",
+            failure_threshold=settings.gemini_breaker_failure_threshold,
+            reset_timeout=settings.gemini_breaker_reset_seconds,
+        )
+    return breaker
+
+
+def _is_upstream_failure(e: Exception) -> bool:
+    """
+    True for errors that say Gemini itself is struggling: timeouts, connection
+    errors, 5xx and 429. Client errors (bad request, auth, safety) are the
+    caller's problem and must not open the breaker.
+    """
+    import httpx
+    from google.genai import errors
+
+    if isinstance(e, errors.APIError):
+        return e.code == 429 or (e.code or 0) >= 500
+    return isinstance(e, (TimeoutError, ConnectionError, httpx.TransportError))
+
+
+@instrument("llm.generate_content")
+async def _generate(
+    model_name: str,
+    contents,
+    config: "types.GenerateContentConfig",
+    estimated_tokens: int,
+    priority: Priority | None = None,
+):
+    """
+    Call generate_content through the model's circuit breaker, the priority
+    scheduler, the quota budget and the adaptive concurrency limiter.
+
+    Raises:
+        UpstreamUnavailableError: Gemini probed down, breaker open, quota exhausted, or call shed while queued
+            for a scheduler or limiter slot
+        asyncio.TimeoutError: the call itself exceeded GEMINI_TIMEOUT_SECONDS
+    """
+    health.check_available("gemini")
+    breaker = get_breaker(model_name)
+    unavailable = "AI model temporarily unavailable. Please try again later."
+    if breaker.is_open():
+        raise UpstreamUnavailableError(unavailable, retry_after=breaker.retry_after())
+
+    limiter = get_limiter(model_name)
+    allowed = False
+    try:
+        async with (
+            scheduler.slot(priority),
+            budget.reserve(f"gemini:{model_name}", estimated_tokens, priority) as reservation,
+            limiter.slot(),
+        ):
+            # Re-check after queueing; in half-open state only probes get through
+            if not breaker.allow_request():
+                raise CircuitOpenError(breaker.name)
+            allowed = True
+            reservation.sent = True
+            response = await asyncio.wait_for(
+                _get_client().aio.models.generate_content(
+                    model=model_name,
+                    contents=contents,
+                    config=config,
+                ),
+                timeout=GEMINI_TIMEOUT_SECONDS,
+            )
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None and usage.total_token_count:
+                reservation.actual_tokens = usage.total_token_count
+    except CircuitOpenError:
+        raise UpstreamUnavailableError(unavailable, retry_after=breaker.retry_after()) from None
+    except OverloadedError as e:
+        logger.warning(f"Shedding call to {model_name}: {e}")
+        raise UpstreamUnavailableError(
+            "AI service is overloaded. Please try again later.",
+            retry_after=e.retry_after,
+        ) from e
+    except UpstreamUnavailableError:
+        raise
+    except asyncio.CancelledError:
+        # No outcome to report, but a half-open probe must be handed back or
+        # the breaker never settles and rejects every later call
+        if allowed:
+            breaker.release_probe()
+        raise
+    except Exception as e:
+        if _is_upstream_failure(e):
+            breaker.record_failure()
+        elif allowed:
+            # Not Gemini's fault; settle a half-open probe without a verdict
+            breaker.release_probe()
+        raise
+
+    breaker.record_success()
+    return response
+
+
+async def ping() -> None:
+    """Health probe: fetch the Flash model's metadata, which costs no tokens."""
+    await _get_client().aio.models.get(model=_get_model_name())
+
+
+def _parse_json_text(text: str) -> dict:
+    """Parse a free-form JSON reply, extracting the outermost object if needed."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try to extract JSON from response
+        if "{" in text and "}" in text:
+            start = text.index("{")
+            end = text.rindex("}") + 1
+            return json.loads(text[start:end])
+        raise ValueError(f"Failed to parse JSON from Gemini response: {text[:200]}")
+
+
+@instrument("llm.analyze_image")
+async def analyze_image(
+    image_base64: str,
+    prompt: str,
+    use_thinking: bool = False,
+    response_schema: type[BaseModel] | None = None,
+    max_output_tokens: int = 1000,
+) -> dict:
     """Analyze image using Gemini Vision.
     
     Args:
         image_base64: Base64 encoded image (can include data:image prefix or raw base64)
         prompt: Analysis prompt
         use_thinking: Use Pro model for complex reasoning
+        response_schema: Pydantic model the reply must conform to. Gemini then
+            returns constrained JSON, so no free-form parsing is needed.
+        max_output_tokens: Output token cap; keep it tight for schema replies
         
     Returns:
         Parsed JSON response from Gemini
     """
-    client = _get_client()
     model_name = _get_model_name(use_thinking)
     
     # Handle base64 format - strip data URL prefix if present
@@ -56,25 +218,31 @@ async def analyze_image(image_base64: str, prompt: str, use_thinking: bool = Fal
         image_data = image_base64
         mime_type = "image/jpeg"
     
+    from google.genai import types
+
     # Create image part for Gemini
     image_bytes = base64.b64decode(image_data)
     image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
     
-    # Add JSON instruction to prompt
-    json_prompt = f"{prompt}\n\nRespond with valid JSON only, no markdown formatting."
+    if response_schema is None:
+        # Add JSON instruction to prompt
+        prompt = f"{prompt}\n\nRespond with valid JSON only, no markdown formatting."
     
     # Generate response with timeout
     try:
-        response = await asyncio.wait_for(
-            client.aio.models.generate_content(
-                model=model_name,
-                contents=[json_prompt, image_part],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    max_output_tokens=1000,
-                ),
+        response = await _generate(
+            model_name,
+            [prompt, image_part],
+            types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=response_schema,
+                max_output_tokens=max_output_tokens,
+            ),
+            estimated_tokens=(
+                budget.estimate_text_tokens(prompt)
+                + budget.estimate_image_tokens(image_bytes)
+                + max_output_tokens
             ),
-            timeout=GEMINI_TIMEOUT_SECONDS
         )
     except asyncio.TimeoutError:
         raise HTTPException(
@@ -82,18 +250,16 @@ async def analyze_image(image_base64: str, prompt: str, use_thinking: bool = Fal
             detail="Image analysis request timed out. Please try again."
         )
     
-    try:
-        return json.loads(response.text)
-    except json.JSONDecodeError:
-        # If JSON parsing fails, try to extract JSON from response
-        text = response.text
-        if "{" in text and "}" in text:
-            start = text.index("{")
-            end = text.rindex("}") + 1
-            return json.loads(text[start:end])
-        raise ValueError(f"Failed to parse JSON from Gemini response: {text[:200]}")
+    if response_schema is not None:
+        if isinstance(response.parsed, BaseModel):
+            return response.parsed.model_dump()
+        # Truncated or blocked replies come back unparsed
+        return response_schema.model_validate_json(response.text or "").model_dump()
 
+    return _parse_json_text(response.text)
 
+
+@instrument("llm.generate_text")
 async def generate_text(prompt: str, use_thinking: bool = False) -> str:
     """Generate text using Gemini.
     
@@ -104,19 +270,18 @@ async def generate_text(prompt: str, use_thinking: bool = False) -> str:
     Returns:
         Generated text response
     """
-    client = _get_client()
+    from google.genai import types
+
     model_name = _get_model_name(use_thinking)
 
     try:
-        response = await asyncio.wait_for(
-            client.aio.models.generate_content(
-                model=model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    max_output_tokens=500,
-                ),
+        response = await _generate(
+            model_name,
+            prompt,
+            types.GenerateContentConfig(
+                max_output_tokens=500,
             ),
-            timeout=GEMINI_TIMEOUT_SECONDS
+            estimated_tokens=budget.estimate_text_tokens(prompt) + 500,
         )
     except asyncio.TimeoutError:
         raise HTTPException(
@@ -127,6 +292,7 @@ async def generate_text(prompt: str, use_thinking: bool = False) -> str:
     return response.text
 
 
+@instrument("llm.rerank_results")
 async def rerank_results(query: str, items: list[dict], top_k: int = 20) -> list[dict]:
     """Re-rank search results for relevance using Gemini Pro.
     
@@ -157,22 +323,23 @@ Only include the top {top_k} most relevant results.
 
 Respond with valid JSON only."""
 
-    client = _get_client()
+    from google.genai import types
+
     model_name = _get_model_name(use_thinking=True)
 
     try:
-        response = await asyncio.wait_for(
-            client.aio.models.generate_content(
-                model=model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    max_output_tokens=500,
-                ),
+        response = await _generate(
+            model_name,
+            prompt,
+            types.GenerateContentConfig(
+                response_mime_type="application/json",
+                max_output_tokens=500,
             ),
-            timeout=GEMINI_TIMEOUT_SECONDS
+            estimated_tokens=budget.estimate_text_tokens(prompt) + 500,
+            # Reranking is an optional refinement; never let it outrank moderation
+            priority=max(current_priority.get(), Priority.STANDARD),
         )
-    except asyncio.TimeoutError:
+    except (asyncio.TimeoutError, UpstreamUnavailableError):
         # For reranking, we can gracefully fallback to original order
         return items[:top_k]
 
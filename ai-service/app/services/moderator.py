@@ -1,17 +1,65 @@
+"""
+Moderation pipeline.
+
+Decisions go through a cascade so Gemini is only called when needed:
+
+- Tier 0: perceptual hash. Exact (hash, caption) decision cache, then near
+  matches against locally known-blocked / known-allowed hashes and the
+  Supabase blocklist index.
+- Tier 1: optional local CPU classifier (settings.moderation_local_classifier)
+  plus caption heuristics. Confidently clean results are allowed, clearly
+  risky ones skip straight to Pro.
+- Tier 2: Gemini Flash.
+- Tier 3: Gemini Pro, when Flash scores exceed the escalation threshold.
+  With settings.moderation_speculative_escalation, Pro is started alongside
+  Flash when early signals (risky caption, hash family that escalated before,
+  borderline local scores) predict escalation, and cancelled if unneeded.
+
+Both Gemini tiers use a response schema with a small output token cap.
+
+Per-tier decision counts and latency are recorded in app.utils.metrics.
+"""
+import asyncio
+import importlib
+import logging
+import re
 import time
-from app.services import llm
+from typing import Callable
+from pydantic import BaseModel, Field
+from app.services import llm, hash_blocklist
 from app.models.schemas import ModerationScores, ModerationResponse
 from app.config import get_settings
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.hash_index import HashIndex
+from app.utils.image import decode_base64_image, compute_phash
+from app.utils.tracing import annotate, traced
+
+logger = logging.getLogger(__name__)
 
 MODERATION_PROMPT = """Analyze this image for content safety. Score each category 0-10:
 - nsfw: Sexual/adult content
 - violence: Gore, weapons in use
 - hate: Hate symbols, slurs
-- child_safety: Content involving minors inappropriately  
+- child_safety: Content involving minors inappropriately
 - spam: Obvious promotional/scam content
 - drugs_weapons: Drug use, weapon sales
 
-Return JSON: {"nsfw": X, "violence": X, "hate": X, "child_safety": X, "spam": X, "drugs_weapons": X, "explanation": "brief reason"}"""
+Give a one-sentence explanation."""
+
+# Six scores and a one-sentence explanation fit comfortably
+MODERATION_MAX_OUTPUT_TOKENS = 256
+
+
+class ModerationModelOutput(BaseModel):
+    """Response schema for Gemini moderation calls."""
+    nsfw: float = Field(ge=0, le=10)
+    violence: float = Field(ge=0, le=10)
+    hate: float = Field(ge=0, le=10)
+    child_safety: float = Field(ge=0, le=10)
+    spam: float = Field(ge=0, le=10)
+    drugs_weapons: float = Field(ge=0, le=10)
+    explanation: str
 
 THRESHOLDS = {
     "nsfw": 7,
@@ -22,6 +70,27 @@ THRESHOLDS = {
     "drugs_weapons": 6,
 }
 
+TIERS = ("hash", "local", "flash", "pro")
+
+# Categories judged from the image itself. Others (hate, spam) are often
+# driven by the caption alone, so those blocks do not mark the image.
+IMAGE_CATEGORIES = frozenset({"nsfw", "violence", "child_safety", "drugs_weapons"})
+
+# Caption patterns that should always get a model's opinion
+RISKY_CAPTION_PATTERN = re.compile(
+    r"https?://|www\.|t\.me/|\bdm me\b|\bgiveaway\b|\bairdrop\b|\bfree (?:sol|crypto|nft)\b"
+    r"|\bonlyfans\b|\bnsfw\b|\b18\+|\bnudes?\b|\bgore\b|\bbuy (?:now|here)\b",
+    re.IGNORECASE,
+)
+
+_decision_cache: TTLCache | None = None
+_known_allowed = HashIndex()
+_known_blocked = HashIndex()
+# Hashes whose moderation needed Pro; near-duplicates are likely to need it too
+_escalated = HashIndex()
+_local_classifier: Callable | None = None
+_local_classifier_loaded = False
+
 
 def determine_verdict(scores: ModerationScores) -> tuple[str, str | None]:
     """Determine verdict and blocked category from scores."""
@@ -37,18 +106,12 @@ def determine_verdict(scores: ModerationScores) -> tuple[str, str | None]:
     return "allow", None
 
 
-async def moderate_content(image_base64: str, caption: str | None = None) -> ModerationResponse:
-    """Run moderation pipeline with optional escalation."""
-    start_time = time.time()
-    settings = get_settings()
+def caption_is_risky(caption: str | None) -> bool:
+    return bool(caption and RISKY_CAPTION_PATTERN.search(caption))
 
-    prompt = MODERATION_PROMPT
-    if caption:
-        prompt += f"\n\nCaption: {caption}"
 
-    result = await llm.analyze_image(image_base64, prompt, use_thinking=False)
-
-    scores = ModerationScores(
+def _scores_from_result(result: dict) -> ModerationScores:
+    return ModerationScores(
         nsfw=result.get("nsfw", 0),
         violence=result.get("violence", 0),
         hate=result.get("hate", 0),
@@ -57,24 +120,212 @@ async def moderate_content(image_base64: str, caption: str | None = None) -> Mod
         drugs_weapons=result.get("drugs_weapons", 0),
     )
 
-    max_score = max(scores.model_dump().values())
 
-    if max_score > settings.moderation_escalation_threshold:
-        result = await llm.analyze_image(image_base64, prompt, use_thinking=True)
-        scores = ModerationScores(
-            nsfw=result.get("nsfw", 0),
-            violence=result.get("violence", 0),
-            hate=result.get("hate", 0),
-            child_safety=result.get("child_safety", 0),
-            spam=result.get("spam", 0),
-            drugs_weapons=result.get("drugs_weapons", 0),
+def _get_decision_cache() -> TTLCache:
+    global _decision_cache
+    if _decision_cache is None:
+        _decision_cache = TTLCache(max_size=get_settings().moderation_decision_cache_size, name="moderation_decisions")
+    return _decision_cache
+
+
+def _get_local_classifier() -> Callable | None:
+    """Load settings.moderation_local_classifier ("module:function") once."""
+    global _local_classifier, _local_classifier_loaded
+    if not _local_classifier_loaded:
+        _local_classifier_loaded = True
+        path = get_settings().moderation_local_classifier
+        if path:
+            try:
+                module_name, func_name = path.split(":", 1)
+                _local_classifier = getattr(importlib.import_module(module_name), func_name)
+            except (ValueError, ImportError, AttributeError) as e:
+                logger.error(f"Failed to load local moderation classifier {path!r}: {e}")
+    return _local_classifier
+
+
+def _remember(index: HashIndex, image_hash: str, response: ModerationResponse) -> None:
+    settings = get_settings()
+    if len(index) >= settings.moderation_known_hashes_max_size:
+        index.clear()
+    index.add(image_hash, response)
+
+
+async def _image_hash(image_base64: str) -> str | None:
+    """Perceptual hash of the image, or None if it cannot be decoded."""
+    try:
+        image_bytes = decode_base64_image(image_base64)
+        return await asyncio.to_thread(compute_phash, image_bytes)
+    except Exception:
+        return None
+
+
+async def _hash_tier(image_hash: str, cache_key: tuple, caption_risky: bool) -> ModerationResponse | None:
+    """Tier 0: answer from hashes of content we have already judged."""
+    settings = get_settings()
+
+    cached = _get_decision_cache().get(cache_key)
+    if cached is not None:
+        return cached
+
+    match = _known_blocked.find_nearest(image_hash, settings.hash_match_max_distance)
+    if match is not None:
+        return match[1]
+
+    blocked = await hash_blocklist.check_hash(image_hash, live_lookup=False)
+    if blocked["known_bad"]:
+        category = blocked["reason"] if blocked["reason"] in THRESHOLDS else None
+        scores = ModerationScores(**({category: 10.0} if category else {}))
+        return ModerationResponse(
+            verdict="block",
+            scores=scores,
+            max_score=10.0,
+            explanation=f"Matches previously blocked content (distance {blocked['distance']})",
+            processing_time_ms=0,
+            blocked_category=blocked["reason"],
         )
-        max_score = max(scores.model_dump().values())
 
+    # Reusing an allow only covers the image; risky captions still need a model
+    if not caption_risky:
+        match = _known_allowed.find_nearest(image_hash, settings.moderation_allow_match_max_distance)
+        if match is not None:
+            return match[1]
+
+    return None
+
+
+async def _local_tier(image_base64: str, caption: str | None) -> ModerationScores | None:
+    """Tier 1: optional local classifier. Returns scores or None if unavailable."""
+    classifier = _get_local_classifier()
+    if classifier is None:
+        return None
+    try:
+        image_bytes = decode_base64_image(image_base64)
+        result = await asyncio.to_thread(classifier, image_bytes, caption)
+    except Exception as e:
+        logger.warning(f"Local moderation classifier failed: {e}")
+        return None
+    return _scores_from_result(result) if result else None
+
+
+async def _model_tier(image_base64: str, prompt: str, use_thinking: bool) -> tuple[dict, ModerationScores]:
+    result = await llm.analyze_image(
+        image_base64,
+        prompt,
+        use_thinking=use_thinking,
+        response_schema=ModerationModelOutput,
+        max_output_tokens=MODERATION_MAX_OUTPUT_TOKENS,
+    )
+    return result, _scores_from_result(result)
+
+
+def _predicts_escalation(
+    image_hash: str | None,
+    caption_risky: bool,
+    local_scores: ModerationScores | None,
+) -> bool:
+    """Early signals that Flash will likely escalate to Pro."""
+    settings = get_settings()
+    if caption_risky:
+        return True
+    if image_hash is not None and _escalated.find_nearest(image_hash, settings.hash_match_max_distance):
+        return True
+    if local_scores is not None:
+        return max(local_scores.model_dump().values()) > settings.moderation_local_allow_max_score
+    return False
+
+
+async def _flash_then_pro(
+    image_base64: str,
+    prompt: str,
+    speculative: bool,
+) -> tuple[str, dict, ModerationScores]:
+    """Tier 2 with escalation to tier 3, optionally starting Pro in parallel."""
+    settings = get_settings()
+    pro_task = None
+    if speculative:
+        pro_task = asyncio.create_task(_model_tier(image_base64, prompt, use_thinking=True))
+
+    try:
+        result, scores = await _model_tier(image_base64, prompt, use_thinking=False)
+        if max(scores.model_dump().values()) <= settings.moderation_escalation_threshold:
+            if pro_task is not None:
+                metrics.counter("moderation_speculative_total", outcome="cancelled").inc()
+            return "flash", result, scores
+
+        if pro_task is None:
+            result, scores = await _model_tier(image_base64, prompt, use_thinking=True)
+        else:
+            metrics.counter("moderation_speculative_total", outcome="used").inc()
+            result, scores = await pro_task
+        return "pro", result, scores
+    finally:
+        if pro_task is not None and not pro_task.done():
+            pro_task.cancel()
+
+
+def _record(tier: str, start: float) -> None:
+    metrics.counter("moderation_decisions_total", tier=tier).inc()
+    metrics.histogram("moderation_decision_seconds", tier=tier).observe(time.perf_counter() - start)
+    annotate(tier=tier)
+
+
+@traced("moderator.moderate_content")
+async def moderate_content(image_base64: str, caption: str | None = None) -> ModerationResponse:
+    """Run moderation cascade: hash -> local -> Flash -> Pro."""
+    start_time = time.time()
+    start = time.perf_counter()
+    settings = get_settings()
+    caption_risky = caption_is_risky(caption)
+    annotate(image_chars=len(image_base64))
+
+    image_hash = None
+    cache_key = None
+    if settings.moderation_cascade_enabled:
+        image_hash = await _image_hash(image_base64)
+
+    if image_hash is not None:
+        cache_key = (image_hash, caption or "")
+        decision = await _hash_tier(image_hash, cache_key, caption_risky)
+        if decision is not None:
+            _record("hash", start)
+            return decision.model_copy(update={
+                "processing_time_ms": int((time.time() - start_time) * 1000),
+                "tier": "hash",
+            })
+
+    prompt = MODERATION_PROMPT
+    if caption:
+        prompt += f"\n\nCaption: {caption}"
+
+    tier = "flash"
+    result: dict = {}
+    scores = None
+    local_scores = None
+    if settings.moderation_cascade_enabled:
+        local_scores = await _local_tier(image_base64, caption)
+        if local_scores is not None:
+            local_max = max(local_scores.model_dump().values())
+            if local_max <= settings.moderation_local_allow_max_score and not caption_risky:
+                tier = "local"
+                scores = local_scores
+                result = {"explanation": "Cleared by local classifier"}
+            elif local_max > settings.moderation_escalation_threshold:
+                # Clearly risky: Flash would escalate anyway
+                tier = "pro"
+
+    if tier == "flash":
+        speculative = settings.moderation_speculative_escalation and _predicts_escalation(
+            image_hash, caption_risky, local_scores
+        )
+        tier, result, scores = await _flash_then_pro(image_base64, prompt, speculative)
+    elif tier == "pro":
+        result, scores = await _model_tier(image_base64, prompt, use_thinking=True)
+
+    max_score = max(scores.model_dump().values())
     verdict, blocked_category = determine_verdict(scores)
     processing_time_ms = int((time.time() - start_time) * 1000)
 
-    return ModerationResponse(
+    response = ModerationResponse(
         verdict=verdict,
         scores=scores,
         max_score=max_score,
@@ -82,4 +333,38 @@ async def moderate_content(image_base64: str, caption: str | None = None) -> Mod
         processing_time_ms=processing_time_ms,
         blocked_category=blocked_category,
         violation_id=None,
+        tier=tier,
     )
+
+    if cache_key is not None:
+        _get_decision_cache().set(cache_key, response, settings.moderation_decision_cache_ttl_seconds)
+        if tier == "pro":
+            _remember(_escalated, image_hash, response)
+        # Near-duplicates of the image with any caption reuse a block only if
+        # the image alone decided it; the exact caption is in the decision cache
+        if verdict == "block" and (not caption or blocked_category in IMAGE_CATEGORIES):
+            _remember(_known_blocked, image_hash, response)
+        elif verdict == "allow" and not caption_risky:
+            _remember(_known_allowed, image_hash, response)
+
+    _record(tier, start)
+    return response
+
+
+def tier_stats() -> dict:
+    """Per-tier decision counts, share of traffic and mean latency."""
+    counts = {tier: metrics.counter("moderation_decisions_total", tier=tier).value for tier in TIERS}
+    total = sum(counts.values())
+    tiers = {
+        tier: {
+            "decisions": int(counts[tier]),
+            "hit_rate": counts[tier] / total if total else 0.0,
+            "mean_latency_ms": metrics.histogram("moderation_decision_seconds", tier=tier).mean * 1000,
+        }
+        for tier in TIERS
+    }
+    return {
+        "total": int(total),
+        "tiers": tiers,
+        "gemini_calls_avoided": int(counts["hash"] + counts["local"]),
+    }
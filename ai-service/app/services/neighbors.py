@@ -0,0 +1,315 @@
+"""
+Precomputed item-to-item neighbor lists ("more like this").
+
+Each post keeps its top-K most similar posts. Post IDs are mapped to int32
+row numbers, and each row holds K neighbor rows (-1 = empty slot) and K
+float16 cosine scores, sorted best first. That is 6 bytes per neighbor.
+
+- Rebuild: a background job reads every vector from the vector store and
+  computes exact top-K lists by chunked matrix multiplication. Chunks are
+  sized so each similarity block stays under NEIGHBOR_CHUNK_MB. The result
+  is saved to NEIGHBOR_INDEX_PATH and reloaded on startup.
+- Incremental: `add_post` runs after each upsert. One ANN query fills the new
+  post's list, and the post is inserted into its neighbors' lists wherever
+  it beats their weakest entry.
+
+The "more like this" endpoint and the recommender read these lists instead
+of running an ANN query per request.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+import numpy as np
+from app.config import get_settings
+from app.services import vector_db
+
+logger = logging.getLogger(__name__)
+
+
+def unit_rows(embeddings: list) -> np.ndarray:
+    """Stack embeddings into a float32 matrix of L2-normalized rows."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix
+
+
+def compute_neighbors(vectors: np.ndarray, k: int, chunk_rows: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k cosine neighbors for every row of `vectors` (rows must be
+    L2-normalized). Returns (int32 rows, float16 scores), each n x k, with -1
+    padding when n <= k.
+    """
+    n = len(vectors)
+    k_eff = min(k, n - 1)
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float16)
+    if k_eff <= 0:
+        return neighbors, scores
+
+    for start in range(0, n, chunk_rows):
+        end = min(n, start + chunk_rows)
+        sims = vectors[start:end] @ vectors.T
+        sims[np.arange(end - start), np.arange(start, end)] = -np.inf  # exclude self
+        top = np.argpartition(-sims, k_eff - 1, axis=1)[:, :k_eff]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        neighbors[start:end, :k_eff] = np.take_along_axis(top, order, axis=1)
+        scores[start:end, :k_eff] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbors, scores
+
+
+class NeighborIndex:
+    def __init__(self, k: int):
+        self.k = k
+        self.ids: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.neighbors = np.full((0, k), -1, dtype=np.int32)
+        self.scores = np.zeros((0, k), dtype=np.float16)
+        # Rows whose own list has been computed. Posts that so far only
+        # appear in other lists have a row but no list of their own.
+        self.filled = np.zeros(0, dtype=bool)
+        self.built_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, post_id: str) -> bool:
+        row = self.rows.get(post_id)
+        return row is not None and bool(self.filled[row])
+
+    @classmethod
+    def from_arrays(
+        cls,
+        ids: list[str],
+        neighbors: np.ndarray,
+        scores: np.ndarray,
+        built_at: float,
+        filled: np.ndarray | None = None,
+    ) -> "NeighborIndex":
+        index = cls(neighbors.shape[1])
+        index.ids = list(ids)
+        index.rows = {post_id: row for row, post_id in enumerate(index.ids)}
+        index.neighbors = neighbors
+        index.scores = scores
+        index.filled = filled if filled is not None else np.ones(len(ids), dtype=bool)
+        index.built_at = built_at
+        return index
+
+    def save(self, path: str) -> None:
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".tmp.npz")
+        np.savez(
+            tmp,
+            ids=np.array(self.ids, dtype=object),
+            neighbors=self.neighbors[: len(self.ids)],
+            scores=self.scores[: len(self.ids)],
+            filled=self.filled[: len(self.ids)],
+            built_at=self.built_at,
+        )
+        os.replace(tmp, target)
+
+    @classmethod
+    def load(cls, path: str) -> "NeighborIndex":
+        data = np.load(path, allow_pickle=True)
+        return cls.from_arrays(
+            data["ids"].tolist(), data["neighbors"], data["scores"], float(data["built_at"]), data["filled"]
+        )
+
+    def _row(self, post_id: str) -> int:
+        row = self.rows.get(post_id)
+        if row is None:
+            row = len(self.ids)
+            if row >= len(self.neighbors):
+                grow = max(1024, len(self.neighbors))
+                self.neighbors = np.vstack([self.neighbors, np.full((grow, self.k), -1, dtype=np.int32)])
+                self.scores = np.vstack([self.scores, np.zeros((grow, self.k), dtype=np.float16)])
+                self.filled = np.concatenate([self.filled, np.zeros(grow, dtype=bool)])
+            self.ids.append(post_id)
+            self.rows[post_id] = row
+        return row
+
+    def _offer(self, row: int, neighbor: int, score: float) -> None:
+        """Insert `neighbor` into row's list if it beats the weakest entry."""
+        current = self.neighbors[row]
+        if neighbor in current:
+            return
+        slot = int(np.argmin(np.where(current < 0, -np.inf, self.scores[row].astype(np.float32))))
+        if current[slot] >= 0 and score <= self.scores[row, slot]:
+            return
+        current[slot] = neighbor
+        self.scores[row, slot] = score
+        order = np.argsort(-np.where(current < 0, -np.inf, self.scores[row].astype(np.float32)))
+        self.neighbors[row] = current[order]
+        self.scores[row] = self.scores[row][order]
+
+    def set_neighbors(self, post_id: str, hits: list[tuple[str, float]]) -> None:
+        """Replace post_id's list with `hits` and offer post_id to each hit's list."""
+        row = self._row(post_id)
+        hits = sorted(hits, key=lambda h: -h[1])[: self.k]
+        self.neighbors[row] = -1
+        self.scores[row] = 0
+        self.filled[row] = True
+        for slot, (other_id, score) in enumerate(hits):
+            other = self._row(other_id)
+            self.neighbors[row, slot] = other
+            self.scores[row, slot] = score
+            self._offer(other, row, score)
+
+    def similar(self, post_id: str, limit: int, exclude: set[str] | None = None) -> list[tuple[str, float]]:
+        row = self.rows.get(post_id)
+        if row is None:
+            return []
+        exclude = exclude or set()
+        results = []
+        for neighbor, score in zip(self.neighbors[row], self.scores[row]):
+            if neighbor < 0:
+                break
+            other_id = self.ids[neighbor]
+            if other_id not in exclude:
+                results.append((other_id, float(score)))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def merge(self, post_ids: list[str], limit: int, exclude: set[str] | None = None) -> list[tuple[str, float]]:
+        """
+        Candidates from the neighbor lists of several posts. A candidate's
+        score is its similarity summed over the lists it appears in, divided
+        by len(post_ids), so posts close to several of them rank first.
+        """
+        if not post_ids:
+            return []
+        exclude = set(exclude or ()) | set(post_ids)
+        totals: dict[str, float] = defaultdict(float)
+        for post_id in post_ids:
+            for other_id, score in self.similar(post_id, self.k, exclude):
+                totals[other_id] += score
+        ranked = sorted(totals.items(), key=lambda item: -item[1])[:limit]
+        return [(other_id, total / len(post_ids)) for other_id, total in ranked]
+
+
+_index: NeighborIndex | None = None
+# Posts added while a rebuild is running, re-applied to the new index
+_pending: list[tuple[str, list[float]]] | None = None
+
+
+def get_index() -> NeighborIndex:
+    global _index
+    if _index is None:
+        _index = NeighborIndex(get_settings().neighbor_k)
+    return _index
+
+
+async def _ann_neighbors(post_id: str, embedding: list[float]) -> list[tuple[str, float]]:
+    hits = await vector_db.search_similar(embedding, limit=get_settings().neighbor_k, exclude_ids=[post_id])
+    return [(h["post_id"], h["score"]) for h in hits]
+
+
+async def add_post(post_id: str, embedding: list[float]) -> None:
+    """Fill a newly indexed post's list and offer it to its neighbors' lists."""
+    hits = await _ann_neighbors(post_id, embedding)
+    get_index().set_neighbors(post_id, hits)
+    if _pending is not None:
+        _pending.append((post_id, embedding))
+
+
+async def ensure_indexed(post_ids: list[str]) -> list[str]:
+    """
+    Add any of `post_ids` that have no list yet (indexed by another instance
+    since the last rebuild) with one ANN query each. Returns the IDs that have
+    a list afterwards; IDs unknown to the vector store are dropped.
+    """
+    index = get_index()
+    missing = [post_id for post_id in post_ids if post_id not in index]
+    if missing:
+        posts = await vector_db.get_posts_by_ids(missing)
+        await asyncio.gather(*(
+            add_post(post["post_id"], post["embedding"])
+            for post in posts
+            if post.get("embedding") is not None
+        ))
+    return [post_id for post_id in post_ids if post_id in index]
+
+
+async def similar_posts(post_id: str, limit: int, exclude: set[str] | None = None) -> list[tuple[str, float]] | None:
+    """Precomputed neighbors of a post, or None if the post is not indexed."""
+    if not await ensure_indexed([post_id]):
+        return None
+    return get_index().similar(post_id, limit, exclude)
+
+
+async def merge(post_ids: list[str], limit: int, exclude: set[str] | None = None) -> list[tuple[str, float]]:
+    """Candidates from the merged neighbor lists of `post_ids` (see NeighborIndex.merge)."""
+    indexed = await ensure_indexed(post_ids)
+    return get_index().merge(indexed, limit, exclude)
+
+
+async def rebuild() -> NeighborIndex:
+    """Recompute every list from the vector store and swap the new index in."""
+    global _index, _pending
+    settings = get_settings()
+    start = time.perf_counter()
+    _pending = []
+    try:
+        # Converting and normalizing a batch of 1024-d lists is real CPU work,
+        # so each batch is stacked in a worker thread as it arrives
+        ids, blocks = [], []
+        async for batch in vector_db.scan_posts():
+            posts = [post for post in batch if post.get("embedding") is not None]
+            if posts:
+                ids.extend(post["post_id"] for post in posts)
+                blocks.append(await asyncio.to_thread(unit_rows, [post["embedding"] for post in posts]))
+        if not ids:
+            return get_index()
+
+        matrix = await asyncio.to_thread(np.vstack, blocks)
+        del blocks
+        chunk_rows = max(1, settings.neighbor_chunk_mb * 2**20 // (4 * len(ids)))
+        neighbors, scores = await asyncio.to_thread(compute_neighbors, matrix, settings.neighbor_k, chunk_rows)
+
+        index = NeighborIndex.from_arrays(ids, neighbors, scores, built_at=time.time())
+        # Posts indexed during the rebuild; more can arrive while these run
+        done = 0
+        while done < len(_pending):
+            pending = _pending[done:]
+            hits = await asyncio.gather(*(_ann_neighbors(post_id, embedding) for post_id, embedding in pending))
+            for (post_id, _), post_hits in zip(pending, hits):
+                index.set_neighbors(post_id, post_hits)
+            done += len(pending)
+        _index = index
+    finally:
+        _pending = None
+
+    await asyncio.to_thread(index.save, settings.neighbor_index_path)
+    logger.info(f"Rebuilt neighbor lists for {len(ids)} posts in {time.perf_counter() - start:.1f}s")
+    return index
+
+
+async def run_rebuild_loop() -> None:
+    """Load the saved index, then rebuild it every NEIGHBOR_REBUILD_SECONDS."""
+    global _index
+    settings = get_settings()
+    if Path(settings.neighbor_index_path).exists():
+        try:
+            _index = await asyncio.to_thread(NeighborIndex.load, settings.neighbor_index_path)
+            logger.info(f"Loaded neighbor lists for {len(_index)} posts")
+        except Exception:
+            logger.exception("Failed to load neighbor lists")
+
+    while True:
+        age = time.time() - get_index().built_at
+        if age < settings.neighbor_rebuild_seconds:
+            await asyncio.sleep(settings.neighbor_rebuild_seconds - age)
+        try:
+            index = await rebuild()
+        except Exception:
+            logger.exception("Neighbor list rebuild failed")
+            await asyncio.sleep(settings.neighbor_rebuild_seconds)
+            continue
+        if time.time() - index.built_at >= settings.neighbor_rebuild_seconds:
+            # Nothing indexed yet (e.g. a fresh deploy); don't rescan the empty store back to back
+            await asyncio.sleep(settings.neighbor_rebuild_seconds)
@@ -1,5 +1,8 @@
-from app.services import llm, embeddings, vector_db
+import time
+from app.services import llm, embeddings, vector_db, neighbors
 from app.models.schemas import RecommendResponse, RecommendResult
+from app.config import get_settings
+from app.utils.tracing import annotate, traced
 
 TASTE_PROFILE_PROMPT = """Based on these liked content descriptions, describe the user's taste:
 {descriptions}
@@ -7,21 +10,48 @@ TASTE_PROFILE_PROMPT = """Based on these liked content descriptions, describe th
 Write 2-3 sentences about their preferences (themes, aesthetics, moods they enjoy)."""
 
 
+@traced("recommender.recommend")
 async def recommend(
     user_wallet: str,
     liked_post_ids: list[str],
     limit: int = 50,
     exclude_seen: list[str] | None = None,
+    include_taste_profile: bool = True,
 ) -> RecommendResponse:
-    """Generate personalized recommendations based on liked content."""
+    """
+    Generate personalized recommendations based on liked content.
+
+    Candidates come from the precomputed neighbor lists of the liked posts.
+    With include_taste_profile, the LLM also describes the user's taste, and
+    an ANN search on that description tops up the candidates if the lists
+    do not provide enough. Scores are recency-boosted, and posts older than
+    FEED_WINDOW_SECONDS are only used when there are not enough newer ones,
+    for the cold-start "Trending" feed too.
+    """
+    annotate(liked=len(liked_post_ids))
     await vector_db.ensure_collection()
+    settings = get_settings()
+    now = time.time()
+    since = int(now - settings.feed_window_seconds)
 
     if not liked_post_ids:
         candidates = await vector_db.search_similar(
-            embedding=[0.0] * 1024,
+            embedding=[0.0] * settings.voyage_dimensions,
             limit=limit,
             exclude_ids=exclude_seen or [],
+            since=since,
+            recency=True,
+            collapse=True,
         )
+        if len(candidates) < limit:
+            # Quiet window, or posts indexed before timestamps: top up with older posts
+            candidates += await vector_db.search_similar(
+                embedding=[0.0] * settings.voyage_dimensions,
+                limit=limit - len(candidates),
+                exclude_ids=(exclude_seen or []) + [c["post_id"] for c in candidates],
+                recency=True,
+                collapse=True,
+            )
         return RecommendResponse(
             recommendations=[
                 RecommendResult(post_id=c["post_id"], score=c.get("score", 0), reason="Trending")
@@ -30,39 +60,66 @@ async def recommend(
             taste_profile=None,
         )
 
-    liked_posts = await vector_db.get_posts_by_ids(liked_post_ids[-20:])
+    liked_post_ids = liked_post_ids[-20:]
+    exclude = set(exclude_seen or []) | set(liked_post_ids)
+    merged = await neighbors.merge(liked_post_ids, limit * 2, exclude)
+    # Liked posts and neighbor-list candidates in one retrieve
+    posts = {
+        p["post_id"]: p
+        for p in await vector_db.get_posts_by_ids(liked_post_ids + [post_id for post_id, _ in merged])
+    }
+    liked_posts = [posts[post_id] for post_id in liked_post_ids if post_id in posts]
     if not liked_posts:
         return RecommendResponse(recommendations=[], taste_profile=None)
 
-    descriptions = "\n".join(
-        f"- {p.get('description', 'No description')}" for p in liked_posts if p.get("description")
+    candidates = vector_db.recency_boost(
+        [{**posts[post_id], "score": score} for post_id, score in merged if post_id in posts], now
     )
+    # Stable sort: in-window posts first, each group still best first
+    candidates.sort(key=lambda c: (c.get("timestamp") or 0) < since)
+    fresh = sum(1 for c in candidates if (c.get("timestamp") or 0) >= since)
 
-    taste_profile = await llm.generate_text(
-        TASTE_PROFILE_PROMPT.format(descriptions=descriptions), use_thinking=False
-    )
+    taste_profile = None
+    if include_taste_profile:
+        descriptions = "\n".join(
+            f"- {p.get('description', 'No description')}" for p in liked_posts if p.get("description")
+        )
 
-    taste_embedding = await embeddings.generate_query_embedding(taste_profile)
+        taste_profile = await llm.generate_text(
+            TASTE_PROFILE_PROMPT.format(descriptions=descriptions), use_thinking=False
+        )
 
-    exclude = set(exclude_seen or []) | set(liked_post_ids)
-    candidates = await vector_db.search_similar(
-        embedding=taste_embedding,
-        limit=limit * 2,
-        exclude_ids=list(exclude),
-    )
+        if fresh < limit:
+            taste_embedding = await embeddings.generate_query_embedding(taste_profile)
+            found = await vector_db.search_similar(
+                embedding=taste_embedding,
+                limit=limit * 2,
+                exclude_ids=list(exclude | {c["post_id"] for c in candidates}),
+                since=since,
+                recency=True,
+                collapse=True,
+            )
+            candidates = candidates[:fresh] + found + candidates[fresh:]
 
+    # Reposts of liked posts, and more than one post per near-duplicate cluster, are dropped
+    seen_clusters = {p.get("cluster_id") or p["post_id"] for p in liked_posts}
     seen_creators: set[str] = set()
     diverse_results: list[dict] = []
     for c in candidates:
+        cluster = c.get("cluster_id") or c["post_id"]
+        if cluster in seen_clusters:
+            continue
         creator = c.get("creator_wallet")
         if creator and creator in seen_creators and len(diverse_results) < limit // 2:
             continue
         if creator:
             seen_creators.add(creator)
+        seen_clusters.add(cluster)
         diverse_results.append(c)
         if len(diverse_results) >= limit:
             break
 
+    annotate(results=len(diverse_results))
     return RecommendResponse(
         recommendations=[
             RecommendResult(
@@ -74,3 +131,4 @@ async def recommend(
         ],
         taste_profile=taste_profile,
     )
+
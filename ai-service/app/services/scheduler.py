@@ -0,0 +1,158 @@
+"""
+Priority-aware scheduler for upstream calls (Gemini, Voyage).
+
+Interactive requests (upload moderation), standard requests (search) and
+background requests (analysis, feed refresh, reranking) share the same event
+loop and upstream clients. Without scheduling an analysis backfill can take
+every upstream slot and delay uploads.
+
+Every upstream call takes a slot from this scheduler first:
+
+- The total number of concurrent upstream calls is capped.
+- Each priority class has reserved slots that only it can use, so moderation
+  always has capacity. The rest form a shared pool.
+- When a slot frees up, waiters are served by weighted fair queueing. Each
+  class gets a share of the shared pool in proportion to its weight, so
+  background work slows down under load but is never starved.
+- A waiter that queues longer than its class deadline is shed with a 503.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from app.config import get_settings
+from app.utils import metrics
+from app.utils.errors import UpstreamUnavailableError
+from app.utils.request_context import Priority, current_priority
+
+
+class _Waiter:
+    __slots__ = ("finish", "priority", "future")
+
+    def __init__(self, finish: float, priority: Priority, future: asyncio.Future):
+        self.finish = finish
+        self.priority = priority
+        self.future = future
+
+
+class WeightedFairScheduler:
+    def __init__(
+        self,
+        capacity: int,
+        reserved: dict[Priority, int],
+        weights: dict[Priority, float],
+    ):
+        self.capacity = capacity
+        self.reserved = {p: reserved.get(p, 0) for p in Priority}
+        self.weights = {p: weights.get(p, 1.0) for p in Priority}
+        self.shared_capacity = max(0, capacity - sum(self.reserved.values()))
+        self.in_flight = {p: 0 for p in Priority}
+        self._queues: dict[Priority, deque[_Waiter]] = {p: deque() for p in Priority}
+        self._virtual_time = 0.0
+        self._last_finish = {p: 0.0 for p in Priority}
+
+    def queued(self, priority: Priority) -> int:
+        return len(self._queues[priority])
+
+    def _shared_in_use(self) -> int:
+        return sum(max(0, self.in_flight[p] - self.reserved[p]) for p in Priority)
+
+    def _can_run(self, priority: Priority) -> bool:
+        if self.in_flight[priority] < self.reserved[priority]:
+            return True
+        return self._shared_in_use() < self.shared_capacity
+
+    def _dispatch(self) -> None:
+        """Hand free slots to runnable waiters with the smallest finish tag."""
+        while True:
+            best: _Waiter | None = None
+            for priority, queue in self._queues.items():
+                while queue and queue[0].future.done():
+                    queue.popleft()
+                if queue and self._can_run(priority) and (best is None or queue[0].finish < best.finish):
+                    best = queue[0]
+            if best is None:
+                return
+            self._queues[best.priority].popleft()
+            self._virtual_time = max(self._virtual_time, best.finish)
+            self.in_flight[best.priority] += 1
+            best.future.set_result(None)
+
+    async def acquire(self, priority: Priority, max_wait: float) -> None:
+        # Dispatch runs on every release, so an empty queue plus a free slot
+        # means nobody else is waiting for this slot
+        if not self._queues[priority] and self._can_run(priority):
+            self.in_flight[priority] += 1
+            return
+
+        start = max(self._virtual_time, self._last_finish[priority])
+        finish = start + 1.0 / self.weights[priority]
+        self._last_finish[priority] = finish
+        waiter = _Waiter(finish, priority, asyncio.get_running_loop().create_future())
+        self._queues[priority].append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout=max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted in the same loop iteration the deadline passed
+                self.release(priority)
+            metrics.counter("scheduler_shed_total", priority=priority.name.lower()).inc()
+            raise UpstreamUnavailableError(
+                "AI service is busy. Please try again later.",
+                retry_after=max_wait,
+            ) from None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(priority)
+            raise
+
+    def release(self, priority: Priority) -> None:
+        self.in_flight[priority] -= 1
+        self._dispatch()
+
+
+_scheduler: WeightedFairScheduler | None = None
+
+
+def get_scheduler() -> WeightedFairScheduler:
+    global _scheduler
+    if _scheduler is None:
+        settings = get_settings()
+        _scheduler = WeightedFairScheduler(
+            capacity=settings.scheduler_max_concurrency,
+            reserved={
+                Priority.INTERACTIVE: settings.scheduler_reserved_interactive,
+                Priority.STANDARD: settings.scheduler_reserved_standard,
+            },
+            weights={
+                Priority.INTERACTIVE: settings.scheduler_weight_interactive,
+                Priority.STANDARD: settings.scheduler_weight_standard,
+                Priority.BACKGROUND: settings.scheduler_weight_background,
+            },
+        )
+    return _scheduler
+
+
+@asynccontextmanager
+async def slot(priority: Priority | None = None):
+    """Hold an upstream slot for the current request's priority class."""
+    if priority is None:
+        priority = current_priority.get()
+    settings = get_settings()
+    max_wait = (
+        settings.scheduler_background_max_queue_seconds
+        if priority >= Priority.BACKGROUND
+        else settings.scheduler_max_queue_seconds
+    )
+
+    scheduler = get_scheduler()
+    start = time.perf_counter()
+    await scheduler.acquire(priority, max_wait)
+    metrics.histogram("scheduler_queue_seconds", priority=priority.name.lower()).observe(
+        time.perf_counter() - start
+    )
+    try:
+        yield
+    finally:
+        scheduler.release(priority)
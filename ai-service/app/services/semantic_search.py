@@ -1,5 +1,7 @@
+from datetime import datetime
 from app.services import llm, embeddings, vector_db
 from app.models.schemas import SearchResponse, SearchResult
+from app.utils.tracing import annotate, traced
 
 QUERY_EXPANSION_PROMPT = """Expand this search query into a visual description for image search.
 Query: "{query}"
@@ -7,8 +9,19 @@ Describe what images would match: subjects, settings, mood, visual elements.
 Be specific in 2-3 sentences."""
 
 
-async def search(query: str, limit: int = 50, rerank: bool = True) -> SearchResponse:
-    """Semantic search pipeline with optional re-ranking."""
+@traced("semantic_search.search")
+async def search(
+    query: str,
+    limit: int = 50,
+    rerank: bool = True,
+    since: datetime | None = None,
+    recency: bool = False,
+    collapse_duplicates: bool = True,
+) -> SearchResponse:
+    """
+    Semantic search pipeline with optional re-ranking, time window, recency
+    boost and near-duplicate collapsing.
+    """
     expanded = await llm.generate_text(
         QUERY_EXPANSION_PROMPT.format(query=query), use_thinking=False
     )
@@ -16,7 +29,13 @@ async def search(query: str, limit: int = 50, rerank: bool = True) -> SearchResp
     embedding = await embeddings.generate_query_embedding(f"{query} {expanded}")
 
     await vector_db.ensure_collection()
-    candidates = await vector_db.search_similar(embedding, limit=limit * 2 if rerank else limit)
+    candidates = await vector_db.search_similar(
+        embedding,
+        limit=limit * 2 if rerank else limit,
+        since=int(since.timestamp()) if since else None,
+        recency=recency,
+        collapse=collapse_duplicates,
+    )
 
     if rerank and candidates:
         candidates = await llm.rerank_results(query, candidates, top_k=limit)
@@ -27,8 +46,10 @@ async def search(query: str, limit: int = 50, rerank: bool = True) -> SearchResp
             score=c.get("score", 0),
             description=c.get("description"),
             creator_wallet=c.get("creator_wallet"),
+            cluster_id=c.get("cluster_id"),
         )
         for c in candidates[:limit]
     ]
 
+    annotate(query_chars=len(query), results=len(results))
     return SearchResponse(results=results, expanded_query=expanded)
@@ -1,115 +1,96 @@
-from qdrant_client import AsyncQdrantClient
-from qdrant_client.models import (
-    PointStruct,
-    Filter,
-    FieldCondition,
-    MatchValue,
-    VectorParams,
-    Distance,
-    PayloadSchemaType,
-)
+"""
+Post embedding storage used by the analysis, search and recommendation services.
+
+The functions here delegate to the backend selected by VECTOR_STORE (see
+app.services.vector_stores); Qdrant-specific tooling lives in
+app.services.vector_stores.qdrant.
+"""
+import time
 from app.config import get_settings
-
-_client: AsyncQdrantClient | None = None
-
-
-async def get_client() -> AsyncQdrantClient:
-    global _client
-    if _client is None:
-        settings = get_settings()
-        _client = AsyncQdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
-    return _client
+from app.services.vector_stores import get_store
+from app.utils.metrics import instrument
 
 
 async def ensure_collection():
     """Create collection if it doesn't exist."""
-    client = await get_client()
-    settings = get_settings()
-
-    collections = await client.get_collections()
-    exists = any(c.name == settings.qdrant_collection for c in collections.collections)
-
-    if not exists:
-        await client.create_collection(
-            collection_name=settings.qdrant_collection,
-            vectors_config=VectorParams(size=settings.voyage_dimensions, distance=Distance.COSINE),
-        )
-        await client.create_payload_index(
-            settings.qdrant_collection, "creator_wallet", PayloadSchemaType.KEYWORD
-        )
-        await client.create_payload_index(
-            settings.qdrant_collection, "scene_type", PayloadSchemaType.KEYWORD
-        )
-        await client.create_payload_index(
-            settings.qdrant_collection, "timestamp", PayloadSchemaType.INTEGER
-        )
+    await get_store().ensure_collection()
 
 
+@instrument("vector_db.upsert_post")
 async def upsert_post(
     post_id: str,
     embedding: list[float],
     payload: dict,
 ):
     """Index or update a post embedding."""
-    client = await get_client()
-    settings = get_settings()
-
-    await client.upsert(
-        collection_name=settings.qdrant_collection,
-        points=[PointStruct(id=post_id, vector=embedding, payload=payload)],
-    )
+    await get_store().upsert(post_id, embedding, payload)
 
 
+@instrument("vector_db.search_similar")
 async def search_similar(
     embedding: list[float],
     limit: int = 50,
     exclude_ids: list[str] | None = None,
     creator_filter: str | None = None,
+    exact: bool = False,
+    since: int | None = None,
+    recency: bool = False,
+    collapse: bool = False,
 ) -> list[dict]:
-    """Search for similar posts by embedding."""
-    client = await get_client()
+    """
+    Search for similar posts by embedding. `exact=True` skips the ANN index.
+
+    `since` (Unix seconds) is a range filter applied inside the index, so only
+    posts created at or after it are scanned. `recency=True` over-fetches
+    RECENCY_CANDIDATES times the limit and reranks by `recency_boost`.
+    `collapse=True` keeps only the best post of each near-duplicate cluster.
+    """
+    store = get_store()
+    if not recency:
+        return await store.search(embedding, limit, exclude_ids, creator_filter, exact, since, collapse)
+    fetch = limit * get_settings().recency_candidates
+    results = await store.search(embedding, fetch, exclude_ids, creator_filter, exact, since, collapse)
+    return recency_boost(results)[:limit]
+
+
+def recency_boost(results: list[dict], now: float | None = None) -> list[dict]:
+    """
+    Blend each result's similarity with an exponential decay on its age and
+    re-sort, best first. Posts without a timestamp get no boost.
+    """
     settings = get_settings()
-
-    filter_conditions = []
-    if creator_filter:
-        filter_conditions.append(
-            FieldCondition(field="creator_wallet", match=MatchValue(value=creator_filter))
-        )
-
-    query_filter = Filter(must=filter_conditions) if filter_conditions else None
-
-    results = await client.search(
-        collection_name=settings.qdrant_collection,
-        query_vector=embedding,
-        limit=limit + len(exclude_ids or []),
-        query_filter=query_filter,
-        with_payload=True,
-    )
-
-    exclude_set = set(exclude_ids or [])
-    return [
-        {"post_id": str(r.id), "score": r.score, **(r.payload or {})}
-        for r in results
-        if str(r.id) not in exclude_set
-    ][:limit]
+    now = time.time() if now is None else now
+    weight, half_life = settings.recency_weight, settings.recency_half_life_seconds
+    boosted = []
+    for r in results:
+        timestamp = r.get("timestamp") or 0
+        freshness = 0.5 ** (max(0.0, now - timestamp) / half_life) if timestamp else 0.0
+        boosted.append({**r, "score": (1 - weight) * r.get("score", 0) + weight * freshness})
+    return sorted(boosted, key=lambda r: -r["score"])
 
 
+@instrument("vector_db.get_posts_by_ids")
 async def get_posts_by_ids(post_ids: list[str]) -> list[dict]:
     """Retrieve posts by their IDs."""
     if not post_ids:
         return []
+    return await get_store().retrieve(post_ids)
+
+
+def scan_posts(batch_size: int = 256):
+    """Async iterator over every stored post, in batches of {"post_id", "embedding", **payload}."""
+    return get_store().scan(batch_size)
+
+
+async def ping():
+    """Health probe: raises if the vector store is unreachable."""
+    await get_store().ping()
+
+
+async def run_background():
+    """Backend maintenance (snapshots, replica sync); runs until cancelled."""
+    await get_store().run_background()
 
-    client = await get_client()
-    settings = get_settings()
 
-    results = await client.retrieve(
-        collection_name=settings.qdrant_collection,
-        ids=post_ids,
-        with_payload=True,
-        with_vectors=True,
-    )
-
-    return [
-        {"post_id": str(r.id), "embedding": r.vector, **(r.payload or {})}
-        for r in results
-    ]
+async def close():
+    await get_store().close()
@@ -0,0 +1,50 @@
+"""
+Vector store backends behind app.services.vector_db.
+
+VECTOR_STORE selects one of:
+- qdrant: hosted Qdrant (default)
+- local: in-process NumPy/IVF index persisted under LOCAL_VECTOR_STORE_PATH,
+  with no network dependency
+- replica: Qdrant for writes, an in-process replica synced from it for reads
+
+Backends are imported when the store is created; qdrant-client alone takes
+about a second to import.
+"""
+from app.config import get_settings
+from app.services.vector_stores.base import VectorStore
+from app.services.vector_stores.local import LocalVectorStore
+
+_store: VectorStore | None = None
+
+
+def _local_store() -> LocalVectorStore:
+    settings = get_settings()
+    return LocalVectorStore(
+        path=settings.local_vector_store_path,
+        dim=settings.voyage_dimensions,
+        ivf_min_points=settings.local_vector_ivf_min_points,
+        nprobe=settings.local_vector_ivf_nprobe,
+        snapshot_seconds=settings.local_vector_snapshot_seconds,
+    )
+
+
+def create_store(kind: str) -> VectorStore:
+    if kind == "qdrant":
+        from app.services.vector_stores.qdrant import QdrantStore
+
+        return QdrantStore()
+    if kind == "local":
+        return _local_store()
+    if kind == "replica":
+        from app.services.vector_stores.qdrant import QdrantStore
+        from app.services.vector_stores.replica import ReplicaStore
+
+        return ReplicaStore(QdrantStore(), _local_store(), get_settings().local_vector_replica_sync_seconds)
+    raise ValueError(f"Unknown vector store: {kind}")
+
+
+def get_store() -> VectorStore:
+    global _store
+    if _store is None:
+        _store = create_store(get_settings().vector_store)
+    return _store
@@ -0,0 +1,56 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+
+class VectorStore(ABC):
+    """
+    Storage for post embeddings and their payloads.
+
+    Results are plain dicts: search returns {"post_id", "score", **payload}
+    and retrieve returns {"post_id", "embedding", **payload}, so callers never
+    see backend types. Scores are cosine similarities.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def ensure_collection(self) -> None:
+        """Create the posts collection/index if it does not exist yet."""
+
+    @abstractmethod
+    async def upsert(self, post_id: str, embedding: list[float], payload: dict) -> None:
+        """Index or replace one post."""
+
+    @abstractmethod
+    async def search(
+        self,
+        embedding: list[float],
+        limit: int = 50,
+        exclude_ids: list[str] | None = None,
+        creator_filter: str | None = None,
+        exact: bool = False,
+        since: int | None = None,
+        collapse: bool = False,
+    ) -> list[dict]:
+        """
+        Nearest posts by cosine similarity, best first. `since` (Unix
+        seconds) restricts the search to posts with a timestamp at or after it.
+        `collapse` returns only the best post per `cluster_id` payload value.
+        """
+
+    @abstractmethod
+    async def retrieve(self, post_ids: list[str]) -> list[dict]:
+        """Posts by ID, with their embeddings. Unknown IDs are skipped."""
+
+    @abstractmethod
+    def scan(self, batch_size: int = 256) -> AsyncIterator[list[dict]]:
+        """Yield every post as batches of {"post_id", "embedding", **payload}."""
+
+    async def ping(self) -> None:
+        """Cheapest round trip to the backend, for health probes; raises if unreachable."""
+
+    async def run_background(self) -> None:
+        """Long-running maintenance (snapshots, replication). Runs until cancelled."""
+
+    async def close(self) -> None:
+        """Flush state and release connections."""
@@ -0,0 +1,417 @@
+"""
+In-process vector store: a NumPy memory-mapped float32 matrix with an IVF index.
+
+Vectors are L2-normalized on insert so cosine similarity is a dot product.
+They live in `vectors.f32` under the store directory, memory-mapped so the
+OS pages them in on demand. The file grows by doubling.
+
+- Index: an inverted-file (IVF) index over k-means centroids. It is trained
+  once the store holds `ivf_min_points` vectors and retrained whenever the
+  store has doubled since, in a background thread so the upsert that
+  crosses the threshold does not pay for it. Each row keeps the ID of its
+  nearest centroid. A query scores only the rows in its `nprobe` closest
+  lists. Below the training threshold, and for `exact=True`, every row is
+  scored.
+- Filtering: keyword payload fields (creator_wallet, scene_type) have an
+  inverted index of rows, and post timestamps are kept in an int64 array for
+  time-window filters. Filtered queries score only matching rows. If the
+  probed lists hold too few matches, they fall back to an exact scan over
+  the matches.
+- Persistence: `snapshot()` flushes the matrix and atomically replaces
+  state.json (IDs and payloads) and ivf.npz (centroids and assignments).
+  A new store at the same path loads the last snapshot. Writes made after
+  the last snapshot are lost on a crash.
+
+Methods are blocking and guarded by a lock. The async VectorStore methods
+run them in a worker thread.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from app.services.vector_stores.base import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Payload fields with an inverted index, like the Qdrant keyword indexes
+KEYWORD_FIELDS = ("creator_wallet", "scene_type")
+INITIAL_CAPACITY = 1024
+KMEANS_ITERATIONS = 10
+KMEANS_MAX_SAMPLE = 50_000
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def train_centroids(sample: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: unit-length centroids maximizing dot product with their members."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty lists from random points so every centroid stays useful
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class LocalIndex:
+    def __init__(self, path: str, dim: int, ivf_min_points: int = 4096, nprobe: int = 8):
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.ivf_min_points = ivf_min_points
+        self.nprobe = nprobe
+        self.dirty = False
+        self._lock = threading.RLock()
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._payloads: list[dict] = []
+        self._keywords: dict[str, dict[str, set[int]]] = {f: {} for f in KEYWORD_FIELDS}
+        self._centroids: np.ndarray | None = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._timestamps = np.zeros(0, dtype=np.int64)
+        self._trained_count = 0
+        # Set while a background training run is in flight, so only one runs
+        self._training = False
+        self._trainer: threading.Thread | None = None
+        self._capacity = 0
+        self._vectors: np.memmap | None = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def _vector_file(self) -> Path:
+        return self.dir / "vectors.f32"
+
+    def _map(self, capacity: int) -> None:
+        """(Re)map the vector file with room for `capacity` rows, growing it if needed."""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        size = capacity * self.dim * 4
+        with open(self._vector_file, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(self._vector_file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+        if len(self._assign) < capacity:
+            self._assign = np.concatenate([self._assign, np.zeros(capacity - len(self._assign), dtype=np.int32)])
+        if len(self._timestamps) < capacity:
+            self._timestamps = np.concatenate(
+                [self._timestamps, np.zeros(capacity - len(self._timestamps), dtype=np.int64)]
+            )
+
+    def _load(self) -> None:
+        state_file = self.dir / "state.json"
+        if not state_file.exists():
+            self._map(INITIAL_CAPACITY)
+            return
+        state = json.loads(state_file.read_text())
+        if state["dim"] != self.dim:
+            raise ValueError(f"Local vector store at {self.dir} has dim {state['dim']}, expected {self.dim}")
+        self._ids = state["ids"]
+        self._payloads = state["payloads"]
+        self._rows = {post_id: row for row, post_id in enumerate(self._ids)}
+        self._map(max(INITIAL_CAPACITY, state["capacity"]))
+        for row, payload in enumerate(self._payloads):
+            self._index_payload(row, payload)
+        ivf_file = self.dir / "ivf.npz"
+        if ivf_file.exists():
+            ivf = np.load(ivf_file)
+            self._centroids = ivf["centroids"]
+            self._assign[: len(ivf["assign"])] = ivf["assign"]
+            self._trained_count = int(ivf["trained_count"])
+        logger.info(f"Loaded local vector store with {len(self._ids)} vectors from {self.dir}")
+
+    def snapshot(self) -> None:
+        """Persist the current state; safe to call while serving."""
+        with self._lock:
+            self._vectors.flush()
+            state = {
+                "dim": self.dim,
+                "capacity": self._capacity,
+                "ids": list(self._ids),
+                "payloads": list(self._payloads),
+            }
+            centroids, assign, trained = self._centroids, self._assign[: len(self._ids)].copy(), self._trained_count
+            self.dirty = False
+
+        tmp = self.dir / "state.json.tmp"
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.dir / "state.json")
+        if centroids is not None:
+            tmp = self.dir / "ivf.tmp.npz"
+            np.savez(tmp, centroids=centroids, assign=assign, trained_count=trained)
+            os.replace(tmp, self.dir / "ivf.npz")
+
+    def close(self) -> None:
+        self.wait_for_training()
+        self.snapshot()
+        with self._lock:
+            self._vectors.flush()
+
+    def _index_payload(self, row: int, payload: dict) -> None:
+        for field, index in self._keywords.items():
+            value = payload.get(field)
+            if value is not None:
+                index.setdefault(str(value), set()).add(row)
+        self._timestamps[row] = int(payload.get("timestamp") or 0)
+
+    def _unindex_payload(self, row: int, payload: dict) -> None:
+        for field, index in self._keywords.items():
+            value = payload.get(field)
+            if value is not None:
+                index.get(str(value), set()).discard(row)
+
+    def upsert(self, post_id: str, embedding: list[float], payload: dict) -> None:
+        vector = _normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            row = self._rows.get(post_id)
+            if row is None:
+                row = len(self._ids)
+                if row >= self._capacity:
+                    self._map(self._capacity * 2)
+                self._ids.append(post_id)
+                self._payloads.append(payload)
+                self._rows[post_id] = row
+            else:
+                self._unindex_payload(row, self._payloads[row])
+                self._payloads[row] = payload
+            self._vectors[row] = vector
+            self._index_payload(row, payload)
+            if self._centroids is not None:
+                self._assign[row] = int(np.argmax(self._centroids @ vector))
+            self.dirty = True
+            needs_training = (
+                not self._training
+                and len(self._ids) >= self.ivf_min_points
+                and len(self._ids) >= 2 * self._trained_count
+            )
+            if needs_training:
+                self._training = True
+        if needs_training:
+            self._trainer = threading.Thread(target=self._train_in_background, name="ivf-train", daemon=True)
+            self._trainer.start()
+
+    def upsert_many(self, points: list[tuple[str, list[float], dict]]) -> None:
+        """Upsert (post_id, embedding, payload) tuples in one call."""
+        for post_id, embedding, payload in points:
+            self.upsert(post_id, embedding, payload)
+
+    def wait_for_training(self, timeout: float | None = None) -> None:
+        """Block until a background training run, if any, has finished."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def _train_in_background(self) -> None:
+        try:
+            self.train()
+        except Exception:
+            logger.exception("IVF training failed")
+        finally:
+            with self._lock:
+                self._training = False
+
+    def train(self) -> None:
+        """(Re)build the IVF index over the current vectors."""
+        with self._lock:
+            count = len(self._ids)
+            rng = np.random.default_rng(count)
+            sample_rows = np.sort(rng.choice(count, size=min(count, KMEANS_MAX_SAMPLE), replace=False))
+            sample = np.asarray(self._vectors[sample_rows])
+        # No more lists than sampled points, for stores trained below 16 vectors
+        n_lists = min(int(min(4096, max(16, np.sqrt(count)))), len(sample))
+        start = time.perf_counter()
+        centroids = train_centroids(sample, n_lists)
+
+        with self._lock:
+            # Rows added while training are assigned here too
+            count = len(self._ids)
+            assign = np.empty(count, dtype=np.int32)
+            for i in range(0, count, 65_536):
+                end = min(count, i + 65_536)
+                assign[i:end] = np.argmax(self._vectors[i:end] @ centroids.T, axis=1)
+            self._centroids = centroids
+            self._assign[:count] = assign
+            self._trained_count = count
+            self.dirty = True
+        logger.info(f"Trained IVF index: {n_lists} lists over {count} vectors in {time.perf_counter() - start:.1f}s")
+
+    def _filter_rows(self, creator_filter: str | None, since: int | None) -> np.ndarray | None:
+        rows = None
+        if creator_filter is not None:
+            rows = np.fromiter(self._keywords["creator_wallet"].get(creator_filter, ()), dtype=np.int64)
+        if since is not None:
+            if rows is None:
+                rows = np.flatnonzero(self._timestamps[: len(self._ids)] >= since)
+            else:
+                rows = rows[self._timestamps[rows] >= since]
+        return rows
+
+    def search(
+        self,
+        embedding: list[float],
+        limit: int = 50,
+        exclude_ids: list[str] | None = None,
+        creator_filter: str | None = None,
+        exact: bool = False,
+        since: int | None = None,
+        collapse: bool = False,
+        nprobe: int | None = None,
+    ) -> list[dict]:
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        exclude = set(exclude_ids or [])
+        fetch = limit + len(exclude)
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return []
+            filtered = self._filter_rows(creator_filter, since)
+
+            rows = filtered
+            if not exact and self._centroids is not None:
+                n_probe = min(nprobe or self.nprobe, len(self._centroids))
+                probe = np.argpartition(-(self._centroids @ query), n_probe - 1)[:n_probe]
+                in_lists = np.isin(self._assign[:count], probe)
+                if filtered is None:
+                    rows = np.flatnonzero(in_lists)
+                else:
+                    rows = filtered[in_lists[filtered]]
+                    if len(rows) < fetch:
+                        # Selective filter: exact scan over its matches is cheap
+                        rows = filtered
+
+            if rows is None:
+                scores = np.asarray(self._vectors[:count] @ query)
+                rows = np.arange(count)
+            else:
+                rows = np.sort(rows)
+                scores = np.asarray(self._vectors[rows] @ query) if len(rows) else np.zeros(0, dtype=np.float32)
+
+            results = []
+            clusters: set[str] = set()
+            k, done = min(fetch, len(rows)), 0
+            while k > done:
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top], kind="stable")]
+                for i in top[done:]:
+                    post_id = self._ids[rows[i]]
+                    if post_id in exclude:
+                        continue
+                    payload = self._payloads[rows[i]]
+                    if collapse:
+                        # Keep only the best hit of each near-duplicate cluster
+                        cluster = payload.get("cluster_id") or post_id
+                        if cluster in clusters:
+                            continue
+                        clusters.add(cluster)
+                    results.append({"post_id": post_id, "score": float(scores[i]), **payload})
+                    if len(results) >= limit:
+                        return results
+                if not collapse:
+                    break
+                # Collapsed duplicates left too few results; widen the candidate set
+                k, done = min(len(rows), k * 4), k
+            return results
+
+    def read_batch(self, start: int, size: int) -> list[dict]:
+        """Rows [start, start + size) as {"post_id", "embedding", **payload}."""
+        with self._lock:
+            end = min(len(self._ids), start + size)
+            return [
+                {"post_id": self._ids[row], "embedding": self._vectors[row].tolist(), **self._payloads[row]}
+                for row in range(start, end)
+            ]
+
+    def retrieve(self, post_ids: list[str]) -> list[dict]:
+        with self._lock:
+            return [
+                {"post_id": post_id, "embedding": self._vectors[row].tolist(), **self._payloads[row]}
+                for post_id in post_ids
+                if (row := self._rows.get(post_id)) is not None
+            ]
+
+
+class LocalVectorStore(VectorStore):
+    """VectorStore backed by a LocalIndex, with periodic snapshots."""
+
+    name = "local"
+
+    def __init__(self, path: str, dim: int, ivf_min_points: int, nprobe: int, snapshot_seconds: float):
+        self.path = path
+        self.dim = dim
+        self.ivf_min_points = ivf_min_points
+        self.nprobe = nprobe
+        self.snapshot_seconds = snapshot_seconds
+        self.index: LocalIndex | None = None
+
+    def _get_index(self) -> LocalIndex:
+        if self.index is None:
+            self.index = LocalIndex(self.path, self.dim, self.ivf_min_points, self.nprobe)
+        return self.index
+
+    async def ensure_collection(self) -> None:
+        if self.index is None:
+            await asyncio.to_thread(self._get_index)
+
+    async def upsert(self, post_id: str, embedding: list[float], payload: dict) -> None:
+        await asyncio.to_thread(self._get_index().upsert, post_id, embedding, payload)
+
+    async def upsert_many(self, points: list[tuple[str, list[float], dict]]) -> None:
+        await asyncio.to_thread(self._get_index().upsert_many, points)
+
+    async def search(
+        self,
+        embedding: list[float],
+        limit: int = 50,
+        exclude_ids: list[str] | None = None,
+        creator_filter: str | None = None,
+        exact: bool = False,
+        since: int | None = None,
+        collapse: bool = False,
+    ) -> list[dict]:
+        return await asyncio.to_thread(
+            self._get_index().search, embedding, limit, exclude_ids, creator_filter, exact, since, collapse
+        )
+
+    async def retrieve(self, post_ids: list[str]) -> list[dict]:
+        if not post_ids:
+            return []
+        return await asyncio.to_thread(self._get_index().retrieve, post_ids)
+
+    async def scan(self, batch_size: int = 256):
+        index = self._get_index()
+        start = 0
+        while True:
+            batch = await asyncio.to_thread(index.read_batch, start, batch_size)
+            if not batch:
+                return
+            yield batch
+            start += len(batch)
+
+    async def run_background(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_seconds)
+            if self.index is not None and self.index.dirty:
+                try:
+                    await asyncio.to_thread(self.index.snapshot)
+                except Exception:
+                    logger.exception("Local vector store snapshot failed")
+
+    async def close(self) -> None:
+        if self.index is not None:
+            await asyncio.to_thread(self.index.close)
@@ -0,0 +1,472 @@
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    PointStruct,
+    Filter,
+    FieldCondition,
+    MatchValue,
+    Range,
+    IntegerIndexParams,
+    IntegerIndexType,
+    VectorParams,
+    VectorParamsDiff,
+    Distance,
+    PayloadSchemaType,
+    HnswConfigDiff,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    SearchParams,
+    QuantizationSearchParams,
+    Prefetch,
+    IsEmptyCondition,
+    PayloadField,
+    SetPayload,
+    SetPayloadOperation,
+)
+from app.config import get_settings
+from app.services.vector_stores.base import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Named vectors: "full" for rescoring and "coarse" (a Matryoshka prefix of the
+# full embedding) for fast candidate retrieval. Collections created before
+# named vectors have a single unnamed vector and are searched in one stage.
+FULL_VECTOR = "full"
+COARSE_VECTOR = "coarse"
+# Payload field holding the near-duplicate cluster (see app.services.dedup)
+CLUSTER_FIELD = "cluster_id"
+
+_client: AsyncQdrantClient | None = None
+# Collection name -> whether it uses named vectors
+_named_vectors: dict[str, bool] = {}
+# Collections ensure_collection() has finished with in this process
+_ensured: set[str] = set()
+
+
+async def get_client() -> AsyncQdrantClient:
+    global _client
+    if _client is None:
+        settings = get_settings()
+        _client = AsyncQdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
+    return _client
+
+
+def quantization_config(kind: str | None = None) -> ScalarQuantization | BinaryQuantization | None:
+    """
+    Quantization config for `kind` ("scalar", "binary" or "none"; defaults to
+    Settings). Quantized vectors always stay in RAM.
+    """
+    kind = kind or get_settings().qdrant_quantization
+    if kind == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def hnsw_config() -> HnswConfigDiff:
+    settings = get_settings()
+    return HnswConfigDiff(m=settings.qdrant_hnsw_m, ef_construct=settings.qdrant_hnsw_ef_construct)
+
+
+def search_params(exact: bool = False) -> SearchParams:
+    """Query-time HNSW ef and oversampling + rescore over the quantized index."""
+    settings = get_settings()
+    quantization = None
+    if settings.qdrant_quantization != "none":
+        quantization = QuantizationSearchParams(
+            rescore=settings.qdrant_rescore,
+            oversampling=settings.qdrant_oversampling,
+        )
+    return SearchParams(hnsw_ef=settings.qdrant_hnsw_ef, exact=exact, quantization=quantization)
+
+
+def timestamp_index() -> IntegerIndexParams:
+    """
+    Range-only index on the post timestamp. Marking it principal makes Qdrant
+    lay out storage by timestamp, so time-window filters read only the
+    matching segment of the collection.
+    """
+    return IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=False, range=True, is_principal=True)
+
+
+async def _create_payload_indexes(client: AsyncQdrantClient, collection: str) -> None:
+    await client.create_payload_index(collection, "creator_wallet", PayloadSchemaType.KEYWORD)
+    await client.create_payload_index(collection, "scene_type", PayloadSchemaType.KEYWORD)
+    await client.create_payload_index(collection, "timestamp", timestamp_index())
+    await client.create_payload_index(collection, CLUSTER_FIELD, PayloadSchemaType.KEYWORD)
+
+
+def coarse_vector(embedding: list[float]) -> list[float]:
+    """
+    Truncate an embedding to the coarse dimension and re-normalize. Voyage
+    embeddings are Matryoshka-trained, so the prefix is itself a usable
+    lower-dimensional embedding.
+    """
+    prefix = embedding[: get_settings().qdrant_coarse_dimensions]
+    norm = sum(x * x for x in prefix) ** 0.5
+    return [x / norm for x in prefix] if norm else prefix
+
+
+def vectors_config() -> VectorParams | dict[str, VectorParams]:
+    """
+    Vector layout for new collections. With QDRANT_COARSE_DIMENSIONS set, the
+    coarse vector stays in RAM and the full vector follows
+    QDRANT_VECTORS_ON_DISK.
+    """
+    settings = get_settings()
+    full = VectorParams(
+        size=settings.voyage_dimensions,
+        distance=Distance.COSINE,
+        on_disk=settings.qdrant_vectors_on_disk,
+    )
+    if not 0 < settings.qdrant_coarse_dimensions < settings.voyage_dimensions:
+        return full
+    return {
+        FULL_VECTOR: full,
+        COARSE_VECTOR: VectorParams(
+            size=settings.qdrant_coarse_dimensions,
+            distance=Distance.COSINE,
+            on_disk=False,
+        ),
+    }
+
+
+def point_vectors(embedding: list[float], named: bool) -> list[float] | dict[str, list[float]]:
+    if not named:
+        return embedding
+    return {FULL_VECTOR: embedding, COARSE_VECTOR: coarse_vector(embedding)}
+
+
+def full_vector(vector) -> list[float] | None:
+    """The full embedding from a retrieved point's vector(s)."""
+    if isinstance(vector, dict):
+        return vector.get(FULL_VECTOR)
+    return vector
+
+
+async def create_collection(client: AsyncQdrantClient, name: str, quantization: str | None = None) -> None:
+    """Create a posts collection with the configured layout, HNSW and quantization."""
+    vectors = vectors_config()
+    await client.create_collection(
+        collection_name=name,
+        vectors_config=vectors,
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization_config(quantization),
+    )
+    _named_vectors[name] = isinstance(vectors, dict)
+    await _create_payload_indexes(client, name)
+
+
+async def uses_named_vectors(client: AsyncQdrantClient, name: str) -> bool:
+    named = _named_vectors.get(name)
+    if named is None:
+        info = await client.get_collection(name)
+        named = _named_vectors[name] = isinstance(info.config.params.vectors, dict)
+    return named
+
+
+async def ensure_collection():
+    """
+    Create collection if it doesn't exist. An existing one gets the cluster_id
+    index, and its points without a cluster_id get their own ID, since grouped
+    searches leave those points out. Both are no-ops once done.
+    """
+    settings = get_settings()
+    if settings.qdrant_collection in _ensured:
+        return
+    client = await get_client()
+
+    collections = await client.get_collections()
+    exists = any(c.name == settings.qdrant_collection for c in collections.collections)
+
+    if not exists:
+        await create_collection(client, settings.qdrant_collection)
+    else:
+        await client.create_payload_index(settings.qdrant_collection, CLUSTER_FIELD, PayloadSchemaType.KEYWORD)
+        backfilled = await backfill_cluster_ids(client, settings.qdrant_collection)
+        if backfilled:
+            logger.info(f"Gave {backfilled} posts without a cluster_id their own cluster")
+    await uses_named_vectors(client, settings.qdrant_collection)
+    _ensured.add(settings.qdrant_collection)
+
+
+async def migrate_collection() -> None:
+    """
+    Apply the current quantization, HNSW, on-disk and payload index settings
+    to an existing collection. Qdrant rebuilds the quantized vectors, HNSW
+    graph and payload indexes in the background; the collection keeps serving
+    queries while it does. Points indexed before dedup get their own ID as
+    cluster_id so grouped searches include them.
+
+    Changing the vector layout (adding the coarse vector) needs a new
+    collection; see scripts/backfill_vectors.py.
+    """
+    client = await get_client()
+    settings = get_settings()
+    named = await uses_named_vectors(client, settings.qdrant_collection)
+    await client.update_collection(
+        collection_name=settings.qdrant_collection,
+        vectors_config={
+            FULL_VECTOR if named else "": VectorParamsDiff(on_disk=settings.qdrant_vectors_on_disk)
+        },
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization_config() or Disabled.DISABLED,
+    )
+    await client.create_payload_index(settings.qdrant_collection, "timestamp", timestamp_index())
+    await client.create_payload_index(settings.qdrant_collection, CLUSTER_FIELD, PayloadSchemaType.KEYWORD)
+    await backfill_cluster_ids(client, settings.qdrant_collection)
+
+
+async def backfill_cluster_ids(client: AsyncQdrantClient, collection: str, batch_size: int = 256) -> int:
+    """Set cluster_id to the point's own ID wherever it is missing. Returns how many."""
+    missing = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key=CLUSTER_FIELD))])
+    updated = 0
+    while True:
+        # Updated points no longer match the filter, so always read the first page
+        points, _ = await client.scroll(collection, scroll_filter=missing, limit=batch_size, with_payload=False)
+        if not points:
+            return updated
+        await client.batch_update_points(
+            collection,
+            [
+                SetPayloadOperation(set_payload=SetPayload(payload={CLUSTER_FIELD: str(p.id)}, points=[p.id]))
+                for p in points
+            ],
+        )
+        updated += len(points)
+
+
+async def backfill_timestamps(
+    client: AsyncQdrantClient,
+    collection: str,
+    lookup: Callable[[list[str]], Awaitable[dict[str, str]]],
+    batch_size: int = 100,
+) -> int:
+    """
+    Set the creation time on points indexed without one (timestamp 0 or
+    missing), from `lookup`: post IDs -> ISO 8601 times. Points the lookup
+    does not know keep 0. Returns how many were updated.
+    """
+    missing = Filter(should=[
+        IsEmptyCondition(is_empty=PayloadField(key="timestamp")),
+        FieldCondition(key="timestamp", range=Range(lte=0)),
+    ])
+    updated = 0
+    offset = None
+    while True:
+        # Page by ID, so points the lookup cannot resolve are not re-read forever
+        points, offset = await client.scroll(
+            collection, scroll_filter=missing, limit=batch_size, offset=offset, with_payload=False
+        )
+        found = await lookup([str(p.id) for p in points]) if points else {}
+        if found:
+            await client.batch_update_points(
+                collection,
+                [
+                    SetPayloadOperation(set_payload=SetPayload(
+                        payload={"timestamp": int(datetime.fromisoformat(created_at).timestamp())},
+                        points=[post_id],
+                    ))
+                    for post_id, created_at in found.items()
+                ],
+            )
+            updated += len(found)
+        if offset is None:
+            return updated
+
+
+async def upsert_post(
+    post_id: str,
+    embedding: list[float],
+    payload: dict,
+):
+    """Index or update a post embedding."""
+    client = await get_client()
+    settings = get_settings()
+    named = await uses_named_vectors(client, settings.qdrant_collection)
+
+    await client.upsert(
+        collection_name=settings.qdrant_collection,
+        points=[PointStruct(id=post_id, vector=point_vectors(embedding, named), payload=payload)],
+    )
+
+
+async def search_similar(
+    embedding: list[float],
+    limit: int = 50,
+    exclude_ids: list[str] | None = None,
+    creator_filter: str | None = None,
+    exact: bool = False,
+    since: int | None = None,
+    collapse: bool = False,
+) -> list[dict]:
+    """
+    Search for similar posts by embedding, optionally only those with a
+    timestamp at or after `since`.
+
+    With named vectors this is two-stage: the coarse vector retrieves
+    QDRANT_COARSE_CANDIDATES times the limit, and the full vector rescores
+    them. Otherwise it is one search over the quantized index with
+    oversampling and rescoring. `exact=True` does a full scan over the full
+    vectors instead, which is the ground truth for recall benchmarks.
+
+    `collapse=True` groups hits by `cluster_id` inside Qdrant and returns
+    only the best post of each near-duplicate cluster. Points without a
+    cluster_id are left out of grouped searches; `migrate_collection`
+    backfills it.
+    """
+    client = await get_client()
+    settings = get_settings()
+
+    filter_conditions = []
+    if creator_filter:
+        filter_conditions.append(
+            FieldCondition(key="creator_wallet", match=MatchValue(value=creator_filter))
+        )
+    if since is not None:
+        filter_conditions.append(FieldCondition(key="timestamp", range=Range(gte=since)))
+
+    query_filter = Filter(must=filter_conditions) if filter_conditions else None
+
+    fetch = limit + len(exclude_ids or [])
+    named = await uses_named_vectors(client, settings.qdrant_collection)
+    if named and not exact:
+        query = dict(
+            prefetch=Prefetch(
+                query=coarse_vector(embedding),
+                using=COARSE_VECTOR,
+                filter=query_filter,
+                params=search_params(),
+                limit=fetch * settings.qdrant_coarse_candidates,
+            ),
+            query=embedding,
+            using=FULL_VECTOR,
+        )
+    else:
+        query = dict(
+            query=embedding,
+            using=FULL_VECTOR if named else None,
+            search_params=search_params(exact=exact),
+        )
+
+    if collapse:
+        response = await client.query_points_groups(
+            collection_name=settings.qdrant_collection,
+            group_by=CLUSTER_FIELD,
+            group_size=1,
+            limit=fetch,
+            query_filter=query_filter,
+            with_payload=True,
+            **query,
+        )
+        results = [group.hits[0] for group in response.groups]
+    else:
+        response = await client.query_points(
+            collection_name=settings.qdrant_collection,
+            limit=fetch,
+            query_filter=query_filter,
+            with_payload=True,
+            **query,
+        )
+        results = response.points
+
+    exclude_set = set(exclude_ids or [])
+    return [
+        {"post_id": str(r.id), "score": r.score, **(r.payload or {})}
+        for r in results
+        if str(r.id) not in exclude_set
+    ][:limit]
+
+
+async def get_posts_by_ids(post_ids: list[str]) -> list[dict]:
+    """Retrieve posts by their IDs."""
+    if not post_ids:
+        return []
+
+    client = await get_client()
+    settings = get_settings()
+
+    named = await uses_named_vectors(client, settings.qdrant_collection)
+    results = await client.retrieve(
+        collection_name=settings.qdrant_collection,
+        ids=post_ids,
+        with_payload=True,
+        with_vectors=[FULL_VECTOR] if named else True,
+    )
+
+    return [
+        {"post_id": str(r.id), "embedding": full_vector(r.vector), **(r.payload or {})}
+        for r in results
+    ]
+
+
+async def scroll_points(batch_size: int = 256):
+    """Yield batches of {"post_id", "embedding", **payload} for every point in the collection."""
+    client = await get_client()
+    settings = get_settings()
+    named = await uses_named_vectors(client, settings.qdrant_collection)
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            settings.qdrant_collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=[FULL_VECTOR] if named else True,
+        )
+        if points:
+            yield [
+                {"post_id": str(p.id), "embedding": full_vector(p.vector), **(p.payload or {})}
+                for p in points
+            ]
+        if offset is None:
+            return
+
+
+class QdrantStore(VectorStore):
+    """Hosted Qdrant collection (QDRANT_URL / QDRANT_COLLECTION)."""
+
+    name = "qdrant"
+
+    async def ensure_collection(self) -> None:
+        await ensure_collection()
+
+    async def upsert(self, post_id: str, embedding: list[float], payload: dict) -> None:
+        await upsert_post(post_id, embedding, payload)
+
+    async def search(
+        self,
+        embedding: list[float],
+        limit: int = 50,
+        exclude_ids: list[str] | None = None,
+        creator_filter: str | None = None,
+        exact: bool = False,
+        since: int | None = None,
+        collapse: bool = False,
+    ) -> list[dict]:
+        return await search_similar(embedding, limit, exclude_ids, creator_filter, exact, since, collapse)
+
+    async def retrieve(self, post_ids: list[str]) -> list[dict]:
+        return await get_posts_by_ids(post_ids)
+
+    def scan(self, batch_size: int = 256):
+        return scroll_points(batch_size)
+
+    async def ping(self) -> None:
+        client = await get_client()
+        await client.get_collection(get_settings().qdrant_collection)
+
+    async def close(self) -> None:
+        global _client
+        if _client is not None:
+            await _client.close()
+            _client = None
@@ -0,0 +1,88 @@
+"""
+Qdrant as the source of truth with an in-process read replica.
+
+Writes go to Qdrant first, then to the local index. Reads are served from
+the local index once it has been synced, and from Qdrant until then. At
+startup the replica loads its last snapshot and then copies the whole
+collection from Qdrant. The copy repeats every `sync_seconds`, which picks
+up posts indexed by other service instances.
+"""
+import asyncio
+import logging
+from app.services.vector_stores import qdrant
+from app.services.vector_stores.base import VectorStore
+from app.services.vector_stores.local import LocalVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaStore(VectorStore):
+    name = "replica"
+
+    def __init__(self, primary: VectorStore, replica: LocalVectorStore, sync_seconds: float):
+        self.primary = primary
+        self.replica = replica
+        self.sync_seconds = sync_seconds
+        self.synced = False
+
+    def _reader(self) -> VectorStore:
+        return self.replica if self.synced else self.primary
+
+    async def ensure_collection(self) -> None:
+        await self.primary.ensure_collection()
+        await self.replica.ensure_collection()
+
+    async def upsert(self, post_id: str, embedding: list[float], payload: dict) -> None:
+        await self.primary.upsert(post_id, embedding, payload)
+        await self.replica.upsert(post_id, embedding, payload)
+
+    async def search(
+        self,
+        embedding: list[float],
+        limit: int = 50,
+        exclude_ids: list[str] | None = None,
+        creator_filter: str | None = None,
+        exact: bool = False,
+        since: int | None = None,
+        collapse: bool = False,
+    ) -> list[dict]:
+        return await self._reader().search(embedding, limit, exclude_ids, creator_filter, exact, since, collapse)
+
+    async def retrieve(self, post_ids: list[str]) -> list[dict]:
+        return await self._reader().retrieve(post_ids)
+
+    def scan(self, batch_size: int = 256):
+        return self._reader().scan(batch_size)
+
+    async def sync(self) -> int:
+        """Copy every point from Qdrant into the replica. Returns how many."""
+        copied = 0
+        async for batch in qdrant.scroll_points():
+            await self.replica.upsert_many([
+                (p["post_id"], p["embedding"], {k: v for k, v in p.items() if k not in ("post_id", "embedding")})
+                for p in batch
+            ])
+            copied += len(batch)
+        return copied
+
+    async def run_background(self) -> None:
+        snapshots = asyncio.create_task(self.replica.run_background())
+        try:
+            while True:
+                try:
+                    copied = await self.sync()
+                    self.synced = True
+                    logger.info(f"Local vector replica synced {copied} points from Qdrant")
+                except Exception:
+                    logger.exception("Local vector replica sync failed")
+                await asyncio.sleep(self.sync_seconds)
+        finally:
+            snapshots.cancel()
+
+    async def ping(self) -> None:
+        # Reads survive a Qdrant outage once synced, but writes do not
+        await self.primary.ping()
+
+    async def close(self) -> None:
+        await self.replica.close()
+        await self.primary.close()
@@ -0,0 +1,216 @@
+"""
+Admission control for incoming requests.
+
+Every request takes a slot before the app reads its body. A slot is granted
+only while all three limits have room:
+
+- the total number of requests in flight (ADMISSION_MAX_IN_FLIGHT)
+- the route's own cap, for expensive routes (CONCURRENCY_LIMITS in main)
+- the request body bytes in flight (ADMISSION_MAX_BODY_BYTES), taken from
+  Content-Length. This bounds the memory held by base64 images and the
+  copies made while decoding them. A request larger than the whole budget
+  runs only when nothing else is holding bytes.
+
+Otherwise the request waits in one shared queue, and the queue sheds in the
+style of CoDel with adaptive LIFO:
+
+- While the queue drains regularly, waiters are served oldest first and
+  wait up to ADMISSION_MAX_QUEUE_SECONDS.
+- Once the queue has not been empty for ADMISSION_INTERVAL_SECONDS, there
+  is a standing queue and the service is over capacity. Waiters are then
+  served newest first, since the oldest are the likeliest to have given up
+  already. Any waiter that has queued longer than
+  ADMISSION_TARGET_QUEUE_SECONDS is shed.
+
+A shed request gets a 503 with Retry-After, an estimate of when a slot will
+free up. It never holds memory or an upstream slot while it waits to time
+out, and callers back off and retry instead.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from app.config import get_settings
+from app.utils import metrics
+from app.utils.limiter import OverloadedError
+
+
+class _Waiter:
+    __slots__ = ("route", "size", "enqueued_at", "future")
+
+    def __init__(self, route: str, size: int, future: asyncio.Future):
+        self.route = route
+        self.size = size
+        self.enqueued_at = time.monotonic()
+        self.future = future
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_body_bytes: int,
+        route_limits: dict[str, int] | None = None,
+        target_queue_time: float = 0.1,
+        interval: float = 0.5,
+        max_queue_time: float = 2.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_body_bytes = max_body_bytes
+        self.route_limits = route_limits or {}
+        self.target_queue_time = target_queue_time
+        self.interval = interval
+        self.max_queue_time = max_queue_time
+        self.in_flight = 0
+        self.body_bytes = 0
+        self.route_in_flight: dict[str, int] = {}
+        self._waiters: deque[_Waiter] = deque()
+        # When the queue last went from empty to non-empty; None while empty
+        self._backlog_since: float | None = None
+        # Smoothed time a slot is held, for Retry-After
+        self._avg_hold = 0.0
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._waiters)
+
+    def overloaded(self, now: float | None = None) -> bool:
+        """True while a standing queue has persisted for a full interval."""
+        if self._backlog_since is None:
+            return False
+        return (now if now is not None else time.monotonic()) - self._backlog_since >= self.interval
+
+    def _route_full(self, route: str) -> bool:
+        limit = self.route_limits.get(route)
+        return limit is not None and self.route_in_flight.get(route, 0) >= limit
+
+    def _fits(self, route: str, size: int) -> bool:
+        if self.in_flight >= self.max_in_flight or self._route_full(route):
+            return False
+        return self.body_bytes == 0 or self.body_bytes + size <= self.max_body_bytes
+
+    def _take(self, route: str, size: int) -> None:
+        self.in_flight += 1
+        self.body_bytes += size
+        self.route_in_flight[route] = self.route_in_flight.get(route, 0) + 1
+
+    def retry_after(self) -> float:
+        """Rough time until the queue ahead of a new request drains."""
+        if not self._avg_hold:
+            return self.max_queue_time
+        return self._avg_hold * (len(self._waiters) + 1) / max(1, self.in_flight)
+
+    def _shed(self, waiter: _Waiter, reason: str) -> None:
+        metrics.counter("admission_shed_total", route=waiter.route, reason=reason).inc()
+        waiter.future.set_exception(OverloadedError(waiter.route, self.retry_after()))
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        lifo = self.overloaded(now)
+        if lifo:
+            # CoDel drop: anything that has already queued past the target goes
+            while self._waiters and now - self._waiters[0].enqueued_at > self.target_queue_time:
+                waiter = self._waiters.popleft()
+                if not waiter.future.done():
+                    self._shed(waiter, "queue_time")
+        # Grant every waiter that fits, newest first under overload; a waiter
+        # for a saturated route does not block the others
+        for waiter in list(reversed(self._waiters) if lifo else self._waiters):
+            if self.in_flight >= self.max_in_flight:
+                break
+            if waiter.future.done() or not self._fits(waiter.route, waiter.size):
+                continue
+            self._waiters.remove(waiter)
+            self._take(waiter.route, waiter.size)
+            waiter.future.set_result(None)
+        if not self._waiters:
+            self._backlog_since = None
+
+    async def acquire(self, route: str, size: int) -> None:
+        # Dispatch runs on every release, so whoever is still queued is waiting
+        # on a route cap or on global room. Only the latter may not be jumped
+        if self._fits(route, size) and all(self._route_full(w.route) for w in self._waiters):
+            self._take(route, size)
+            return
+
+        now = time.monotonic()
+        if self.overloaded(now):
+            # Served first under LIFO, but only within the target
+            timeout = self.target_queue_time
+        else:
+            timeout = self.max_queue_time
+        if self._backlog_since is None:
+            self._backlog_since = now
+        waiter = _Waiter(route, size, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter.future, timeout=timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Settled in the same loop iteration the timeout fired: keep a
+                # granted slot, and report a shed as the shed it was
+                if waiter.future.exception() is None:
+                    return
+                raise waiter.future.exception() from None
+            self._remove(waiter)
+            metrics.counter("admission_shed_total", route=route, reason="timeout").inc()
+            raise OverloadedError(route, self.retry_after()) from None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self.release(route, size, 0.0)
+            else:
+                self._remove(waiter)
+            raise
+
+    def _remove(self, waiter: _Waiter) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not self._waiters:
+            self._backlog_since = None
+
+    def release(self, route: str, size: int, held: float) -> None:
+        self.in_flight -= 1
+        self.body_bytes -= size
+        self.route_in_flight[route] -= 1
+        if held:
+            self._avg_hold = held if not self._avg_hold else 0.9 * self._avg_hold + 0.1 * held
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, route: str, size: int = 0):
+        start = time.monotonic()
+        await self.acquire(route, size)
+        granted = time.monotonic()
+        metrics.histogram("admission_queue_seconds").observe(granted - start)
+        try:
+            yield
+        finally:
+            self.release(route, size, time.monotonic() - granted)
+
+
+_controller: AdmissionController | None = None
+
+
+def get_controller(route_limits: dict[str, int] | None = None) -> AdmissionController:
+    global _controller
+    if _controller is None:
+        settings = get_settings()
+        _controller = AdmissionController(
+            max_in_flight=settings.admission_max_in_flight,
+            max_body_bytes=settings.admission_max_body_bytes,
+            route_limits=route_limits,
+            target_queue_time=settings.admission_target_queue_seconds,
+            interval=settings.admission_interval_seconds,
+            max_queue_time=settings.admission_max_queue_seconds,
+        )
+        metrics.register_collector("admission", _collect)
+    return _controller
+
+
+def _collect():
+    if _controller is not None:
+        yield "admission_in_flight", {}, _controller.in_flight
+        yield "admission_body_bytes_in_flight", {}, _controller.body_bytes
+        yield "admission_queue_length", {}, _controller.queue_length
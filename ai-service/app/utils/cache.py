@@ -0,0 +1,67 @@
+"""
+Small in-process TTL cache.
+
+Entries carry their own TTL so callers can cache hits and misses for
+different lengths of time (e.g. a blocked hash stays blocked, while a "not
+blocked" answer should expire quickly). Eviction is LRU once max_size is hit.
+All access happens on the event loop thread, so no locking is needed.
+
+A named cache reports its size, hits, misses and hit ratio on /metrics.
+"""
+import time
+from collections import OrderedDict
+from typing import Any
+from app.utils import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, max_size: int = 10_000, name: str | None = None):
+        self.max_size = max_size
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if name:
+            metrics.register_collector(f"cache:{name}", lambda: self._samples(name))
+
+    def _samples(self, name: str) -> list[tuple[str, dict, float]]:
+        lookups = self.hits + self.misses
+        labels = {"cache": name}
+        return [
+            ("cache_entries", labels, len(self._data)),
+            ("cache_hits", labels, self.hits),
+            ("cache_misses", labels, self.misses),
+            ("cache_hit_ratio", labels, self.hits / lookups if lookups else 0.0),
+        ]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Any, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -0,0 +1,82 @@
+"""
+Circuit breaker for upstream dependencies.
+
+closed    -> calls pass through; consecutive failures are counted
+open      -> calls are rejected immediately until reset_timeout elapses
+half_open -> a limited number of probe calls are let through; a success
+             closes the breaker, a failure re-opens it
+"""
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected outright (does not use a probe)."""
+        return self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a probe through."""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """Return True if a call may proceed. Half-open probes must report back."""
+        if self.state == "closed":
+            return True
+
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self._probes_in_flight = 0
+
+        if self._probes_in_flight >= self.half_open_max_calls:
+            return False
+        self._probes_in_flight += 1
+        return True
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe whose call ended without an outcome (e.g. cancelled)."""
+        if self.state == "half_open" and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probes_in_flight = 0
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        if self.state == "half_open":
+            self._trip()
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._trip()
+
+    def _trip(self) -> None:
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._failures = 0
+        self._probes_in_flight = 0
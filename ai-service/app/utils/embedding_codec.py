@@ -0,0 +1,49 @@
+"""
+Compact wire encodings for embeddings.
+
+A 1024-d embedding as a JSON number list is about 20 KB of decimal text.
+The same vector as base64 little-endian float32 is 5.5 KB and keeps full
+float32 precision. As float16 it is 2.7 KB, with a relative error of at most 5e-4 per
+component, which is well below what changes a cosine ranking.
+
+Formats:
+- "json": number list in `embedding` (the default)
+- "f32" / "f16": base64 in `embeddingBase64`, dtype in `embeddingEncoding`
+- "none": no embedding; for callers that only need it stored (post_id set)
+
+Callers choose with the request's `embedding_format`, or with an `embedding`
+parameter on the Accept header, e.g. `Accept: application/json; embedding=f16`.
+
+Decoding in Node: `new Float32Array(Buffer.from(b64, "base64").buffer)` for
+f32; f16 needs a Float16Array (Node 24+) or a small conversion loop.
+"""
+import base64
+from typing import Literal
+import numpy as np
+
+EmbeddingFormat = Literal["json", "f32", "f16", "none"]
+EMBEDDING_FORMATS: tuple[str, ...] = ("json", "f32", "f16", "none")
+
+_DTYPES = {"f32": "<f4", "f16": "<f2"}
+
+
+def encode(embedding: list[float], fmt: Literal["f32", "f16"]) -> str:
+    """Base64 of the embedding as little-endian float32 or float16."""
+    return base64.b64encode(np.asarray(embedding, dtype=_DTYPES[fmt]).tobytes()).decode("ascii")
+
+
+def decode(data: str, fmt: Literal["f32", "f16"]) -> list[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=_DTYPES[fmt]).astype(np.float32).tolist()
+
+
+def format_from_accept(accept: str | None) -> EmbeddingFormat | None:
+    """The `embedding=<format>` parameter of an Accept header, if any."""
+    if not accept:
+        return None
+    for media_range in accept.split(","):
+        for param in media_range.split(";")[1:]:
+            name, _, value = param.partition("=")
+            value = value.strip().strip('"').lower()
+            if name.strip().lower() == "embedding" and value in EMBEDDING_FORMATS:
+                return value
+    return None
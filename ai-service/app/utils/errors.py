@@ -0,0 +1,18 @@
+import math
+from fastapi import HTTPException
+
+
+class UpstreamUnavailableError(HTTPException):
+    """
+    Raised instead of calling an upstream provider when it is unavailable
+    (circuit open) or overloaded (shed by a limiter or quota budget).
+    Surfaces as a fast 503 with Retry-After so callers back off rather
+    than time out.
+    """
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
@@ -0,0 +1,146 @@
+"""
+In-memory perceptual-hash index with Hamming-distance near-match search.
+
+Hashes are hex strings (64-bit phash by default, longer hashes are supported)
+stored as integers in a multi-index hash table per bit width. Each hash is
+split into 16-bit chunks and every chunk gets its own lookup table. If two
+hashes are within distance d, at least one chunk differs by at most
+d // num_chunks bits (pigeonhole), so a query only probes the few buckets near
+its own chunks instead of scanning the whole blocklist.
+"""
+from functools import lru_cache
+from itertools import combinations
+from typing import Any
+
+CHUNK_BITS = 16
+
+
+def hex_to_int(image_hash: str) -> tuple[int, int]:
+    """Convert a hex hash to (value, bit_width)."""
+    return int(image_hash, 16), len(image_hash) * 4
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=64)
+def _flip_masks(width: int, radius: int) -> tuple[int, ...]:
+    """All masks of `width` bits with at most `radius` bits set."""
+    masks = [0]
+    for r in range(1, min(radius, width) + 1):
+        for bits in combinations(range(width), r):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            masks.append(mask)
+    return tuple(masks)
+
+
+class MultiIndexHash:
+    """Multi-index hashing over fixed-width integer hashes."""
+
+    def __init__(self, bits: int, chunk_bits: int = CHUNK_BITS):
+        self.bits = bits
+        # (shift, width) for each chunk, low bits first
+        self._chunks: list[tuple[int, int]] = []
+        shift = 0
+        while shift < bits:
+            width = min(chunk_bits, bits - shift)
+            self._chunks.append((shift, width))
+            shift += width
+        self._tables: list[dict[int, list[int]]] = [{} for _ in self._chunks]
+        self._items: dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, value: int, item: Any) -> bool:
+        """Insert a hash. Returns False if it was already present (item is replaced)."""
+        if value in self._items:
+            self._items[value] = item
+            return False
+        self._items[value] = item
+        for (shift, width), table in zip(self._chunks, self._tables):
+            key = (value >> shift) & ((1 << width) - 1)
+            table.setdefault(key, []).append(value)
+        return True
+
+    def find_nearest(self, value: int, max_distance: int) -> tuple[int, Any] | None:
+        """Return (distance, item) of the closest hash within max_distance, or None."""
+        item = self._items.get(value)
+        if item is not None:
+            return 0, item
+
+        sub_radius = max_distance // len(self._chunks)
+        best_distance = max_distance + 1
+        best_value = None
+        seen: set[int] = set()
+        for (shift, width), table in zip(self._chunks, self._tables):
+            key = (value >> shift) & ((1 << width) - 1)
+            for mask in _flip_masks(width, sub_radius):
+                bucket = table.get(key ^ mask)
+                if not bucket:
+                    continue
+                for candidate in bucket:
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = hamming_distance(value, candidate)
+                    if distance < best_distance:
+                        best_distance, best_value = distance, candidate
+
+        if best_value is None:
+            return None
+        return best_distance, self._items[best_value]
+
+
+class HashIndex:
+    """
+    Hex hash -> item index with exact and near-match lookups.
+
+    Exact matches are answered from a dict; near matches go through a
+    multi-index table for the hash's bit width so hashes of different sizes
+    never compare.
+    """
+
+    def __init__(self):
+        self._exact: dict[str, Any] = {}
+        self._tables: dict[int, MultiIndexHash] = {}
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def __contains__(self, image_hash: str) -> bool:
+        return image_hash.lower() in self._exact
+
+    def add(self, image_hash: str, item: Any) -> None:
+        image_hash = image_hash.lower()
+        value, bits = hex_to_int(image_hash)
+        self._exact[image_hash] = item
+        table = self._tables.get(bits)
+        if table is None:
+            table = self._tables[bits] = MultiIndexHash(bits)
+        table.add(value, item)
+
+    def get(self, image_hash: str) -> Any | None:
+        return self._exact.get(image_hash.lower())
+
+    def clear(self) -> None:
+        self._exact.clear()
+        self._tables.clear()
+
+    def find_nearest(self, image_hash: str, max_distance: int) -> tuple[int, Any] | None:
+        """Return (distance, item) for the closest indexed hash within max_distance."""
+        image_hash = image_hash.lower()
+        item = self._exact.get(image_hash)
+        if item is not None:
+            return 0, item
+        if max_distance <= 0:
+            return None
+
+        value, bits = hex_to_int(image_hash)
+        table = self._tables.get(bits)
+        if table is None:
+            return None
+        return table.find_nearest(value, max_distance)
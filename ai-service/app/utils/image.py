@@ -5,8 +5,7 @@ import re
 import socket
 from io import BytesIO
 from urllib.parse import urlparse
-from PIL import Image
-import imagehash
+from app.utils.metrics import instrument
 
 
 # IPFS CID v0 (Qm...) and v1 (ba...) patterns
@@ -80,6 +79,7 @@ def validate_url_for_ssrf(url: str) -> str:
     return url
 
 
+@instrument("download_image")
 async def download_image(uri: str, gateway: str) -> bytes:
     """Download image from IPFS or HTTP URL with SSRF protection."""
     if uri.startswith("ipfs://"):
@@ -110,6 +110,7 @@ async def download_image(uri: str, gateway: str) -> bytes:
 
 def image_to_base64(image_bytes: bytes) -> str:
     """Convert image bytes to base64 data URI."""
+    from PIL import Image
     img = Image.open(BytesIO(image_bytes))
     fmt = img.format or "JPEG"
     mime = f"image/{fmt.lower()}"
@@ -124,7 +125,10 @@ def decode_base64_image(data_uri: str) -> bytes:
     return base64.b64decode(data_uri)
 
 
+@instrument("phash")
 def compute_phash(image_bytes: bytes) -> str:
     """Compute perceptual hash for image deduplication."""
+    from PIL import Image
+    import imagehash
     img = Image.open(BytesIO(image_bytes))
     return str(imagehash.phash(img))
@@ -0,0 +1,132 @@
+"""
+Adaptive concurrency limiter for upstream calls.
+
+The limit follows AIMD driven by observed latency: each call that finishes
+under the target latency grows the limit by 1/limit (about +1 per limit's
+worth of calls); a slow call, timeout or error multiplies it by `backoff`
+(at most once per target-latency window so one burst of slow calls does not
+collapse the limit to the floor).
+
+Callers over the limit wait in a FIFO queue. A waiter that cannot get a slot
+within `max_queue_time` is shed with OverloadedError, and new callers are
+shed immediately when the queue is already too long to drain in time, so an
+overloaded upstream fails fast instead of piling up coroutines.
+
+A call that is cancelled, or rejected by the circuit breaker while holding a
+slot, returns its slot without touching the limit: it says nothing about the
+upstream's latency.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from app.utils.circuit_breaker import CircuitOpenError
+
+
+class OverloadedError(Exception):
+    """Raised when a call is shed instead of queued."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is overloaded")
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        target_latency: float = 10.0,
+        max_queue_time: float = 2.0,
+        backoff: float = 0.7,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.max_queue_time = max_queue_time
+        self.backoff = backoff
+        self.in_flight = 0
+        self.shed_count = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        # Smoothed latency, used to estimate how long the queue takes to drain
+        self._avg_latency = 0.0
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._waiters)
+
+    def _estimated_wait(self) -> float:
+        if not self._avg_latency:
+            return 0.0
+        return (len(self._waiters) + 1) / max(self.limit, 1.0) * self._avg_latency
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if self._estimated_wait() > self.max_queue_time:
+            self.shed_count += 1
+            raise OverloadedError(self.name, retry_after=self._estimated_wait())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_queue_time)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted in the same loop iteration the timeout fired; the
+                # slot is already counted, so keep it
+                return
+            self.shed_count += 1
+            raise OverloadedError(self.name, retry_after=self.max_queue_time) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self._release_slot()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def release(self, latency: float, ok: bool = True) -> None:
+        """Return a slot and adjust the limit from the call's outcome."""
+        self._avg_latency = latency if not self._avg_latency else 0.8 * self._avg_latency + 0.2 * latency
+        now = time.monotonic()
+        if ok and latency <= self.target_latency:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        elif now - self._last_decrease >= self.target_latency:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_decrease = now
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of the block; failures shrink the limit."""
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        except (asyncio.CancelledError, CircuitOpenError):
+            self._release_slot()
+            raise
+        except BaseException:
+            self.release(time.perf_counter() - start, ok=False)
+            raise
+        self.release(time.perf_counter() - start, ok=True)
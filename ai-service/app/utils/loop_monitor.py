@@ -0,0 +1,222 @@
+"""
+Event-loop lag monitor and slow-callback detector.
+
+A heartbeat task wakes every LOOP_MONITOR_INTERVAL_SECONDS and records how
+late it woke in `event_loop_lag_seconds`. A watchdog thread watches the
+heartbeat. When it is more than LOOP_MONITOR_SLOW_SECONDS overdue, whatever
+holds the loop is blocking it. The watchdog then samples the loop thread's
+stack and the task that is running. Further samples are taken while the
+stall lasts. When the heartbeat wakes up again, the stall is recorded as a
+slow callback with its duration.
+
+Sampling from a separate thread works with any event loop implementation,
+uvloop included. It costs nothing while the loop is healthy, beyond one
+wakeup per interval on each side. Durations are the heartbeat's lag, so a
+stall may have started up to one interval earlier. A C call that holds the
+GIL for the whole stall cannot be sampled; it is recorded with an unknown
+site.
+
+Stalls are kept in a ring buffer and aggregated by "site": the innermost
+stack frame inside app/. That is the line of our code that made the
+blocking call, e.g. a sync socket.getaddrinfo in validate_url_for_ssrf.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from app.config import get_settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Frames kept per stack sample, innermost last
+STACK_DEPTH = 24
+# Extra samples taken while one stall lasts
+MAX_SAMPLES_PER_STALL = 5
+
+
+@dataclass
+class SlowCallback:
+    started_at: float
+    duration: float = 0.0
+    task: str | None = None
+    site: str | None = None
+    # Each sample is a list of "path:line in function" strings, innermost last
+    samples: list[list[str]] = field(default_factory=list)
+    sample_sites: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SiteStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+def _format_frame(frame: traceback.FrameSummary) -> str:
+    path = frame.filename
+    if path.startswith(_APP_ROOT):
+        path = "app" + path[len(_APP_ROOT):]
+    return f"{path}:{frame.lineno} in {frame.name}"
+
+
+def _app_site(stack: traceback.StackSummary) -> str | None:
+    """Innermost frame in our own code; library frames below it are what it called."""
+    for frame in reversed(stack):
+        if frame.filename.startswith(_APP_ROOT):
+            return _format_frame(frame)
+    return None
+
+
+def _running_task(loop: asyncio.AbstractEventLoop) -> str | None:
+    # Read from another thread; the registry is a plain dict keyed by loop
+    current = getattr(asyncio.tasks, "_current_tasks", None)
+    try:
+        task = current.get(loop) if current is not None else None
+    except Exception:
+        return None
+    if task is None:
+        return None
+    coro = task.get_coro()
+    name = getattr(coro, "__qualname__", None) or type(coro).__name__
+    return f"{task.get_name()} ({name})"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, threshold: float, history: int = 100):
+        self.interval = interval
+        self.threshold = threshold
+        self.history: deque[SlowCallback] = deque(maxlen=history)
+        self.sites: dict[str, SiteStats] = {}
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+        self._beat = time.perf_counter()
+        self._open: SlowCallback | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._stop = threading.Event()
+
+    def _sample(self) -> traceback.StackSummary | None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        return traceback.extract_stack(frame, limit=STACK_DEPTH)
+
+    def _watch(self) -> None:
+        """Watchdog thread: sample the loop thread while the heartbeat is overdue."""
+        poll = max(0.005, self.threshold / 2)
+        while not self._stop.wait(poll):
+            beat = self._beat
+            overdue = time.perf_counter() - beat - self.interval
+            if overdue < self.threshold:
+                continue
+            event = self._open
+            if event is None or event.started_at != beat:
+                event = SlowCallback(started_at=beat, task=_running_task(self._loop))
+                self._open = event
+            if len(event.samples) < MAX_SAMPLES_PER_STALL:
+                stack = self._sample()
+                if stack:
+                    event.samples.append([_format_frame(f) for f in stack])
+                    event.sample_sites.append(_app_site(stack))
+
+    def _close_stall(self, beat: float, lag: float) -> None:
+        event = self._open
+        if event is None or event.started_at != beat:
+            # Stalled, but the watchdog did not get a sample in before it ended
+            event = SlowCallback(started_at=beat)
+        self._open = None
+        # CPU-bound stalls move between frames; attribute them to the most sampled site
+        sites = [s for s in event.sample_sites if s]
+        event.site = Counter(sites).most_common(1)[0][0] if sites else None
+        event.duration = lag
+        event.started_at = time.time() - event.duration
+        self.history.append(event)
+        self.slow_callbacks += 1
+        site = self.sites.setdefault(event.site or "unknown", SiteStats())
+        site.count += 1
+        site.total_seconds += event.duration
+        site.max_seconds = max(site.max_seconds, event.duration)
+        metrics.counter("event_loop_slow_callbacks_total").inc()
+        metrics.counter("event_loop_blocked_seconds_total").inc(event.duration)
+        logger.warning(
+            f"Event loop blocked for {event.duration * 1000:.0f} ms"
+            f" at {event.site or 'unknown site'} (task {event.task or 'none'})"
+        )
+
+    async def run(self) -> None:
+        """Heartbeat; runs for the life of the app and owns the watchdog thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                beat = self._beat = time.perf_counter()
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, time.perf_counter() - beat - self.interval)
+                metrics.histogram("event_loop_lag_seconds").observe(lag)
+                self.max_lag = max(self.max_lag, lag)
+                if lag >= self.threshold:
+                    self._close_stall(beat, lag)
+        finally:
+            self._stop.set()
+
+    def report(self, limit: int = 20) -> dict:
+        lag = metrics.histogram("event_loop_lag_seconds")
+        recent = list(self.history)[-limit:][::-1]
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "mean_lag_ms": lag.mean * 1000,
+            "max_lag_ms": self.max_lag * 1000,
+            "slow_callbacks": self.slow_callbacks,
+            "sites": [
+                {
+                    "site": site,
+                    "count": s.count,
+                    "total_ms": s.total_seconds * 1000,
+                    "max_ms": s.max_seconds * 1000,
+                }
+                for site, s in sorted(self.sites.items(), key=lambda kv: -kv[1].total_seconds)
+            ],
+            "recent": [
+                {
+                    "started_at": e.started_at,
+                    "duration_ms": e.duration * 1000,
+                    "task": e.task,
+                    "site": e.site,
+                    "samples": e.samples,
+                }
+                for e in recent
+            ],
+        }
+
+
+_monitor: LoopMonitor | None = None
+
+
+def get_monitor() -> LoopMonitor:
+    global _monitor
+    if _monitor is None:
+        settings = get_settings()
+        _monitor = LoopMonitor(
+            interval=settings.loop_monitor_interval_seconds,
+            threshold=settings.loop_monitor_slow_seconds,
+            history=settings.loop_monitor_history,
+        )
+    return _monitor
+
+
+async def run() -> None:
+    """Start from the app lifespan; a no-op when LOOP_MONITOR_ENABLED is off."""
+    if not get_settings().loop_monitor_enabled:
+        return
+    await get_monitor().run()
@@ -0,0 +1,266 @@
+"""
+Lightweight in-process metrics.
+
+Counters, gauges and histograms are keyed by name plus a sorted tuple of
+labels and live in a module-level registry. Recording happens on the event
+loop thread, so updates are plain attribute increments with no locking.
+Sync stages that run in worker threads (phash) record the same way; a rare
+lost increment under contention is the price of keeping the hot path
+lock-free.
+
+`instrument(stage)` wraps an upstream call with a latency histogram, an
+in-flight gauge and error/timeout counters, and traces it as a span of the
+current request. Values that are cheaper to read
+than to track (cache sizes, hit ratios) come from collectors that run at
+scrape time. `render_prometheus()` produces the text exposition format
+served on /metrics.
+"""
+import asyncio
+import bisect
+import functools
+import inspect
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable
+
+import httpx
+from fastapi import HTTPException
+from app.utils import tracing
+
+# Latency buckets in seconds, from cache hits up to slow Gemini Pro calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+_counters: dict[tuple, Counter] = {}
+_gauges: dict[tuple, Gauge] = {}
+_histograms: dict[tuple, Histogram] = {}
+# Scrape-time callbacks yielding (name, labels, value) gauge samples
+_collectors: dict[str, Callable[[], Iterable[tuple[str, dict, float]]]] = {}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def _series(registry: dict, key: tuple, factory: type):
+    metric = registry.get(key)
+    if metric is None:
+        metric = registry[key] = factory()
+    return metric
+
+
+def counter(name: str, **labels) -> Counter:
+    return _series(_counters, _key(name, labels), Counter)
+
+
+def gauge(name: str, **labels) -> Gauge:
+    return _series(_gauges, _key(name, labels), Gauge)
+
+
+def histogram(name: str, **labels) -> Histogram:
+    return _series(_histograms, _key(name, labels), Histogram)
+
+
+def collect(name: str) -> dict[tuple, Counter | Gauge | Histogram]:
+    """All series for a metric name, keyed by their label tuples."""
+    series = {labels: m for (n, labels), m in _counters.items() if n == name}
+    series.update({labels: m for (n, labels), m in _gauges.items() if n == name})
+    series.update({labels: m for (n, labels), m in _histograms.items() if n == name})
+    return series
+
+
+def register_collector(key: str, callback: Callable[[], Iterable[tuple[str, dict, float]]]) -> None:
+    """
+    Register a callback read at scrape time. It returns gauge samples as
+    (name, labels, value). Registering the same key again replaces it.
+    """
+    _collectors[key] = callback
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe the duration of a block in seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name, **labels).observe(time.perf_counter() - start)
+
+
+def error_kind(exc: BaseException) -> str:
+    """Classify a failed upstream call as a timeout, an unavailability (shed, breaker open) or an error."""
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(exc, HTTPException):
+        if exc.status_code == 504:
+            return "timeout"
+        if exc.status_code == 503:
+            return "unavailable"
+    return "error"
+
+
+def instrument(stage: str):
+    """
+    Decorator recording `stage_seconds`, `stage_in_flight` and
+    `stage_errors_total{kind}` for an async or sync function.
+
+    Registry keys are built once here, so each call costs two dict lookups
+    and no label sorting. Cancellation counts towards latency but not errors.
+    Inside a traced request the call is also a span, sized by len() of its
+    result when that is a list, str or bytes.
+    """
+    labels = (("stage", stage),)
+    seconds_key = ("stage_seconds", labels)
+    in_flight_key = ("stage_in_flight", labels)
+
+    def record_error(exc: BaseException) -> None:
+        key = ("stage_errors_total", (("kind", error_kind(exc)), ("stage", stage)))
+        _series(_counters, key, Counter).inc()
+
+    def finish(opened, start: float, result: Any = None, error: BaseException | None = None) -> None:
+        _series(_gauges, in_flight_key, Gauge).value -= 1
+        _series(_histograms, seconds_key, Histogram).observe(time.perf_counter() - start)
+        if opened is not None:
+            if isinstance(result, (list, str, bytes)):
+                opened[0].attrs["size"] = len(result)
+            tracing.close_span(opened, error)
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                _series(_gauges, in_flight_key, Gauge).value += 1
+                opened = tracing.open_span(stage)
+                start = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException as e:
+                    if isinstance(e, Exception):
+                        record_error(e)
+                    finish(opened, start, error=e)
+                    raise
+                finish(opened, start, result)
+                return result
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                _series(_gauges, in_flight_key, Gauge).value += 1
+                opened = tracing.open_span(stage)
+                start = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    if isinstance(e, Exception):
+                        record_error(e)
+                    finish(opened, start, error=e)
+                    raise
+                finish(opened, start, result)
+                return result
+        return wrapper
+
+    return decorate
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    families: dict[str, tuple[str, list[str]]] = {}
+
+    def family(name: str, kind: str) -> list[str]:
+        return families.setdefault(name, (kind, []))[1]
+
+    for (name, labels), metric in _counters.items():
+        family(name, "counter").append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+    for (name, labels), metric in _gauges.items():
+        family(name, "gauge").append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+    for callback in list(_collectors.values()):
+        for name, labels, value in callback():
+            key_labels = tuple(sorted(labels.items()))
+            family(name, "gauge").append(f"{name}{_format_labels(key_labels)} {_format_value(value)}")
+    for (name, labels), metric in _histograms.items():
+        lines = family(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(metric.buckets + (math.inf,), metric.counts):
+            cumulative += count
+            le = (("le", _format_value(bound)),)
+            lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(metric.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+
+    out = []
+    for name in sorted(families):
+        kind, lines = families[name]
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def reset() -> None:
+    _counters.clear()
+    _gauges.clear()
+    _histograms.clear()
@@ -0,0 +1,179 @@
+"""
+On-demand CPU and allocation profiles of the running process.
+
+Nothing runs until a profile is requested, so the cost when idle is zero.
+
+CPU: a sampler thread reads every thread's Python stack from
+sys._current_frames() every `interval` seconds, for `seconds`. This is
+wall-clock sampling from outside the loop: the profiled code is not traced,
+and only the sampler's own thread pays per sample. Samples where a thread is
+parked, e.g. the loop in select() or an idle executor worker, are dropped
+unless `include_idle` is set. What remains is the time spent doing something.
+
+Memory: tracemalloc runs for `seconds` (or, if it was already running, the
+window is diffed against a snapshot taken at its start). The profile is the
+allocations made during the window that are still alive at its end, weighted
+by bytes. Tracing slows allocations noticeably while it is on, which is why
+it is bounded like the CPU profile.
+
+Both return collapsed stacks: one line per distinct stack, with frames from
+the outermost to the innermost separated by ";", then a space and the weight.
+flamegraph.pl, speedscope and inferno read this format as is. Only one
+profile runs at a time.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Awaitable, Callable
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per stack, innermost first when truncating
+MAX_DEPTH = 64
+TRACEMALLOC_FRAMES = 32
+
+# Innermost frames of a thread that is waiting rather than working
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("runners.py", "run"),
+    ("base_events.py", "_run_once"),
+}
+
+# Longest sys.path entries first, so paths are shortened to the package root
+_PATH_PREFIXES = sorted(
+    {os.path.join(os.path.abspath(p), "") for p in sys.path if p},
+    key=len,
+    reverse=True,
+)
+_labels: dict = {}
+_active: str | None = None
+
+
+def _short_path(path: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if path.startswith(prefix):
+            return path[len(prefix):]
+    return path
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_cpu(seconds: float, interval: float, include_idle: bool = False) -> tuple[str, int]:
+    """Blocking; run it in a thread. Returns (collapsed stacks, samples taken)."""
+    own = threading.get_ident()
+    counts: Counter[str] = Counter()
+    samples = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (not include_idle and _is_idle(frame)):
+                continue
+            counts[f"{names.get(ident, ident)};{_collapse(frame)}"] += 1
+        samples += 1
+        time.sleep(interval)
+    lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+    return "\n".join(lines) + "\n" if lines else "", samples
+
+
+def _collapse_traceback(traceback: tracemalloc.Traceback) -> str:
+    # tracemalloc keeps file and line only, outermost frame first
+    return ";".join(f"{_short_path(f.filename)}:{f.lineno}" for f in traceback)
+
+
+def _collapse_allocations(after: tracemalloc.Snapshot, before: tracemalloc.Snapshot | None) -> tuple[str, int]:
+    ignore = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, __file__),
+    ]
+    after = after.filter_traces(ignore)
+    if before is None:
+        stats = [(s.traceback, s.size) for s in after.statistics("traceback")]
+    else:
+        diff = after.compare_to(before.filter_traces(ignore), "traceback")
+        stats = [(s.traceback, s.size_diff) for s in diff if s.size_diff > 0]
+    stats.sort(key=lambda s: -s[1])
+    lines = [f"{_collapse_traceback(tb)} {size}" for tb, size in stats]
+    return "\n".join(lines) + "\n" if lines else "", sum(size for _, size in stats)
+
+
+def _release(_: asyncio.Future) -> None:
+    global _active
+    _active = None
+
+
+async def _exclusive(mode: str, work: Callable[[], Awaitable]):
+    """
+    Run `work()` as the only profile. It is shielded from the request: a
+    sampler thread cannot be interrupted, so if the request is cancelled the
+    profile runs to the end of its window and keeps the claim until then.
+    """
+    # No await between the check and the set, so this is atomic on the loop
+    global _active
+    if _active is not None:
+        raise HTTPException(status_code=409, detail=f"A {_active} profile is already running")
+    _active = mode
+    task = asyncio.ensure_future(work())
+    task.add_done_callback(_release)
+    return await asyncio.shield(task)
+
+
+async def _sample_cpu(seconds: float, interval: float, include_idle: bool) -> tuple[str, int]:
+    logger.info(f"CPU profile started for {seconds:.0f}s at {1 / interval:.0f} Hz")
+    return await asyncio.to_thread(sample_cpu, seconds, interval, include_idle)
+
+
+async def profile_cpu(seconds: float, interval: float, include_idle: bool = False) -> tuple[str, int]:
+    return await _exclusive("cpu", lambda: _sample_cpu(seconds, interval, include_idle))
+
+
+async def _trace_allocations(seconds: float) -> tuple[str, int]:
+    logger.info(f"Allocation profile started for {seconds:.0f}s")
+    # Snapshots walk every traced block; take them off the loop
+    started_here = not tracemalloc.is_tracing()
+    before = None
+    if started_here:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    else:
+        before = await asyncio.to_thread(tracemalloc.take_snapshot)
+    try:
+        await asyncio.sleep(seconds)
+        after = await asyncio.to_thread(tracemalloc.take_snapshot)
+    finally:
+        if started_here:
+            tracemalloc.stop()
+    return await asyncio.to_thread(_collapse_allocations, after, before)
+
+
+async def profile_memory(seconds: float) -> tuple[str, int]:
+    """Returns (collapsed stacks weighted by bytes, total bytes)."""
+    return await _exclusive("memory", lambda: _trace_allocations(seconds))
@@ -0,0 +1,49 @@
+"""
+Per-request context shared with service code via contextvars.
+
+Middleware sets the route and priority class for each request so upstream
+clients can account cost per endpoint and order work by priority without
+threading extra arguments through every service function.
+"""
+from contextvars import ContextVar
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """Lower value = served first."""
+    INTERACTIVE = 0  # upload-path moderation
+    STANDARD = 1     # user-facing search
+    BACKGROUND = 2   # analysis, feed refresh, reranking
+
+
+# Route prefix -> priority class
+ROUTE_PRIORITIES = {
+    "/api/moderate": Priority.INTERACTIVE,
+    "/api/search": Priority.STANDARD,
+    "/api/recommend/similar": Priority.STANDARD,
+    "/api/recommend": Priority.BACKGROUND,
+    "/api/analyze": Priority.BACKGROUND,
+}
+
+# Header callers (the backend's workers) use to override the route's class
+PRIORITY_HEADER = "X-Priority"
+
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="internal")
+current_priority: ContextVar[Priority] = ContextVar("current_priority", default=Priority.STANDARD)
+
+
+def priority_for_path(path: str) -> Priority:
+    for prefix, priority in ROUTE_PRIORITIES.items():
+        if path.startswith(prefix):
+            return priority
+    return Priority.STANDARD
+
+
+def priority_for_request(path: str, header: str | None) -> Priority:
+    """Priority from the X-Priority header if valid, else from the route."""
+    if header:
+        try:
+            return Priority[header.strip().upper()]
+        except KeyError:
+            pass
+    return priority_for_path(path)
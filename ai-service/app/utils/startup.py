@@ -0,0 +1,181 @@
+"""
+Startup timing, background warm-up and readiness.
+
+`import app.main` stays light: the Gemini, Voyage, Qdrant and imaging SDKs
+are imported where they are first used, not at module level. The lifespan
+starts `warm_up` as a background task and returns at once, so uvicorn
+accepts connections (and /health passes) within the import time. The
+warm-up then does the slow parts concurrently, each as a component:
+
+- gemini / voyage: import the SDK and build the client in a worker thread
+- images: import PIL and imagehash
+- vector_store: import the backend, then ensure the collection exists
+
+A component that fails, e.g. a store that is not reachable yet or a client
+that cannot be built, is retried with backoff until it succeeds. Background
+tasks that wait for the warm-up start once every component is up.
+
+Imports run in threads, so the loop keeps serving while they execute. /ready
+reports 503 until every component is up. The report (GET
+/api/debug/startup) breaks the time down by phase, component and SDK import;
+`python -X importtime -c "import app.main"` gives the full import tree.
+
+This module is imported first by app.main, so STARTED approximates the
+start of the app import. It imports the rest of the app lazily for that
+reason.
+"""
+import asyncio
+import importlib
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+STARTED = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+# Modules deferred to first use; `import app.main` must not load these
+HEAVY_MODULES = ("google.genai", "voyageai", "qdrant_client", "PIL.Image", "imagehash")
+# Backoff between attempts of a failing warm-up component
+RETRY_INITIAL_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+
+
+@dataclass
+class Component:
+    ready: bool = False
+    seconds: float | None = None
+    attempts: int = 0
+    error: str | None = None
+
+
+_marks: dict[str, float] = {}
+_imports: dict[str, float] = {}
+_components: dict[str, Component] = {}
+_warmed = asyncio.Event()
+
+
+def mark(phase: str) -> None:
+    """Record that `phase` ("imported", "serving", "ready") was reached."""
+    _marks.setdefault(phase, time.perf_counter() - STARTED)
+
+
+async def preload(*modules: str) -> None:
+    """Import modules in a worker thread, recording how long each took."""
+    for name in modules:
+        if name in sys.modules:
+            continue
+        start = time.perf_counter()
+        await asyncio.to_thread(importlib.import_module, name)
+        _imports[name] = time.perf_counter() - start
+
+
+async def _warm_gemini() -> None:
+    from app.services import llm
+
+    await preload("google.genai")
+    # Building the client takes a few hundred ms of CPU too
+    await asyncio.to_thread(llm._get_client)
+
+
+async def _warm_voyage() -> None:
+    from app.services import embeddings
+
+    await preload("voyageai")
+    await asyncio.to_thread(embeddings.get_client)
+
+
+async def _warm_images() -> None:
+    await preload("PIL.Image", "imagehash")
+
+
+async def _warm_vector_store() -> None:
+    from app.config import get_settings
+    from app.services import vector_db
+
+    if get_settings().vector_store in ("qdrant", "replica"):
+        await preload("app.services.vector_stores.qdrant")
+    await vector_db.ensure_collection()
+
+
+WARM_UP = {
+    "gemini": _warm_gemini,
+    "voyage": _warm_voyage,
+    "images": _warm_images,
+    "vector_store": _warm_vector_store,
+}
+
+
+async def _run(name: str) -> None:
+    """Warm one component, retrying with backoff until it succeeds."""
+    component = _components[name]
+    start = time.perf_counter()
+    delay = RETRY_INITIAL_SECONDS
+    while True:
+        component.attempts += 1
+        try:
+            await WARM_UP[name]()
+            break
+        except Exception as e:
+            component.error = str(e) or type(e).__name__
+            logger.warning(f"Warm-up of {name} failed ({component.error}); retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+    component.ready = True
+    component.error = None
+    component.seconds = time.perf_counter() - start
+
+
+async def warm_up() -> None:
+    """Warm every component concurrently; start from the app lifespan."""
+    for name in WARM_UP:
+        _components.setdefault(name, Component())
+    await asyncio.gather(*(_run(name) for name in WARM_UP))
+    if is_ready():
+        mark("ready")
+        _warmed.set()
+        breakdown = ", ".join(f"{n} {c.seconds * 1000:.0f} ms" for n, c in _components.items())
+        logger.info(f"Ready in {_marks['ready'] * 1000:.0f} ms ({breakdown})")
+
+
+async def after_warm_up(start: Callable[[], Awaitable]) -> None:
+    """Run a background task once warm-up is done, so it never imports an SDK on the loop."""
+    await _warmed.wait()
+    await start()
+
+
+def is_ready() -> bool:
+    return bool(_components) and all(c.ready for c in _components.values())
+
+
+def components() -> dict[str, Component]:
+    return _components
+
+
+def report() -> dict:
+    def ms(seconds: float | None) -> float | None:
+        return None if seconds is None else seconds * 1000
+
+    return {
+        "ready": is_ready(),
+        "import_ms": ms(_marks.get("imported")),
+        "serving_ms": ms(_marks.get("serving")),
+        "ready_ms": ms(_marks.get("ready")),
+        "components": {
+            name: {"ready": c.ready, "ms": ms(c.seconds), "attempts": c.attempts, "error": c.error}
+            for name, c in _components.items()
+        },
+        "imports_ms": {name: seconds * 1000 for name, seconds in _imports.items()},
+        "deferred_modules": [m for m in HEAVY_MODULES if m not in sys.modules],
+    }
+
+
+def reset() -> None:
+    """Forget warm-up state (tests and the startup benchmark); the import time is kept."""
+    _marks.pop("serving", None)
+    _marks.pop("ready", None)
+    _imports.clear()
+    _components.clear()
+    _warmed.clear()
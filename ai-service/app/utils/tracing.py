@@ -0,0 +1,260 @@
+"""
+Per-request span tracing.
+
+TracingMiddleware starts a Trace for each request and keeps it, and the
+current span, in contextvars. Stages wrapped with `metrics.instrument` and
+service entry points wrapped with `traced` add child spans. Sizes are
+attached with `annotate`. Every request gets a `Server-Timing` header
+summarizing its spans. Sampled traces are also queued for export.
+
+Trace context comes from a W3C `traceparent` header when the caller sends
+one, and the caller's sampling flag is honoured. Otherwise a UUID
+`X-Request-ID` (the backend's request ID) becomes the trace ID, so a slow
+backend request can be found by its ID. Requests without a sampled parent
+are sampled at TRACE_SAMPLE_RATE.
+
+Exported spans use the Zipkin v2 JSON format. They are appended to
+TRACE_EXPORT_PATH as JSON lines and/or POSTed to TRACE_EXPORT_URL (e.g. a
+local Zipkin, Jaeger or OpenTelemetry collector at /api/v2/spans). Both run
+in a background flush loop, so a slow collector never delays a request; if
+it falls behind, the oldest spans are dropped.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import secrets
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from functools import wraps
+import httpx
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+REQUEST_ID_HEADER = "X-Request-ID"
+SERVICE_NAME = "solshare-ai"
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start", "duration", "attrs")
+
+    def __init__(self, name: str, parent_id: str | None, attrs: dict | None = None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.duration: float | None = None
+        self.attrs = attrs or {}
+
+
+class Trace:
+    __slots__ = ("trace_id", "request_id", "sampled", "root", "spans", "wall_start", "perf_start")
+
+    def __init__(self, trace_id: str, request_id: str | None, sampled: bool, root: Span):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.sampled = sampled
+        self.root = root
+        self.spans: list[Span] = []
+        self.wall_start = time.time()
+        self.perf_start = root.start
+
+
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+# Zipkin spans of finished, sampled traces awaiting export
+_buffer: deque[dict] | None = None
+
+
+def _get_buffer() -> deque[dict]:
+    global _buffer
+    if _buffer is None:
+        _buffer = deque(maxlen=get_settings().trace_buffer_size)
+    return _buffer
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent, or None if malformed."""
+    if not header:
+        return None
+    parts = header.strip().lower().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    _, trace_id, parent_id, flags = parts[:4]
+    try:
+        if len(trace_id) != 32 or len(parent_id) != 16 or len(flags) != 2:
+            return None
+        if int(trace_id, 16) == 0 or int(parent_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id, parent_id, sampled
+
+
+def start_trace(name: str, traceparent: str | None = None, request_id: str | None = None) -> Trace:
+    """Create a request's trace and its root span, deciding whether it is sampled."""
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+        sampled = sampled or random.random() < get_settings().trace_sample_rate
+    else:
+        parent_id = None
+        sampled = random.random() < get_settings().trace_sample_rate
+        try:
+            trace_id = uuid.UUID(request_id).hex if request_id else secrets.token_hex(16)
+        except ValueError:
+            trace_id = secrets.token_hex(16)
+    return Trace(trace_id, request_id, sampled, Span(name, parent_id))
+
+
+def open_span(name: str, attrs: dict | None = None) -> tuple[Span, Token] | None:
+    """Start a child of the current span; None (and no cost beyond one lookup) outside a trace."""
+    trace = current_trace.get()
+    if trace is None:
+        return None
+    parent = current_span.get() or trace.root
+    span = Span(name, parent.span_id, attrs)
+    trace.spans.append(span)
+    return span, current_span.set(span)
+
+
+def close_span(opened: tuple[Span, Token], error: BaseException | None = None) -> None:
+    span, token = opened
+    span.duration = time.perf_counter() - span.start
+    if error is not None:
+        span.attrs["error"] = type(error).__name__
+    current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Trace a block as a child span. Yields the Span, or None when the request is not traced."""
+    opened = open_span(name, attrs)
+    if opened is None:
+        yield None
+        return
+    try:
+        yield opened[0]
+    except BaseException as e:
+        close_span(opened, e)
+        raise
+    close_span(opened)
+
+
+def traced(name: str):
+    """Decorator running an async function in a child span."""
+    def decorate(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            opened = open_span(name)
+            if opened is None:
+                return await fn(*args, **kwargs)
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException as e:
+                close_span(opened, e)
+                raise
+            close_span(opened)
+            return result
+        return wrapper
+    return decorate
+
+
+def annotate(**attrs) -> None:
+    """Attach attributes (sizes, counts) to the current span, if any."""
+    trace = current_trace.get()
+    if trace is not None:
+        (current_span.get() or trace.root).attrs.update(attrs)
+
+
+def server_timing(trace: Trace) -> str:
+    """Server-Timing header value: total time plus the summed duration of each span name."""
+    totals: dict[str, float] = {}
+    for s in trace.spans:
+        if s.duration is not None:
+            totals[s.name] = totals.get(s.name, 0.0) + s.duration
+    total = trace.root.duration if trace.root.duration is not None else time.perf_counter() - trace.root.start
+    entries = [f"total;dur={total * 1000:.1f}"]
+    entries.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+    return ", ".join(entries)
+
+
+def _zipkin(trace: Trace, span: Span, kind: str | None = None) -> dict:
+    tags = {k: str(v) for k, v in span.attrs.items()}
+    if trace.request_id:
+        tags["request_id"] = trace.request_id
+    record = {
+        "traceId": trace.trace_id,
+        "id": span.span_id,
+        "name": span.name,
+        "timestamp": int((trace.wall_start + span.start - trace.perf_start) * 1_000_000),
+        "duration": max(1, int((span.duration or 0.0) * 1_000_000)),
+        "localEndpoint": {"serviceName": SERVICE_NAME},
+        "tags": tags,
+    }
+    if span.parent_id:
+        record["parentId"] = span.parent_id
+    if kind:
+        record["kind"] = kind
+    return record
+
+
+def finish_trace(trace: Trace, **attrs) -> None:
+    """Close the root span and queue the trace for export if it was sampled."""
+    root = trace.root
+    root.duration = time.perf_counter() - root.start
+    root.attrs.update(attrs)
+    if not trace.sampled:
+        return
+    buffer = _get_buffer()
+    buffer.append(_zipkin(trace, root, kind="SERVER"))
+    buffer.extend(_zipkin(trace, s) for s in trace.spans if s.duration is not None)
+
+
+def _append_lines(path: str, spans: list[dict]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(s, separators=(",", ":")) + "\n" for s in spans))
+
+
+async def flush() -> int:
+    """Export everything buffered so far; returns the number of spans sent."""
+    buffer = _get_buffer()
+    if not buffer:
+        return 0
+    spans = [buffer.popleft() for _ in range(len(buffer))]
+    settings = get_settings()
+    if settings.trace_export_path:
+        try:
+            await asyncio.to_thread(_append_lines, settings.trace_export_path, spans)
+        except OSError as e:
+            logger.warning(f"Failed to write {len(spans)} spans to {settings.trace_export_path}: {e}")
+    if settings.trace_export_url:
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.post(settings.trace_export_url, json=spans)
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to send {len(spans)} spans to {settings.trace_export_url}: {e}")
+    return len(spans)
+
+
+async def run_exporter() -> None:
+    """Flush sampled spans every TRACE_FLUSH_SECONDS; started from the app lifespan."""
+    interval = get_settings().trace_flush_seconds
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await flush()
+    finally:
+        await flush()
@@ -0,0 +1,6 @@
+"""
+Offline benchmark harness: the real app against fake upstreams.
+
+See bench/__main__.py for usage, bench/fakes.py for the upstream stand-ins
+and bench/workloads.py for the request mixes.
+"""
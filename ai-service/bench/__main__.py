@@ -0,0 +1,114 @@
+"""
+Offline load benchmark of the AI service against deterministic fake upstreams.
+
+    python -m bench --mix browse --duration 30
+    python -m bench --mix mixed --rps 150 --out runs/after.json --compare runs/before.json
+    python -m bench --mix upload --gemini 800:4000:0.02 --dns 5
+    python -m bench --startup --runs 5 --out runs/startup.json
+
+Upstream latencies are 'median[:p99[:error_rate]]' in milliseconds. Mixes:
+upload, browse, mixed, or weights like 'search=3,feed=1'. With --compare,
+the exit status is 1 if any endpoint regressed beyond --tolerance. --startup
+measures cold start instead: fresh processes timed from spawn to /ready.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+
+
+def parse_args(argv=None):
+    from bench.fakes import LatencyModel
+
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default="mixed")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=32, help="closed-loop workers")
+    parser.add_argument("--rps", type=float, default=None, help="open-loop Poisson arrival rate instead")
+    parser.add_argument("--posts", type=int, default=2000, help="posts seeded into the vector store")
+    parser.add_argument("--images", type=int, default=64, help="distinct images served and moderated")
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--vector-store", choices=["qdrant", "local"], default="qdrant")
+    parser.add_argument("--gemini", type=LatencyModel.parse, default="600:3000", help="Flash latency")
+    parser.add_argument("--gemini-pro", type=LatencyModel.parse, default="2000:8000", help="Pro latency")
+    parser.add_argument("--voyage", type=LatencyModel.parse, default="80:400")
+    parser.add_argument("--ipfs", type=LatencyModel.parse, default="200:1500")
+    parser.add_argument("--dns", type=float, default=0.0, help="blocking DNS delay in ms")
+    parser.add_argument("--risky-rate", type=float, default=0.05, help="share of moderation replies that score high")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="save the summary as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline summary JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--verbose", action="store_true", help="show the service's own logs")
+    parser.add_argument("--startup", action="store_true", help="benchmark cold start instead of load")
+    parser.add_argument("--runs", type=int, default=5, help="processes started with --startup")
+    return parser.parse_args(argv)
+
+
+def _finish(summary: dict, table: str, args, compare) -> int:
+    print(table)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(summary, indent=2))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        table, regressions = compare(baseline, summary, args.tolerance)
+        print(f"\nvs {args.compare}:\n{table}")
+        changed = sorted(k for k in summary["config"] if baseline["config"].get(k) != summary["config"][k])
+        if changed:
+            print(f"note: the baseline ran with different {', '.join(changed)}")
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.startup:
+        from bench import startup
+
+        summary = startup.summarize(startup.measure(args.runs, args.vector_store), args.vector_store)
+        return _finish(summary, startup.format_table(summary), args, startup.compare)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    if not args.verbose:
+        # qdrant-client's local mode warns that payload indexes and search params are no-ops
+        warnings.filterwarnings("ignore", module="app.services.vector_stores.qdrant")
+
+    from bench import harness, report
+    from bench.workloads import parse_mix
+
+    config = harness.BenchConfig(
+        mix=parse_mix(args.mix),
+        duration=args.duration,
+        warmup=args.warmup,
+        concurrency=args.concurrency,
+        rps=args.rps,
+        posts=args.posts,
+        images=args.images,
+        dimensions=args.dimensions,
+        vector_store=args.vector_store,
+        gemini=args.gemini,
+        gemini_pro=args.gemini_pro,
+        voyage=args.voyage,
+        ipfs=args.ipfs,
+        dns_delay=args.dns / 1000,
+        risky_rate=args.risky_rate,
+        seed=args.seed,
+    )
+    with tempfile.TemporaryDirectory(prefix="solshare-bench-") as workdir:
+        harness.configure_environment(workdir, config)
+        raw = asyncio.run(harness.run(config))
+    summary = report.summarize(raw, config)
+    return _finish(summary, report.format_table(summary), args, report.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
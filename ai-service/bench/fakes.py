@@ -0,0 +1,258 @@
+"""
+Deterministic stand-ins for the service's upstreams.
+
+- FakeGemini: replaces google.genai.Client (client.aio.models.generate_content).
+  Replies conform to the call's response_schema, so the real parsing paths run.
+- FakeVoyage: replaces voyageai.AsyncClient.embed. An embedding is the
+  normalized sum of per-word random vectors, so texts that share words are
+  similar and search results are meaningful.
+- FakeIPFSGateway: an httpx transport serving generated JPEGs by CID.
+- fake_getaddrinfo: resolves every host to a public address, optionally with
+  a blocking delay, so the SSRF check runs without real DNS.
+
+The in-memory Qdrant stand-in is qdrant-client's own local mode
+(AsyncQdrantClient(location=":memory:")), installed by bench.harness.
+
+Latency is a LatencyModel: lognormal with a given median and p99, plus an
+error rate. Every fake takes a seed and draws from its own RNG.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import socket
+import time
+import types
+import typing
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+from pydantic import BaseModel
+
+# A public address (example.com) that is_private_ip accepts
+PUBLIC_ADDRESS = "93.184.216.34"
+
+WORDS = (
+    "beach sunset city street market forest mountain lake river night neon portrait dog cat "
+    "coffee food festival concert skate surf snow desert bridge train car bike garden flower "
+    "graffiti mural rooftop skyline harbor boat island tropical rain fog storm autumn spring "
+    "studio fashion vintage film abstract minimal pixel anime sculpture museum library cafe "
+    "bakery pizza sushi ramen taco market crowd dance stage guitar piano vinyl arcade neon "
+    "galaxy stars moon aurora volcano canyon waterfall meadow farm horse bird butterfly reef"
+).split()
+
+# Valid base58 alphabet for CIDv0 (Qm + 44 chars)
+_BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+class LatencyModel:
+    """Lognormal latency with the given median and p99 (seconds), and an error rate."""
+
+    def __init__(self, median: float = 0.0, p99: float | None = None, error_rate: float = 0.0):
+        self.median = median
+        self.p99 = p99 if p99 is not None else median
+        self.error_rate = error_rate
+        # p99 of a lognormal is median * exp(2.326 * sigma)
+        self.sigma = math.log(self.p99 / median) / 2.326 if median > 0 and self.p99 > median else 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """'median[:p99[:error_rate]]' in milliseconds, e.g. '800:4000:0.01'."""
+        parts = [float(p) for p in spec.split(":")] if spec else [0.0]
+        median = parts[0] / 1000
+        p99 = parts[1] / 1000 if len(parts) > 1 else None
+        error_rate = parts[2] if len(parts) > 2 else 0.0
+        return cls(median, p99, error_rate)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median * math.exp(self.sigma * rng.gauss(0.0, 1.0))
+
+    def fails(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+    def __repr__(self) -> str:
+        return f"{self.median * 1000:.0f}ms/p99 {self.p99 * 1000:.0f}ms/err {self.error_rate:.1%}"
+
+
+class FakeUpstreamError(RuntimeError):
+    pass
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def around(self, latency: LatencyModel, rng: random.Random, name: str):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(latency.sample(rng))
+            if latency.fails(rng):
+                self.errors += 1
+                raise FakeUpstreamError(f"fake {name} 500")
+        finally:
+            self.in_flight -= 1
+
+
+def _sample_value(annotation, rng: random.Random, risky: bool):
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        annotation = next(a for a in typing.get_args(annotation) if a is not type(None))
+        origin = typing.get_origin(annotation)
+    if origin is list:
+        return rng.sample(WORDS, 4)
+    if annotation is float or annotation is int:
+        return annotation(rng.uniform(7.5, 9.5) if risky else rng.uniform(0.0, 1.5))
+    if annotation is bool:
+        return False
+    return " ".join(rng.choices(WORDS, k=12))
+
+
+class FakeGemini:
+    """
+    generate_content returns schema-conforming JSON for structured calls,
+    rankings that reverse the listed IDs for rerank prompts, and a sentence
+    for free text. `risky_rate` is the share of numeric replies (moderation
+    scores) that come back high enough to block or escalate.
+    """
+
+    def __init__(self, latency: LatencyModel, pro_latency: LatencyModel | None = None,
+                 risky_rate: float = 0.05, seed: int = 0):
+        self.latency = latency
+        self.pro_latency = pro_latency or latency
+        self.risky_rate = risky_rate
+        self.stats = _Counters()
+        self._rng = random.Random(seed)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.generate_content, get=self.get))
+
+    def _reply(self, contents, config) -> tuple[str, BaseModel | None]:
+        prompt = contents if isinstance(contents, str) else next((c for c in contents if isinstance(c, str)), "")
+        schema = getattr(config, "response_schema", None)
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            risky = self._rng.random() < self.risky_rate
+            data = {name: _sample_value(f.annotation, self._rng, risky) for name, f in schema.model_fields.items()}
+            parsed = schema.model_validate(data)
+            return parsed.model_dump_json(), parsed
+        if getattr(config, "response_mime_type", None) == "application/json":
+            ids = re.findall(r"\[ID: ([^\]]+)\]", prompt)
+            return json.dumps({"rankings": ids[::-1]}), None
+        return " ".join(self._rng.choices(WORDS, k=24)), None
+
+    async def generate_content(self, model: str, contents, config=None):
+        latency = self.pro_latency if "pro" in model else self.latency
+        await self.stats.around(latency, self._rng, "Gemini")
+        text, parsed = self._reply(contents, config)
+        return SimpleNamespace(
+            text=text,
+            parsed=parsed,
+            usage_metadata=SimpleNamespace(total_token_count=200 + len(text) // 4),
+        )
+
+
+    async def get(self, model: str):
+        # Model metadata, used by the health prober; not counted as a call
+        await asyncio.sleep(0)
+        return SimpleNamespace(name=model)
+
+
+class FakeVoyage:
+    """Bag-of-words embeddings: the normalized sum of a fixed random vector per word."""
+
+    def __init__(self, latency: LatencyModel, dimensions: int, seed: int = 0):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.stats = _Counters()
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._words: dict[str, np.ndarray] = {}
+
+    def _word(self, word: str) -> np.ndarray:
+        vector = self._words.get(word)
+        if vector is None:
+            digest = hashlib.blake2b(f"{self._seed}:{word}".encode(), digest_size=8).digest()
+            rng = np.random.default_rng(int.from_bytes(digest, "little"))
+            vector = self._words[word] = rng.normal(size=self.dimensions).astype(np.float32)
+        return vector
+
+    def embed_text(self, text: str) -> list[float]:
+        words = re.findall(r"[a-z0-9]+", text.lower()) or ["empty"]
+        total = np.sum([self._word(w) for w in words], axis=0)
+        return (total / (np.linalg.norm(total) or 1.0)).tolist()
+
+    async def embed(self, texts, model=None, input_type=None, output_dimension=None, **kwargs):
+        await self.stats.around(self.latency, self._rng, "Voyage")
+        return SimpleNamespace(
+            embeddings=[self.embed_text(t) for t in texts],
+            total_tokens=sum(len(t) // 4 + 1 for t in texts),
+        )
+
+
+def make_cid(index: int) -> str:
+    rng = random.Random(index)
+    return "Qm" + "".join(rng.choice(_BASE58) for _ in range(44))
+
+
+def make_jpeg(index: int, size: int = 256) -> bytes:
+    """A small JPEG with a per-index gradient and noise, so phashes differ."""
+    # Imported here so the startup benchmark can import the harness without PIL
+    from PIL import Image
+
+    rng = np.random.default_rng(index)
+    base = np.linspace(0, 255, size, dtype=np.float32)
+    pixels = np.stack([
+        np.add.outer(base * rng.uniform(0.2, 1.0), base * rng.uniform(0.2, 1.0)) / 2,
+        np.tile(base * rng.uniform(0.2, 1.0), (size, 1)),
+        rng.uniform(0, 255, (size, size)),
+    ], axis=-1).clip(0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format="JPEG", quality=80)
+    return out.getvalue()
+
+
+class FakeIPFSGateway:
+    """httpx transport serving `/<cid>` from a fixed set of images; unknown CIDs get 404."""
+
+    def __init__(self, images: dict[str, bytes], latency: LatencyModel, seed: int = 0):
+        self.images = images
+        self.latency = latency
+        self.stats = _Counters()
+        self._rng = random.Random(seed)
+        self.transport = httpx.MockTransport(self._handle)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        try:
+            await self.stats.around(self.latency, self._rng, "IPFS")
+        except FakeUpstreamError:
+            return httpx.Response(502)
+        body = self.images.get(request.url.path.rsplit("/", 1)[-1])
+        if body is None:
+            return httpx.Response(404)
+        return httpx.Response(200, content=body, headers={"content-type": "image/jpeg"})
+
+    def client_factory(self):
+        """Drop-in for httpx.AsyncClient that routes through this gateway."""
+        transport = self.transport
+
+        def factory(*args, **kwargs):
+            kwargs["transport"] = transport
+            return httpx.AsyncClient(*args, **kwargs)
+        return factory
+
+
+def fake_getaddrinfo(delay: float = 0.0):
+    """getaddrinfo that resolves every host to PUBLIC_ADDRESS, blocking for `delay` like real DNS can."""
+    def getaddrinfo(host, port, *args, **kwargs):
+        if delay:
+            time.sleep(delay)
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (PUBLIC_ADDRESS, port or 443))]
+    return getaddrinfo
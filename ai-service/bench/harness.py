@@ -0,0 +1,259 @@
+"""
+Boot the real app against the fakes and drive a workload through it.
+
+The app runs in-process behind httpx's ASGI transport, with its full
+middleware stack and lifespan (background tasks included). Only the clients
+at the edge of the service are swapped:
+
+- llm._client -> FakeGemini
+- embeddings._client -> FakeVoyage
+- the Qdrant client -> AsyncQdrantClient(":memory:"), or VECTOR_STORE=local
+- download_image's HTTP client and DNS -> FakeIPFSGateway and fake_getaddrinfo
+
+The per-IP rate limits are cleared, since all requests come from one client.
+Load starts once /ready passes, as it would behind a load balancer.
+
+The load generator shares the event loop with the app, like a co-located
+sidecar would. Loop lag is sampled every LAG_INTERVAL seconds. A request's
+lag is the worst sample taken while it was in flight.
+
+`configure_environment` must run before anything imports `app`.
+"""
+import asyncio
+import bisect
+import os
+import random
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+
+from bench.fakes import FakeGemini, FakeIPFSGateway, FakeVoyage, LatencyModel, fake_getaddrinfo
+from bench.workloads import Corpus, Workload
+
+LAG_INTERVAL = 0.005
+READY_TIMEOUT = 60.0
+IPFS_GATEWAY = "https://ipfs.bench.test/ipfs"
+
+
+@dataclass
+class BenchConfig:
+    mix: dict[str, float]
+    duration: float = 30.0
+    warmup: float = 2.0
+    concurrency: int = 32
+    # Open-loop arrival rate; None runs closed-loop with `concurrency` workers
+    rps: float | None = None
+    max_in_flight: int = 2000
+    posts: int = 2000
+    images: int = 64
+    dimensions: int = 1024
+    vector_store: str = "qdrant"
+    gemini: LatencyModel = field(default_factory=lambda: LatencyModel(0.6, 3.0))
+    gemini_pro: LatencyModel = field(default_factory=lambda: LatencyModel(2.0, 8.0))
+    voyage: LatencyModel = field(default_factory=lambda: LatencyModel(0.08, 0.4))
+    ipfs: LatencyModel = field(default_factory=lambda: LatencyModel(0.2, 1.5))
+    dns_delay: float = 0.0
+    risky_rate: float = 0.05
+    seed: int = 0
+
+
+@dataclass
+class Sample:
+    operation: str
+    start: float
+    end: float
+    status: int
+
+
+def configure_environment(workdir: str, config: BenchConfig) -> None:
+    """Settings for a self-contained run: state under `workdir`, no Supabase, no trace export."""
+    for name in ("SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY", "INTERNAL_API_KEY"):
+        os.environ.pop(name, None)
+    os.environ.update({
+        "GEMINI_API_KEY": "bench",
+        "VOYAGE_API_KEY": "bench",
+        "QDRANT_URL": "http://qdrant.bench.test:6333",
+        "ENVIRONMENT": "development",
+        "VECTOR_STORE": config.vector_store,
+        "VOYAGE_DIMENSIONS": str(config.dimensions),
+        "IPFS_GATEWAY": IPFS_GATEWAY,
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(workdir, "vectors"),
+        "NEIGHBOR_INDEX_PATH": os.path.join(workdir, "neighbors.npz"),
+        "ANALYZE_JOB_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "TRACE_EXPORT_PATH": "",
+    })
+
+
+class Fakes:
+    def __init__(self, config: BenchConfig, corpus: Corpus):
+        self.gemini = FakeGemini(config.gemini, config.gemini_pro, config.risky_rate, seed=config.seed)
+        self.voyage = FakeVoyage(config.voyage, config.dimensions, seed=config.seed)
+        self.ipfs = FakeIPFSGateway(corpus.images, config.ipfs, seed=config.seed)
+        self.dns_delay = config.dns_delay
+
+    def install(self, stack: ExitStack) -> None:
+        import socket
+        from qdrant_client import AsyncQdrantClient
+        from app import main
+        from app.services import embeddings, llm
+        from app.services.vector_stores import qdrant
+        from app.utils import image
+
+        stack.enter_context(patch.object(llm, "_client", self.gemini))
+        stack.enter_context(patch.object(embeddings, "_client", self.voyage))
+        stack.enter_context(patch.object(qdrant, "_client", AsyncQdrantClient(location=":memory:")))
+        stack.enter_context(patch.object(image, "httpx", SimpleNamespace(AsyncClient=self.ipfs.client_factory())))
+        stack.enter_context(patch.object(image, "socket", SimpleNamespace(
+            getaddrinfo=fake_getaddrinfo(self.dns_delay),
+            IPPROTO_TCP=socket.IPPROTO_TCP,
+            gaierror=socket.gaierror,
+        )))
+        stack.enter_context(patch.dict(main.RATE_LIMITS, clear=True))
+
+    def stats(self) -> dict:
+        return {
+            name: vars(fake.stats).copy()
+            for name, fake in (("gemini", self.gemini), ("voyage", self.voyage), ("ipfs", self.ipfs))
+        }
+
+
+async def seed(corpus: Corpus, voyage: FakeVoyage) -> None:
+    """Index the corpus directly (no upstream latency) and build the neighbor lists."""
+    from app.services import neighbors, vector_db
+
+    await vector_db.ensure_collection()
+    for post in corpus.posts:
+        await vector_db.upsert_post(
+            post.post_id,
+            voyage.embed_text(post.description),
+            {
+                "description": post.description,
+                "creator_wallet": post.creator_wallet,
+                "timestamp": post.timestamp,
+                "phash": post.phash,
+                "cluster_id": post.post_id,
+            },
+        )
+    await neighbors.rebuild()
+
+
+class LagSampler:
+    def __init__(self):
+        self.times: list[float] = []
+        self.lags: list[float] = []
+
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            now = time.perf_counter()
+            self.times.append(now)
+            self.lags.append(max(0.0, now - start - LAG_INTERVAL))
+
+    def worst_between(self, start: float, end: float) -> float:
+        lo = bisect.bisect_left(self.times, start)
+        # The first sample after the request ends still covers its last stretch
+        hi = min(len(self.times), bisect.bisect_right(self.times, end) + 1)
+        return max(self.lags[lo:hi], default=0.0)
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = READY_TIMEOUT) -> float:
+    """Poll /ready; returns the seconds it took."""
+    start = time.perf_counter()
+    while (await client.get("/ready")).status_code != 200:
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError(f"Service not ready after {timeout:.0f}s")
+        await asyncio.sleep(0.01)
+    return time.perf_counter() - start
+
+
+async def _send(client: httpx.AsyncClient, workload: Workload, samples: list[Sample], start: float | None = None):
+    request = workload.next()
+    start = start if start is not None else time.perf_counter()
+    try:
+        response = await client.request(request.method, request.path, json=request.body)
+        status = response.status_code
+    except Exception:
+        status = 599
+    samples.append(Sample(request.operation, start, time.perf_counter(), status))
+
+
+async def _closed_loop(client, workload, samples, config: BenchConfig, deadline: float) -> None:
+    async def worker():
+        while time.perf_counter() < deadline:
+            await _send(client, workload, samples)
+
+    await asyncio.gather(*(worker() for _ in range(config.concurrency)))
+
+
+async def _open_loop(client, workload, samples, config: BenchConfig, deadline: float) -> int:
+    """
+    Poisson arrivals at config.rps. Latency is measured from the scheduled
+    send time, so a stalled loop shows up as latency rather than fewer
+    requests. Arrivals beyond max_in_flight are dropped and counted.
+    """
+    rng = random.Random(config.seed + 1)
+    tasks: set[asyncio.Task] = set()
+    dropped = 0
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= config.max_in_flight:
+            dropped += 1
+        else:
+            task = asyncio.create_task(_send(client, workload, samples, start=next_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        next_at += rng.expovariate(config.rps)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return dropped
+
+
+async def run(config: BenchConfig) -> dict:
+    """Seed, warm up, run the workload and return raw samples plus context for bench.report."""
+    from app.main import app
+
+    corpus = Corpus.generate(config.posts, config.images, seed=config.seed)
+    fakes = Fakes(config, corpus)
+    with ExitStack() as stack:
+        fakes.install(stack)
+        seed_start = time.perf_counter()
+        await seed(corpus, fakes.voyage)
+        seed_seconds = time.perf_counter() - seed_start
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench.test", timeout=120) as client:
+                await wait_until_ready(client)
+                workload = Workload(corpus, config.mix, seed=config.seed)
+                if config.warmup > 0:
+                    await _closed_loop(client, workload, [], config, time.perf_counter() + config.warmup)
+
+                sampler = LagSampler()
+                lag_task = asyncio.create_task(sampler.run())
+                samples: list[Sample] = []
+                started = time.perf_counter()
+                deadline = started + config.duration
+                dropped = 0
+                if config.rps:
+                    dropped = await _open_loop(client, workload, samples, config, deadline)
+                else:
+                    await _closed_loop(client, workload, samples, config, deadline)
+                elapsed = time.perf_counter() - started
+                lag_task.cancel()
+
+    return {
+        "samples": samples,
+        "sampler": sampler,
+        "elapsed": elapsed,
+        "dropped": dropped,
+        "seed_seconds": seed_seconds,
+        "upstreams": fakes.stats(),
+    }
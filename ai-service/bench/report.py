@@ -0,0 +1,129 @@
+"""
+Summaries of a bench run, and comparison against a saved baseline.
+
+`summarize` turns raw samples into per-endpoint RPS, latency percentiles,
+error counts and loop lag. That summary is what `--out` saves and
+`--compare` reads back.
+"""
+import math
+
+from bench.harness import BenchConfig, LagSampler, Sample
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of unsorted values (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _summary(samples: list[Sample], sampler: LagSampler, elapsed: float) -> dict:
+    latencies = [s.end - s.start for s in samples]
+    lags = [sampler.worst_between(s.start, s.end) for s in samples]
+    statuses: dict[str, int] = {}
+    for s in samples:
+        statuses[str(s.status)] = statuses.get(str(s.status), 0) + 1
+    errors = sum(1 for s in samples if s.status >= 400)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+        "lag_p99_ms": percentile(lags, 99) * 1000,
+        "statuses": statuses,
+    }
+
+
+def summarize(raw: dict, config: BenchConfig) -> dict:
+    samples: list[Sample] = raw["samples"]
+    sampler: LagSampler = raw["sampler"]
+    by_operation: dict[str, list[Sample]] = {}
+    for s in samples:
+        by_operation.setdefault(s.operation, []).append(s)
+    return {
+        "config": {
+            "mix": config.mix,
+            "duration": config.duration,
+            "concurrency": None if config.rps else config.concurrency,
+            "rps": config.rps,
+            "posts": config.posts,
+            "vector_store": config.vector_store,
+            "gemini": repr(config.gemini),
+            "gemini_pro": repr(config.gemini_pro),
+            "voyage": repr(config.voyage),
+            "ipfs": repr(config.ipfs),
+            "dns_delay": config.dns_delay,
+            "seed": config.seed,
+        },
+        "elapsed": raw["elapsed"],
+        "dropped": raw["dropped"],
+        "seed_seconds": raw["seed_seconds"],
+        "overall": _summary(samples, sampler, raw["elapsed"]),
+        "endpoints": {op: _summary(ss, sampler, raw["elapsed"]) for op, ss in sorted(by_operation.items())},
+        "loop_lag": {
+            "p50_ms": percentile(sampler.lags, 50) * 1000,
+            "p99_ms": percentile(sampler.lags, 99) * 1000,
+            "max_ms": max(sampler.lags, default=0.0) * 1000,
+        },
+        "upstreams": raw["upstreams"],
+    }
+
+
+def format_table(summary: dict) -> str:
+    header = f"{'endpoint':<12} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'lag p99':>8}"
+    lines = [header, "-" * len(header)]
+    rows = list(summary["endpoints"].items()) + [("overall", summary["overall"])]
+    for name, s in rows:
+        lines.append(
+            f"{name:<12} {s['count']:>7} {s['errors']:>5} {s['rps']:>8.1f} {s['p50_ms']:>8.1f} "
+            f"{s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['lag_p99_ms']:>8.1f}"
+        )
+    lag = summary["loop_lag"]
+    lines.append(
+        f"latencies in ms; loop lag p50 {lag['p50_ms']:.2f} p99 {lag['p99_ms']:.2f} max {lag['max_ms']:.1f} ms"
+        + (f"; {summary['dropped']} arrivals dropped" if summary["dropped"] else "")
+    )
+    upstreams = ", ".join(
+        f"{name} {u['calls']} calls/{u['errors']} err/max {u['max_in_flight']} in flight"
+        for name, u in summary["upstreams"].items()
+    )
+    lines.append(f"upstreams: {upstreams}")
+    return "\n".join(lines)
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> tuple[str, list[str]]:
+    """
+    Side-by-side table of p50/p99/RPS changes per endpoint, and the list of
+    regressions: p99 or loop-lag p99 up, or RPS down, by more than
+    `tolerance` (relative), or error rate up by more than one point.
+    """
+    lines = [f"{'endpoint':<12} {'p50':>16} {'p99':>16} {'rps':>16} {'lag p99':>16}"]
+    regressions = []
+
+    def cell(old: float, new: float) -> str:
+        change = (new - old) / old if old else 0.0
+        return f"{new:>8.1f} ({change:+.0%})"
+
+    names = sorted(set(baseline["endpoints"]) & set(current["endpoints"])) + ["overall"]
+    for name in names:
+        old = baseline["overall"] if name == "overall" else baseline["endpoints"][name]
+        new = current["overall"] if name == "overall" else current["endpoints"][name]
+        lines.append(
+            f"{name:<12} {cell(old['p50_ms'], new['p50_ms']):>16} {cell(old['p99_ms'], new['p99_ms']):>16} "
+            f"{cell(old['rps'], new['rps']):>16} {cell(old['lag_p99_ms'], new['lag_p99_ms']):>16}"
+        )
+        if old["p99_ms"] and new["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {old['p99_ms']:.1f} -> {new['p99_ms']:.1f} ms")
+        if old["lag_p99_ms"] >= 1 and new["lag_p99_ms"] > old["lag_p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: loop lag p99 {old['lag_p99_ms']:.1f} -> {new['lag_p99_ms']:.1f} ms")
+        if old["rps"] and new["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {old['rps']:.1f} -> {new['rps']:.1f}")
+        if new["error_rate"] > old["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {old['error_rate']:.1%} -> {new['error_rate']:.1%}")
+    return "\n".join(lines), regressions
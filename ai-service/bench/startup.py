@@ -0,0 +1,137 @@
+"""
+Startup benchmark: how long until a fresh process can take traffic.
+
+Each run spawns a new interpreter (`python -m bench.startup`), which imports
+app.main, enters the lifespan and polls /ready in-process, then prints its
+timings as JSON:
+
+- process_ready_ms: from spawn to /ready passing, interpreter start included
+- import_ms: `import app.main`
+- serving_ms / ready_ms: the app's own marks (see app.utils.startup), from
+  the start of the app import to accepting connections and to ready
+- components / imports: the warm-up broken down by component and SDK import
+
+Gemini and Voyage clients are real; building them makes no network calls.
+The vector store is local by default. With --vector-store qdrant, the child
+installs qdrant-client's in-memory mode first, so the qdrant import falls
+outside the measured window.
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+PHASES = ("process_ready_ms", "import_ms", "serving_ms", "ready_ms")
+
+
+async def _serve(vector_store: str) -> dict:
+    import httpx
+    from app.main import app
+    from app.utils import startup
+    from bench.harness import wait_until_ready
+
+    with ExitStack() as stack:
+        if vector_store == "qdrant":
+            from qdrant_client import AsyncQdrantClient
+            from app.services.vector_stores import qdrant
+
+            stack.enter_context(patch.object(qdrant, "_client", AsyncQdrantClient(location=":memory:")))
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench.test") as client:
+                await wait_until_ready(client)
+                ready_at = time.time()
+                report = startup.report()
+    report["ready_at"] = ready_at
+    return report
+
+
+def child(vector_store: str) -> None:
+    from bench.harness import BenchConfig, configure_environment
+
+    spawned_at = float(os.environ["BENCH_SPAWNED_AT"])
+    with tempfile.TemporaryDirectory(prefix="solshare-startup-") as workdir:
+        configure_environment(workdir, BenchConfig(mix={}, vector_store=vector_store))
+        start = time.perf_counter()
+        import app.main  # noqa: F401
+        import_ms = (time.perf_counter() - start) * 1000
+        from app.utils.startup import HEAVY_MODULES
+
+        eager = [m for m in HEAVY_MODULES if m in sys.modules]
+        report = asyncio.run(_serve(vector_store))
+    print(json.dumps({
+        "process_ready_ms": (report.pop("ready_at") - spawned_at) * 1000,
+        **report,
+        "import_ms": import_ms,
+        "eager_modules": eager,
+    }))
+
+
+def measure(runs: int, vector_store: str = "local") -> list[dict]:
+    results = []
+    for _ in range(runs):
+        env = {**os.environ, "BENCH_SPAWNED_AT": repr(time.time())}
+        proc = subprocess.run(
+            [sys.executable, "-m", "bench.startup", vector_store],
+            cwd=SERVICE_ROOT, env=env, capture_output=True, text=True, timeout=300,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Startup run failed:\n{proc.stderr}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def summarize(results: list[dict], vector_store: str) -> dict:
+    def median(values: list[float]) -> float:
+        return statistics.median(values) if values else 0.0
+
+    components = {name for r in results for name in r["components"]}
+    imports = {name for r in results for name in r["imports_ms"]}
+    return {
+        "config": {"runs": len(results), "vector_store": vector_store},
+        "phases": {p: median([r[p] for r in results if r[p] is not None]) for p in PHASES},
+        "components": {c: median([r["components"][c]["ms"] for r in results if c in r["components"]])
+                       for c in sorted(components)},
+        "imports": {m: median([r["imports_ms"][m] for r in results if m in r["imports_ms"]])
+                    for m in sorted(imports)},
+        # Heavy modules imported by `import app.main` in any run; should stay empty
+        "eager_modules": sorted({m for r in results for m in r["eager_modules"]}),
+    }
+
+
+def format_table(summary: dict) -> str:
+    lines = [f"{'startup (median of ' + str(summary['config']['runs']) + ')':<32} {'ms':>8}", "-" * 41]
+    lines += [f"{phase:<32} {ms:>8.0f}" for phase, ms in summary["phases"].items()]
+    lines += [f"warm-up {name:<24} {ms:>8.0f}" for name, ms in summary["components"].items()]
+    lines += [f"import {name:<25} {ms:>8.0f}" for name, ms in summary["imports"].items()]
+    if summary["eager_modules"]:
+        lines.append(f"imported eagerly by app.main: {', '.join(summary['eager_modules'])}")
+    return "\n".join(lines)
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> tuple[str, list[str]]:
+    """Phase-by-phase change, and regressions: a phase slower by more than `tolerance`."""
+    lines = [f"{'phase':<20} {'before':>8} {'after':>8} {'change':>8}"]
+    regressions = []
+    for phase in PHASES:
+        old, new = baseline["phases"][phase], current["phases"][phase]
+        change = (new - old) / old if old else 0.0
+        lines.append(f"{phase:<20} {old:>8.0f} {new:>8.0f} {change:>+8.0%}")
+        if old and new > old * (1 + tolerance):
+            regressions.append(f"{phase}: {old:.0f} -> {new:.0f} ms")
+    for module in current["eager_modules"]:
+        if module not in baseline["eager_modules"]:
+            regressions.append(f"{module} is imported by app.main again")
+    return "\n".join(lines), regressions
+
+
+if __name__ == "__main__":
+    child(sys.argv[1] if len(sys.argv) > 1 else "local")
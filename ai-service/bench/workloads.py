@@ -0,0 +1,168 @@
+"""
+Seed corpus and workload mixes.
+
+A Corpus is a fixed set of posts (descriptions built from fakes.WORDS,
+creators, timestamps over the last 30 days) plus an image pool. The images
+are served by the fake IPFS gateway and sent inline for moderation. All of
+it derives from one seed, so two runs with the same arguments draw the same
+sequence of requests.
+
+A mix maps operation names to weights. Each operation builds a request
+(method, path, JSON body) from the corpus; the endpoint label in reports is
+the operation name.
+"""
+import base64
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable
+
+from bench.fakes import WORDS, make_cid, make_jpeg
+
+DAY = 86400
+
+
+@dataclass
+class Post:
+    post_id: str
+    description: str
+    creator_wallet: str
+    timestamp: int
+    phash: str
+
+
+@dataclass
+class Corpus:
+    posts: list[Post]
+    images: dict[str, bytes]
+    cids: list[str]
+    image_b64: list[str] = field(default_factory=list)
+
+    @classmethod
+    def generate(cls, posts: int, images: int, seed: int = 0) -> "Corpus":
+        rng = random.Random(seed)
+        now = int(time.time())
+        creators = [f"creator-{i:04d}" for i in range(max(1, posts // 20))]
+        cids = [make_cid(seed * 1_000_003 + i) for i in range(images)]
+        image_bytes = [make_jpeg(seed * 1_000_003 + i) for i in range(images)]
+        corpus = cls(
+            posts=[
+                Post(
+                    # Posts are keyed by UUID, as in the backend; Qdrant requires it
+                    post_id=str(uuid.UUID(int=rng.getrandbits(128))),
+                    description=" ".join(rng.choices(WORDS, k=12)),
+                    creator_wallet=rng.choice(creators),
+                    timestamp=now - rng.randrange(30 * DAY),
+                    phash=f"{rng.getrandbits(64):016x}",
+                )
+                for _ in range(posts)
+            ],
+            images=dict(zip(cids, image_bytes)),
+            cids=cids,
+        )
+        corpus.image_b64 = [f"data:image/jpeg;base64,{base64.b64encode(b).decode()}" for b in image_bytes]
+        return corpus
+
+
+@dataclass
+class Request:
+    operation: str
+    method: str
+    path: str
+    body: dict | None = None
+
+
+Builder = Callable[[Corpus, random.Random], Request]
+
+
+def _caption(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(3, 10)))
+
+
+def moderate(corpus: Corpus, rng: random.Random) -> Request:
+    # Images repeat across requests, so the hash tier and decision cache see realistic reuse
+    body = {"image_base64": rng.choice(corpus.image_b64), "caption": _caption(rng)}
+    return Request("moderate", "POST", "/api/moderate/check", body)
+
+
+def check_hash(corpus: Corpus, rng: random.Random) -> Request:
+    return Request("check_hash", "POST", "/api/moderate/check-hash", {"image_hash": rng.choice(corpus.posts).phash})
+
+
+def analyze(corpus: Corpus, rng: random.Random) -> Request:
+    body = {
+        "content_uri": f"ipfs://{rng.choice(corpus.cids)}",
+        "caption": _caption(rng),
+        "post_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "creator_wallet": rng.choice(corpus.posts).creator_wallet,
+        "embedding_format": "none",
+    }
+    return Request("analyze", "POST", "/api/analyze/content", body)
+
+
+def search(corpus: Corpus, rng: random.Random) -> Request:
+    body = {"query": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))), "limit": 20, "rerank": rng.random() < 0.3}
+    return Request("search", "POST", "/api/search/semantic", body)
+
+
+def feed(corpus: Corpus, rng: random.Random) -> Request:
+    liked = [p.post_id for p in rng.sample(corpus.posts, min(len(corpus.posts), rng.randint(0, 12)))]
+    body = {
+        "user_wallet": f"user-{rng.randrange(10_000):05d}",
+        "liked_post_ids": liked,
+        "limit": 30,
+        "include_taste_profile": rng.random() < 0.5,
+    }
+    return Request("feed", "POST", "/api/recommend/feed", body)
+
+
+def similar(corpus: Corpus, rng: random.Random) -> Request:
+    return Request("similar", "POST", "/api/recommend/similar", {"post_id": rng.choice(corpus.posts).post_id})
+
+
+OPERATIONS: dict[str, Builder] = {
+    "moderate": moderate,
+    "check_hash": check_hash,
+    "analyze": analyze,
+    "search": search,
+    "feed": feed,
+    "similar": similar,
+}
+
+MIXES: dict[str, dict[str, float]] = {
+    # Upload path: moderation before posting, then analysis of the new post
+    "upload": {"moderate": 0.5, "check_hash": 0.2, "analyze": 0.3},
+    # Read path: browsing feeds, search and "more like this"
+    "browse": {"feed": 0.45, "search": 0.25, "similar": 0.3},
+    # Roughly production traffic: mostly reads with a steady trickle of uploads
+    "mixed": {"feed": 0.3, "similar": 0.2, "search": 0.15, "moderate": 0.15, "check_hash": 0.1, "analyze": 0.1},
+}
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """A named mix, or 'op=weight,op=weight' (e.g. 'search=3,feed=1')."""
+    if spec in MIXES:
+        return MIXES[spec]
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Workload:
+    """Draws requests from a mix with its own seeded RNG."""
+
+    def __init__(self, corpus: Corpus, mix: dict[str, float], seed: int = 0):
+        self.corpus = corpus
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self._rng = random.Random(seed)
+
+    def next(self) -> Request:
+        name = self._rng.choices(self.names, self.weights)[0]
+        return OPERATIONS[name](self.corpus, self._rng)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Copy the posts collection into a new collection with the current vector layout.
+
+Qdrant cannot add a named vector to an existing collection. Switching to the
+"full" + "coarse" layout (QDRANT_COARSE_DIMENSIONS) therefore means creating
+a new collection and copying every point into it. The coarse vector is
+derived from the stored full embedding, so nothing is re-embedded.
+
+    python scripts/backfill_vectors.py --target solshare_posts_v2
+    python scripts/backfill_vectors.py --target solshare_posts_v2 --resume-from <point id>
+    python scripts/backfill_vectors.py --target solshare_posts_v2 --alias solshare_posts_live
+
+After the copy, either set QDRANT_COLLECTION to the target, or pass --alias
+to atomically point an alias (used as QDRANT_COLLECTION) at it. Posts
+indexed during the copy are picked up by re-running with --resume-from
+set to the last printed offset.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from qdrant_client.models import (  # noqa: E402
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PointStruct,
+)
+from app.config import get_settings  # noqa: E402
+from app.services.vector_stores import qdrant as qdrant_store  # noqa: E402
+
+
+async def backfill(source: str, target: str, batch_size: int, resume_from: str | None) -> int:
+    client = await qdrant_store.get_client()
+    if not await client.collection_exists(target):
+        await qdrant_store.create_collection(client, target)
+        print(f"Created '{target}' with vectors {qdrant_store.vectors_config()}")
+    named = await qdrant_store.uses_named_vectors(client, target)
+
+    copied, offset, start = 0, resume_from, time.perf_counter()
+    while True:
+        points, offset = await client.scroll(
+            source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+        )
+        if points:
+            await client.upsert(target, points=[
+                PointStruct(
+                    id=p.id,
+                    vector=qdrant_store.point_vectors(qdrant_store.full_vector(p.vector), named),
+                    payload=p.payload,
+                )
+                for p in points
+            ])
+            copied += len(points)
+            rate = copied / (time.perf_counter() - start)
+            print(f"copied {copied} points ({rate:.0f}/s), next offset: {offset}")
+        if offset is None:
+            return copied
+
+
+async def switch_alias(alias: str, target: str) -> None:
+    client = await qdrant_store.get_client()
+    existing = {a.alias_name for a in (await client.get_aliases()).aliases}
+    operations = []
+    if alias in existing:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=alias)))
+    # Both operations apply in one request, so readers never see the alias missing
+    await client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"Alias '{alias}' now points at '{target}'")
+
+
+async def main(args) -> None:
+    settings = get_settings()
+    source = args.source or settings.qdrant_collection
+    if source == args.target:
+        sys.exit("--target must differ from the source collection")
+
+    copied = await backfill(source, args.target, args.batch_size, args.resume_from)
+    print(f"Done: {copied} points copied from '{source}' to '{args.target}'")
+
+    if args.alias:
+        await switch_alias(args.alias, args.target)
+    else:
+        print(f"Set QDRANT_COLLECTION={args.target} to serve from the new collection")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="collection to copy from (default: QDRANT_COLLECTION)")
+    parser.add_argument("--target", required=True, help="collection to create and fill")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--resume-from", help="scroll offset (point id) printed by a previous run")
+    parser.add_argument("--alias", help="alias to switch to the target once the copy finishes")
+    asyncio.run(main(parser.parse_args()))
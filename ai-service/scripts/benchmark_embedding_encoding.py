@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Payload size and CPU cost of each AnalyzeResponse embedding format.
+
+    python scripts/benchmark_embedding_encoding.py
+    python scripts/benchmark_embedding_encoding.py --dims 1024 --rounds 2000
+
+For each format it builds a typical AnalyzeResponse and reports the
+serialized body size. It then times the server side (encoding and
+serializing the response as FastAPI does) and a client that parses the body
+and recovers the vector. The client step is what the backend repeats every
+time it moves the job payload through BullMQ.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.schemas import AnalyzeResponse  # noqa: E402
+from app.services.content_analyzer import _embedding_fields  # noqa: E402
+from app.utils import embedding_codec  # noqa: E402
+
+
+def build(embedding: list[float], fmt: str) -> AnalyzeResponse:
+    return AnalyzeResponse(
+        description="A sunlit street market with stalls of fruit and people browsing.",
+        tags=["market", "street", "fruit", "people", "outdoor"],
+        scene_type="urban",
+        objects=["stall", "fruit", "awning"],
+        mood="lively",
+        colors=["orange", "green"],
+        safety_score=10,
+        alt_text="People browsing fruit stalls at an outdoor market",
+        **_embedding_fields(embedding, fmt),
+    )
+
+
+def serialize(embedding: list[float], fmt: str) -> bytes:
+    return build(embedding, fmt).model_dump_json(by_alias=True).encode()
+
+
+def parse(body: bytes, fmt: str) -> list[float] | None:
+    data = json.loads(body)
+    if fmt == "json":
+        return data["embedding"]
+    if fmt == "none":
+        return None
+    return embedding_codec.decode(data["embeddingBase64"], fmt)
+
+
+def timed(fn, rounds: int) -> float:
+    """Median microseconds per call."""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main(args) -> None:
+    embedding = np.random.default_rng(0).normal(size=args.dims)
+    embedding = (embedding / np.linalg.norm(embedding)).tolist()
+    baseline = len(serialize(embedding, "json"))
+
+    print(f"{args.dims}-d embedding, median of {args.rounds} rounds")
+    print(f"{'format':<6} {'bytes':>8} {'vs json':>8} {'server us':>10} {'client us':>10} {'max abs err':>12}")
+    for fmt in embedding_codec.EMBEDDING_FORMATS:
+        body = serialize(embedding, fmt)
+        server = timed(lambda: serialize(embedding, fmt), args.rounds)
+        client = timed(lambda: parse(body, fmt), args.rounds)
+        decoded = parse(body, fmt)
+        error = float(np.max(np.abs(np.asarray(decoded) - embedding))) if decoded is not None else float("nan")
+        print(
+            f"{fmt:<6} {len(body):>8} {len(body) / baseline:>7.0%} {server:>10.1f} {client:>10.1f} {error:>12.2e}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--rounds", type=int, default=1000)
+    main(parser.parse_args())
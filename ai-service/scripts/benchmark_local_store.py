@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Recall@k vs latency for the in-process vector store's IVF index.
+
+    python scripts/benchmark_local_store.py --points 100000            # synthetic clustered vectors
+    python scripts/benchmark_local_store.py --from-qdrant 100000       # real embeddings from Qdrant
+
+Builds a LocalIndex in a temporary directory and reports the build and
+training time. It then compares exact search against IVF at several nprobe
+values. Query vectors are held-out points from the same distribution.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import get_settings  # noqa: E402
+from app.services.vector_stores.local import LocalIndex  # noqa: E402
+
+NPROBE_VALUES = (1, 2, 4, 8, 16, 32)
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def qdrant_vectors(n: int) -> np.ndarray:
+    from app.services.vector_stores import qdrant
+
+    await qdrant.ensure_collection()
+    vectors = []
+    async for batch in qdrant.scroll_points():
+        vectors.extend(p["embedding"] for p in batch)
+        if len(vectors) >= n:
+            break
+    return np.asarray(vectors[:n], dtype=np.float32)
+
+
+def timed_search(index: LocalIndex, queries: np.ndarray, k: int, **kwargs) -> tuple[list[set], list[float]]:
+    results, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits = index.search(q.tolist(), limit=k, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({h["post_id"] for h in hits})
+    return results, latencies
+
+
+def report(name: str, latencies: list[float], recall: float) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{name:<14} {recall:>8.3f} {statistics.median(latencies):>8.2f} {p95:>8.2f}")
+
+
+def main(args) -> None:
+    dim = get_settings().voyage_dimensions
+    if args.from_qdrant:
+        vectors = asyncio.run(qdrant_vectors(args.from_qdrant + args.queries))
+    else:
+        vectors = synthetic_vectors(args.points + args.queries, dim)
+    queries, data = vectors[: args.queries], vectors[args.queries:]
+
+    with tempfile.TemporaryDirectory() as path:
+        index = LocalIndex(path, vectors.shape[1], ivf_min_points=len(data) + 1)
+        start = time.perf_counter()
+        index.upsert_many([(str(i), v.tolist(), {}) for i, v in enumerate(data)])
+        insert_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index.train()
+        train_seconds = time.perf_counter() - start
+        size_mib = (Path(path) / "vectors.f32").stat().st_size / 2**20
+        print(
+            f"{len(data)} vectors x {vectors.shape[1]}-d: insert {insert_seconds:.1f}s, "
+            f"IVF training {train_seconds:.1f}s ({len(index._centroids)} lists), vector file {size_mib:.0f} MiB"
+        )
+
+        truth, latencies = timed_search(index, queries, args.k, exact=True)
+        print(f"\n{len(queries)} queries, recall@{args.k}")
+        print(f"{'config':<14} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        report("exact", latencies, 1.0)
+        for nprobe in NPROBE_VALUES:
+            results, latencies = timed_search(index, queries, args.k, nprobe=nprobe)
+            recall = statistics.mean(len(r & t) / max(len(t), 1) for r, t in zip(results, truth))
+            report(f"nprobe={nprobe}", latencies, recall)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=50_000, help="synthetic vectors to index")
+    parser.add_argument("--from-qdrant", type=int, default=0, help="index this many real vectors from Qdrant instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=50)
+    main(parser.parse_args())
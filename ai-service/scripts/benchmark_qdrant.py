@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Recall@k vs latency benchmark for the posts collection.
+
+Query vectors are sampled from the collection itself. Ground truth for each
+query is an exact (full-scan) search over the full vectors. Each search
+configuration is then timed and scored against it:
+
+    python scripts/benchmark_qdrant.py                    # live collection
+    python scripts/benchmark_qdrant.py --scratch 20000    # copy 20k points into scratch
+                                                          # collections per quantization type
+
+Configurations vary ef and oversampling. On collections with a coarse named
+vector they also compare coarse-only and two-stage (coarse then full)
+retrieval at several candidate multipliers.
+
+--scratch compares none / scalar / binary quantization on the same data.
+It creates temporary collections with the current vector layout and HNSW
+settings, waits for indexing, benchmarks each one and deletes them
+afterwards.
+
+The estimated RAM per point for each layout is printed first.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from qdrant_client.models import (  # noqa: E402
+    CollectionStatus,
+    PointStruct,
+    Prefetch,
+    QuantizationSearchParams,
+    SearchParams,
+)
+from app.config import get_settings  # noqa: E402
+from app.services.vector_stores import qdrant as qdrant_store  # noqa: E402
+from app.services.vector_stores.qdrant import COARSE_VECTOR, FULL_VECTOR  # noqa: E402
+
+EF_VALUES = (32, 64, 128, 256)
+OVERSAMPLING_VALUES = (1.0, 2.0, 4.0)
+CANDIDATE_MULTIPLIERS = (2, 4, 8)
+
+# name -> function(query vector, k) -> query_points kwargs
+SearchConfig = tuple[str, Callable[[list[float], int], dict]]
+
+
+def memory_report(points: int) -> None:
+    """Estimated RAM-resident vector bytes per point and in total, per layout."""
+    settings = get_settings()
+    full, coarse = settings.voyage_dimensions, settings.qdrant_coarse_dimensions
+    layouts = [
+        (f"float32 {full}-d in RAM", 4 * full),
+        (f"int8 {full}-d (originals on disk)", full),
+        (f"binary {full}-d (originals on disk)", full // 8),
+    ]
+    if 0 < coarse < full:
+        layouts += [
+            (f"float32 {coarse}-d coarse (full on disk)", 4 * coarse),
+            (f"int8 {coarse}-d coarse + int8 full", coarse + full),
+            (f"binary {coarse}-d coarse + binary full", (coarse + full) // 8),
+        ]
+    print(f"Estimated vector RAM for {points} points (excluding HNSW links):")
+    for name, per_point in layouts:
+        print(f"  {name:<42} {per_point:>6} B/point  {per_point * points / 2**20:>10.1f} MiB")
+
+
+async def sample_points(client, collection: str, count: int) -> list:
+    points, offset = [], None
+    while len(points) < count:
+        batch, offset = await client.scroll(
+            collection, limit=min(256, count - len(points)), offset=offset, with_vectors=True
+        )
+        points.extend(batch)
+        if offset is None:
+            break
+    return points
+
+
+async def search(client, collection: str, query: dict) -> tuple[list, float]:
+    start = time.perf_counter()
+    response = await client.query_points(collection, **query)
+    return [p.id for p in response.points], time.perf_counter() - start
+
+
+def search_configs(quantized: bool, named: bool) -> list[SearchConfig]:
+    using = FULL_VECTOR if named else None
+    configs: list[SearchConfig] = []
+    for ef in EF_VALUES:
+        if not quantized:
+            params = SearchParams(hnsw_ef=ef)
+            configs.append((f"ef={ef}", lambda v, k, p=params: dict(query=v, using=using, limit=k, search_params=p)))
+            continue
+        variants = [
+            ("original", QuantizationSearchParams(ignore=True)),
+            ("no-rescore", QuantizationSearchParams(rescore=False)),
+        ] + [
+            (f"rescore x{o:g}", QuantizationSearchParams(rescore=True, oversampling=o))
+            for o in OVERSAMPLING_VALUES
+        ]
+        for label, quantization in variants:
+            params = SearchParams(hnsw_ef=ef, quantization=quantization)
+            configs.append((
+                f"ef={ef} {label}",
+                lambda v, k, p=params: dict(query=v, using=using, limit=k, search_params=p),
+            ))
+
+    if named:
+        params = qdrant_store.search_params()
+        configs.append((
+            "coarse only",
+            lambda v, k: dict(query=qdrant_store.coarse_vector(v), using=COARSE_VECTOR, limit=k, search_params=params),
+        ))
+        for multiplier in CANDIDATE_MULTIPLIERS:
+            configs.append((
+                f"coarse x{multiplier} -> full",
+                lambda v, k, m=multiplier: dict(
+                    prefetch=Prefetch(
+                        query=qdrant_store.coarse_vector(v), using=COARSE_VECTOR, params=params, limit=k * m
+                    ),
+                    query=v,
+                    using=FULL_VECTOR,
+                    limit=k,
+                ),
+            ))
+    return configs
+
+
+async def benchmark(client, collection: str, queries: list, k: int, quantized: bool, label: str = "") -> None:
+    named = await qdrant_store.uses_named_vectors(client, collection)
+    using = FULL_VECTOR if named else None
+    truth = []
+    for q in queries:
+        ids, _ = await search(client, collection, dict(
+            query=q, using=using, limit=k, search_params=SearchParams(exact=True)
+        ))
+        truth.append(set(ids))
+
+    print(f"\n{label or collection}: {len(queries)} queries, recall@{k}")
+    print(f"{'config':<28} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, make_query in search_configs(quantized, named):
+        recalls, latencies = [], []
+        for q, expected in zip(queries, truth):
+            ids, latency = await search(client, collection, make_query(q, k))
+            recalls.append(len(expected & set(ids)) / max(len(expected), 1))
+            latencies.append(latency * 1000)
+        latencies.sort()
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(f"{name:<28} {statistics.mean(recalls):>8.3f} {statistics.median(latencies):>8.2f} {p95:>8.2f}")
+
+
+async def wait_until_indexed(client, collection: str, timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = await client.get_collection(collection)
+        if info.status == CollectionStatus.GREEN:
+            return
+        await asyncio.sleep(2)
+    print(f"warning: {collection} still indexing after {timeout:.0f}s")
+
+
+async def scratch_benchmark(client, source: str, count: int, queries: list, k: int) -> None:
+    points = await sample_points(client, source, count)
+    print(f"Copying {len(points)} points into scratch collections")
+    for kind in ("none", "scalar", "binary"):
+        name = f"{source}_bench_{kind}"
+        await qdrant_store.create_collection(client, name, quantization=kind)
+        try:
+            named = await qdrant_store.uses_named_vectors(client, name)
+            for i in range(0, len(points), 256):
+                await client.upsert(name, points=[
+                    PointStruct(
+                        id=p.id,
+                        vector=qdrant_store.point_vectors(qdrant_store.full_vector(p.vector), named),
+                        payload=p.payload,
+                    )
+                    for p in points[i:i + 256]
+                ])
+            await wait_until_indexed(client, name)
+            await benchmark(client, name, queries, k, quantized=kind != "none", label=f"quantization={kind}")
+        finally:
+            await client.delete_collection(name)
+
+
+async def main(args) -> None:
+    settings = get_settings()
+    client = await qdrant_store.get_client()
+    info = await client.get_collection(settings.qdrant_collection)
+    memory_report(args.scratch or info.points_count or 0)
+
+    sampled = await sample_points(client, settings.qdrant_collection, args.queries)
+    queries = [qdrant_store.full_vector(p.vector) for p in sampled]
+    if not queries:
+        print(f"Collection '{settings.qdrant_collection}' is empty")
+        return
+
+    if args.scratch:
+        await scratch_benchmark(client, settings.qdrant_collection, args.scratch, queries, args.k)
+    else:
+        await benchmark(
+            client, settings.qdrant_collection, queries, args.k,
+            quantized=settings.qdrant_quantization != "none",
+            label=f"{settings.qdrant_collection} (quantization={settings.qdrant_quantization})",
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200, help="number of query vectors to sample")
+    parser.add_argument("-k", type=int, default=50, help="recall@k (feeds fetch 50-100)")
+    parser.add_argument("--scratch", type=int, default=0, help="compare quantization types on N copied points")
+    asyncio.run(main(parser.parse_args()))
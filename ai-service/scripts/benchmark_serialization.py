@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint response serialization time: FastAPI's response_model path vs
+ModelJSONResponse (app/api/responses.py).
+
+    python scripts/benchmark_serialization.py
+    python scripts/benchmark_serialization.py --rounds 5000
+
+Each endpoint gets a typical response: 100 search results, 100
+recommendations, an analysis with a 1024-float embedding, and so on. Three
+paths are timed per response:
+
+- fastapi: what the installed FastAPI does for a route with response_model
+  and the default response class. It validates the returned model, then
+  serializes it (on recent releases straight to JSON in pydantic-core).
+- fastapi+dict: the same route with any custom response class, and all
+  FastAPI releases before the JSON fast path. It validates the model,
+  serializes it to a dict, and encodes the dict with the stdlib json module.
+- orjson: ModelJSONResponse. It dumps the model by alias and encodes it with
+  orjson, with no validation.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse, Response  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.api.responses import ModelJSONResponse  # noqa: E402
+from app.models.schemas import (  # noqa: E402
+    AnalyzeJobResponse,
+    AnalyzeResponse,
+    ModerationResponse,
+    ModerationScores,
+    RecommendResponse,
+    RecommendResult,
+    SearchResponse,
+    SearchResult,
+)
+
+
+def samples() -> dict[str, tuple[type, object]]:
+    description = "A sunlit street market with stalls of fruit and people browsing under striped awnings."
+    analysis = AnalyzeResponse(
+        description=description,
+        tags=["market", "street", "fruit", "people", "outdoor"],
+        scene_type="urban",
+        objects=["stall", "fruit", "awning"],
+        mood="lively",
+        colors=["orange", "green"],
+        safety_score=10,
+        alt_text="People browsing fruit stalls at an outdoor market",
+        embedding=[0.0123456789 * (i % 97 - 48) for i in range(1024)],
+    )
+    now = datetime.now(timezone.utc)
+    return {
+        "/api/search/semantic": (SearchResponse, SearchResponse(
+            results=[
+                SearchResult(post_id=f"post-{i:06d}", score=0.9 - i / 1000, description=description,
+                             creator_wallet="7xKXtg2CW87d97TXJSDpbD5jBkheTqA83TZRuJosgAsU", cluster_id=f"post-{i:06d}")
+                for i in range(100)
+            ],
+            expanded_query=description,
+        )),
+        "/api/recommend/feed": (RecommendResponse, RecommendResponse(
+            recommendations=[
+                RecommendResult(post_id=f"post-{i:06d}", score=0.8 - i / 1000, reason="Similar to liked posts")
+                for i in range(100)
+            ],
+            taste_profile=description,
+        )),
+        "/api/analyze/content": (AnalyzeResponse, analysis),
+        "/api/analyze/jobs/{id}": (AnalyzeJobResponse, AnalyzeJobResponse(
+            job_id="0f8fad5b-d9cb-469f-a165-70867728950e", status="succeeded", post_id="post-000001",
+            attempts=1, created_at=now, updated_at=now, result=analysis,
+        )),
+        "/api/moderate/check": (ModerationResponse, ModerationResponse(
+            verdict="allow", scores=ModerationScores(), max_score=0.0, explanation="No issues found",
+            processing_time_ms=412,
+        )),
+    }
+
+
+async def fastapi_path(field, content, dump_json: bool) -> bytes:
+    serialized = await serialize_response(field=field, response_content=content, by_alias=True, dump_json=dump_json)
+    if dump_json:
+        return Response(serialized, media_type="application/json").body
+    return JSONResponse(serialized).body
+
+
+async def timed(fn, rounds: int) -> float:
+    """Median microseconds per call."""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        times.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(times)
+
+
+async def main(args) -> None:
+    print(f"median of {args.rounds} rounds, microseconds")
+    print(f"{'endpoint':<24} {'bytes':>7} {'fastapi':>9} {'+dict':>9} {'orjson':>9} {'speedup':>8}")
+    for endpoint, (model, content) in samples().items():
+        field = create_model_field(name="response", type_=model, mode="serialization")
+        body = ModelJSONResponse(content).body
+        fast = await timed(lambda: fastapi_path(field, content, dump_json=True), args.rounds)
+        slow = await timed(lambda: fastapi_path(field, content, dump_json=False), args.rounds)
+        ours = await timed(lambda: ModelJSONResponse(content), args.rounds)
+        print(f"{endpoint:<24} {len(body):>7} {fast:>9.1f} {slow:>9.1f} {ours:>9.1f} {min(fast, slow) / ours:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -1,43 +1,79 @@
 #!/usr/bin/env python3
 """
 Setup Qdrant collection for SolShare.
-Run once to initialize the vector database.
+
+    python scripts/setup_qdrant.py           # create the collection if missing
+    python scripts/setup_qdrant.py migrate   # apply current quantization/HNSW settings, backfill payloads
+    python scripts/setup_qdrant.py status    # show the collection's config
+
+Collection settings (vector size, quantization, HNSW, on-disk vectors) come
+from the service's Settings, so run this with the same environment / .env as
+the service.
 """
+import argparse
 import asyncio
-import os
-from qdrant_client import AsyncQdrantClient
-from qdrant_client.models import VectorParams, Distance, PayloadSchemaType
+import sys
+from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-async def setup():
-    url = os.environ.get("QDRANT_URL")
-    api_key = os.environ.get("QDRANT_API_KEY")
-    collection_name = os.environ.get("QDRANT_COLLECTION", "solshare_posts")
+from app.config import get_settings  # noqa: E402
+from app.services import database  # noqa: E402
+from app.services.vector_stores import qdrant as qdrant_store  # noqa: E402
 
-    if not url or not api_key:
-        print("Error: QDRANT_URL and QDRANT_API_KEY required")
+
+async def setup():
+    settings = get_settings()
+    client = await qdrant_store.get_client()
+    if await client.collection_exists(settings.qdrant_collection):
+        print(f"Collection '{settings.qdrant_collection}' already exists (use 'migrate' to update it)")
         return
 
-    client = AsyncQdrantClient(url=url, api_key=api_key)
+    await qdrant_store.ensure_collection()
+    print(
+        f"Collection '{settings.qdrant_collection}' created with indexes "
+        f"(quantization={settings.qdrant_quantization}, m={settings.qdrant_hnsw_m}, "
+        f"ef_construct={settings.qdrant_hnsw_ef_construct})"
+    )
 
-    collections = await client.get_collections()
-    exists = any(c.name == collection_name for c in collections.collections)
 
-    if exists:
-        print(f"Collection '{collection_name}' already exists")
+async def migrate():
+    settings = get_settings()
+    await qdrant_store.migrate_collection()
+    print(
+        f"Collection '{settings.qdrant_collection}' updated "
+        f"(quantization={settings.qdrant_quantization}, m={settings.qdrant_hnsw_m}, "
+        f"ef_construct={settings.qdrant_hnsw_ef_construct}, on_disk={settings.qdrant_vectors_on_disk}). "
+        "Qdrant re-indexes in the background; check progress with 'status'."
+    )
+    if not database.is_configured():
+        print("Supabase not configured; posts indexed without a timestamp keep 0 and stay out of time-window feeds")
         return
-
-    await client.create_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=1024, distance=Distance.COSINE),
+    client = await qdrant_store.get_client()
+    updated = await qdrant_store.backfill_timestamps(
+        client, settings.qdrant_collection, database.fetch_post_timestamps
     )
+    print(f"Backfilled timestamps on {updated} posts from Supabase")
+    await database.close()
+
+
+async def status():
+    settings = get_settings()
+    client = await qdrant_store.get_client()
+    info = await client.get_collection(settings.qdrant_collection)
+    print(f"status:        {info.status}")
+    print(f"points:        {info.points_count}")
+    print(f"indexed:       {info.indexed_vectors_count}")
+    print(f"vectors:       {info.config.params.vectors}")
+    print(f"hnsw:          {info.config.hnsw_config}")
+    print(f"quantization:  {info.config.quantization_config}")
 
-    await client.create_payload_index(collection_name, "creator_wallet", PayloadSchemaType.KEYWORD)
-    await client.create_payload_index(collection_name, "scene_type", PayloadSchemaType.KEYWORD)
-    await client.create_payload_index(collection_name, "timestamp", PayloadSchemaType.INTEGER)
 
-    print(f"Collection '{collection_name}' created with indexes")
+COMMANDS = {"setup": setup, "migrate": migrate, "status": status}
 
 
 if __name__ == "__main__":
-    asyncio.run(setup())
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="setup", choices=COMMANDS)
+    args = parser.parse_args()
+    asyncio.run(COMMANDS[args.command]())
@@ -0,0 +1,49 @@
+"""
+Local stand-in for google.genai.Client with injectable latency and failures.
+
+Only the surface llm.py uses is implemented: client.aio.models.generate_content.
+"""
+import asyncio
+import random
+from types import SimpleNamespace
+from typing import Callable
+
+from google.genai import errors
+
+
+def _api_error(code: int) -> errors.APIError:
+    body = {"error": {"code": code, "message": f"fake Gemini {code}"}}
+    return errors.ServerError(code, body) if code >= 500 else errors.ClientError(code, body)
+
+
+class FakeGemini:
+    def __init__(
+        self,
+        latency: float | Callable[[str], float] = 0.0,
+        error_rate: float = 0.0,
+        error_code: int = 500,
+        reply: str = '{"rankings": []}',
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.reply = reply
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._rng = random.Random(seed)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.generate_content))
+
+    async def generate_content(self, model: str, contents, config=None):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency(model) if callable(self.latency) else self.latency
+            await asyncio.sleep(delay)
+            if self.error_rate and self._rng.random() < self.error_rate:
+                raise _api_error(self.error_code)
+            return SimpleNamespace(text=self.reply, parsed=None)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import admission, metrics
+from app.utils.admission import AdmissionController
+from app.utils.limiter import OverloadedError
+
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_route_caps_and_body_budget():
+    controller = AdmissionController(max_in_flight=4, max_body_bytes=100, route_limits={"/slow": 1})
+    await controller.acquire("/slow", 10)
+
+    # A saturated route waits without blocking other routes queued behind it
+    second_slow = asyncio.create_task(controller.acquire("/slow", 10))
+    await _settle()
+    await asyncio.wait_for(controller.acquire("/fast", 70), timeout=0.1)
+    assert not second_slow.done()
+
+    # 80 bytes in flight: a 30-byte body waits for room, an oversized one runs alone
+    medium = asyncio.create_task(controller.acquire("/fast", 30))
+    huge = asyncio.create_task(controller.acquire("/fast", 500))
+    await _settle()
+    assert not medium.done() and not huge.done()
+
+    controller.release("/fast", 70, 0.01)
+    await _settle()
+    assert medium.done() and not second_slow.done() and not huge.done()
+    assert controller.body_bytes == 40
+
+    controller.release("/slow", 10, 0.01)
+    await _settle()
+    assert second_slow.done() and not huge.done()
+
+    controller.release("/slow", 10, 0.01)
+    controller.release("/fast", 30, 0.01)
+    await _settle()
+    assert huge.done() and controller.body_bytes == 500 and controller.in_flight == 1
+    controller.release("/fast", 500, 0.01)
+    assert controller.in_flight == 0 and controller.queue_length == 0
+
+
+@pytest.mark.asyncio
+async def test_standing_queue_switches_to_lifo_and_sheds_stale_waiters():
+    controller = AdmissionController(
+        max_in_flight=1, max_body_bytes=100, target_queue_time=0.05, interval=0.1, max_queue_time=1.0
+    )
+    shed = metrics.counter("admission_shed_total", route="/r", reason="queue_time")
+    shed_before = shed.value
+    await controller.acquire("/r", 0)
+    stale = [asyncio.create_task(controller.acquire("/r", 0)) for _ in range(2)]
+    await asyncio.sleep(0.15)
+    assert controller.overloaded()
+
+    fresh = asyncio.create_task(controller.acquire("/r", 0))
+    await _settle()
+    controller.release("/r", 0, 0.2)
+    await _settle()
+
+    # The newest waiter gets the slot; the ones past the target are shed
+    assert fresh.done() and fresh.exception() is None
+    for task in stale:
+        with pytest.raises(OverloadedError) as excinfo:
+            await task
+        assert excinfo.value.retry_after > 0
+    assert shed.value - shed_before == 2
+    controller.release("/r", 0, 0.2)
+    assert not controller.overloaded() and controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_waiter_times_out_and_cancellation_frees_the_slot():
+    controller = AdmissionController(max_in_flight=1, max_body_bytes=100, max_queue_time=0.05)
+    await controller.acquire("/r", 0)
+    with pytest.raises(OverloadedError):
+        await controller.acquire("/r", 0)
+    assert controller.queue_length == 0
+
+    waiter = asyncio.create_task(controller.acquire("/r", 0))
+    await _settle()
+    waiter.cancel()
+    await _settle()
+    controller.release("/r", 0, 0.01)
+    assert controller.in_flight == 0 and controller.queue_length == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_as_the_timeout_fires_is_kept():
+    controller = AdmissionController(max_in_flight=1, max_body_bytes=100, max_queue_time=0.05)
+    await controller.acquire("/r", 10)
+    waiter = asyncio.create_task(controller.acquire("/r", 20))
+    await _settle()
+
+    # Block the loop past both timers so the grant and the timeout run in the
+    # same iteration, grant first
+    asyncio.get_running_loop().call_later(0.01, controller.release, "/r", 10, 0.01)
+    time.sleep(0.1)
+    await waiter
+    assert controller.in_flight == 1 and controller.body_bytes == 20
+    controller.release("/r", 20, 0.01)
+    assert controller.in_flight == 0 and controller.body_bytes == 0
+
+
+def test_full_service_sheds_with_retry_after_but_keeps_probes():
+    full = AdmissionController(max_in_flight=0, max_body_bytes=100, max_queue_time=0.01)
+    with patch.object(admission, "_controller", full):
+        client = TestClient(app)
+        response = client.post("/api/moderate/check", json={"content": "hello"})
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+        assert client.get("/health").status_code == 200
+        assert client.get("/metrics").status_code == 200
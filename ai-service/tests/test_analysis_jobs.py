@@ -0,0 +1,144 @@
+import asyncio
+import sqlite3
+from unittest.mock import patch, AsyncMock
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.schemas import AnalyzeResponse
+from app.services import analysis_jobs
+
+RESULT = AnalyzeResponse(
+    description="A sunset over the ocean",
+    tags=["sunset", "ocean"],
+    scene_type="nature",
+    objects=["sun"],
+    mood="calm",
+    colors=["orange"],
+    safety_score=10,
+    alt_text="Sunset",
+    embedding=[0.1, 0.2],
+)
+
+
+@pytest.fixture(autouse=True)
+def job_store(tmp_path):
+    store = analysis_jobs.JobStore(str(tmp_path / "jobs.db"))
+    with patch.object(analysis_jobs, "_store", store), patch.object(analysis_jobs, "_wakeup", None):
+        yield store
+    store.close()
+
+
+def request(post_id="post-1"):
+    return {"content_uri": "ipfs://Qm", "caption": None, "post_id": post_id, "creator_wallet": None}
+
+
+@pytest.mark.asyncio
+async def test_submissions_for_same_post_are_deduplicated():
+    first, created = await analysis_jobs.submit(request())
+    assert created
+    second, created = await analysis_jobs.submit(request())
+    assert not created
+    assert second["id"] == first["id"]
+
+    other, created = await analysis_jobs.submit(request("post-2"))
+    assert created and other["id"] != first["id"]
+
+
+@pytest.mark.asyncio
+async def test_job_runs_and_stores_result(job_store):
+    job, _ = await analysis_jobs.submit(request())
+    with patch.object(analysis_jobs.content_analyzer, "analyze_content", new=AsyncMock(return_value=RESULT)):
+        await analysis_jobs.run_job(job_store.claim())
+
+    done = await analysis_jobs.get_job(job["id"])
+    assert done["status"] == "succeeded"
+    assert done["result"]["description"] == "A sunset over the ocean"
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried_client_errors_are_not(job_store):
+    job, _ = await analysis_jobs.submit(request())
+    failing = AsyncMock(side_effect=HTTPException(status_code=504, detail="timed out"))
+    with patch.object(analysis_jobs.content_analyzer, "analyze_content", new=failing):
+        await analysis_jobs.run_job(job_store.claim())
+    retried = job_store.get(job["id"])
+    assert retried["status"] == "queued"
+    assert retried["run_after"] > retried["updated_at"]
+
+    job, _ = await analysis_jobs.submit(request("post-2"))
+    invalid = AsyncMock(side_effect=HTTPException(status_code=400, detail="bad uri"))
+    with patch.object(analysis_jobs.content_analyzer, "analyze_content", new=invalid):
+        await analysis_jobs.run_job(job_store.get(job["id"]) | {"attempts": 1})
+    assert job_store.get(job["id"])["status"] == "failed"
+
+    # A failed post can be resubmitted
+    _, created = await analysis_jobs.submit(request("post-2"))
+    assert created
+    assert job_store.get(job["id"])["status"] == "queued"
+
+
+@pytest.mark.asyncio
+async def test_workers_recover_interrupted_jobs(job_store):
+    job, _ = await analysis_jobs.submit(request())
+    job_store.claim()  # left running by a "crashed" process
+
+    with patch.object(analysis_jobs.content_analyzer, "analyze_content", new=AsyncMock(return_value=RESULT)):
+        workers = asyncio.create_task(analysis_jobs.run_workers())
+        for _ in range(100):
+            if job_store.get(job["id"])["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.01)
+        workers.cancel()
+
+    assert job_store.get(job["id"])["status"] == "succeeded"
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_a_failure_to_record_an_outcome(job_store):
+    first, _ = await analysis_jobs.submit(request())
+    second, _ = await analysis_jobs.submit(request("post-2"))
+    complete = job_store.complete
+    calls = []
+
+    def flaky_complete(job_id, result):
+        calls.append(job_id)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        complete(job_id, result)
+
+    with (
+        patch.object(analysis_jobs.content_analyzer, "analyze_content", new=AsyncMock(return_value=RESULT)),
+        patch.object(job_store, "complete", side_effect=flaky_complete),
+        patch.object(analysis_jobs.get_settings(), "analyze_job_workers", 1),
+    ):
+        workers = asyncio.create_task(analysis_jobs.run_workers())
+        for _ in range(100):
+            if len(calls) == 2:
+                break
+            await asyncio.sleep(0.01)
+        workers.cancel()
+
+    assert job_store.get(second["id"])["status"] == "succeeded"
+    assert job_store.get(first["id"])["status"] == "running"
+
+
+def test_submit_and_poll_endpoints():
+    client = TestClient(app)
+    response = client.post("/api/analyze/jobs", json={"content_uri": "ipfs://Qm", "post_id": "post-9"})
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+    assert job["postId"] == "post-9"
+
+    again = client.post("/api/analyze/jobs", json={"content_uri": "ipfs://Qm", "post_id": "post-9"})
+    assert again.status_code == 200
+    assert again.json()["jobId"] == job["jobId"]
+
+    polled = client.get(f"/api/analyze/jobs/{job['jobId']}")
+    assert polled.status_code == 200
+    assert polled.json()["status"] == "queued"
+
+    assert client.get("/api/analyze/jobs/missing").status_code == 404
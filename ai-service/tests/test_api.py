@@ -1,14 +1,17 @@
+import json
 import os
+from contextlib import contextmanager
 import pytest
 from unittest.mock import patch, AsyncMock
 
-os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
 os.environ.setdefault("VOYAGE_API_KEY", "test-key")
 os.environ.setdefault("QDRANT_URL", "http://localhost:6333")
 os.environ.setdefault("QDRANT_API_KEY", "test-key")
 
 from fastapi.testclient import TestClient
 from app.main import app
+from app.utils import embedding_codec
 
 client = TestClient(app)
 
@@ -43,13 +46,88 @@ def test_moderate_check():
         assert "maxScore" in data
 
 
+def test_moderate_batch():
+    safe = {"nsfw": 0.5, "violence": 0.0, "hate": 0.0, "child_safety": 0.0,
+            "spam": 0.0, "drugs_weapons": 0.0, "explanation": "Safe"}
+    with patch("app.services.moderator.llm.analyze_image", new_callable=AsyncMock) as mock_analyze:
+        mock_analyze.side_effect = [safe, ValueError("bad image"), safe]
+
+        response = client.post(
+            "/api/moderate/batch",
+            json={"items": [{"image_base64": "data:image/jpeg;base64,/9j/test"}] * 3},
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["index"] for r in results] == [0, 1, 2]
+        assert sum(1 for r in results if r["error"]) == 1
+        assert sum(1 for r in results if r["result"] and r["result"]["verdict"] == "allow") == 2
+
+
+def test_moderate_batch_size_limits():
+    response = client.post(
+        "/api/moderate/batch",
+        json={"items": [{"image_base64": "x"}] * 11},
+    )
+    assert response.status_code == 422
+
+
+def test_check_hash_batch():
+    from app.services import hash_blocklist
+    from app.utils.hash_index import HashIndex
+
+    index = HashIndex()
+    index.add("ffff0000ffff0000", {"reason": "nsfw", "blocked_at": "2025-01-01T00:00:00Z"})
+    with (
+        patch.object(hash_blocklist, "_index", index),
+        patch.object(hash_blocklist, "_loaded", True),
+    ):
+        response = client.post(
+            "/api/moderate/check-hash/batch",
+            json={"image_hashes": ["a1b2c3d4e5f60718", "FFFF0000FFFF0001"]},
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["imageHash"] for r in results] == ["a1b2c3d4e5f60718", "ffff0000ffff0001"]
+        assert results[0]["knownBad"] is False
+        assert results[1]["knownBad"] is True
+        assert results[1]["distance"] == 1
+
+
 def test_check_hash():
-    response = client.post("/api/moderate/check-hash", json={"image_hash": "test_hash"})
+    response = client.post("/api/moderate/check-hash", json={"image_hash": "a1b2c3d4e5f60718"})
     assert response.status_code == 200
     assert response.json()["knownBad"] is False
 
 
-def test_analyze_content():
+def test_check_hash_near_match():
+    from app.services import hash_blocklist
+    from app.utils.hash_index import HashIndex
+
+    index = HashIndex()
+    index.add("ffff0000ffff0000", {"reason": "nsfw", "blocked_at": "2025-01-01T00:00:00Z"})
+    with (
+        patch.object(hash_blocklist, "_index", index),
+        patch.object(hash_blocklist, "_loaded", True),
+    ):
+        # Two bits flipped relative to the blocked hash
+        response = client.post("/api/moderate/check-hash", json={"image_hash": "ffff0000ffff0003"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["knownBad"] is True
+        assert data["reason"] == "nsfw"
+        assert data["distance"] == 2
+
+        response = client.post(
+            "/api/moderate/check-hash",
+            json={"image_hash": "ffff0000ffff0003", "max_distance": 1},
+        )
+        assert response.json()["knownBad"] is False
+
+
+@contextmanager
+def analysis_mocks():
     with (
         patch("app.services.content_analyzer.download_image", new_callable=AsyncMock) as mock_download,
         patch("app.services.content_analyzer.image_to_base64") as mock_to_base64,
@@ -57,6 +135,7 @@ def test_analyze_content():
         patch("app.services.content_analyzer.embeddings.generate_embedding", new_callable=AsyncMock) as mock_embed,
         patch("app.services.content_analyzer.vector_db.ensure_collection", new_callable=AsyncMock),
         patch("app.services.content_analyzer.vector_db.upsert_post", new_callable=AsyncMock),
+        patch("app.services.vector_db.search_similar", new_callable=AsyncMock, return_value=[]),
     ):
         mock_download.return_value = b"fake_image_bytes"
         mock_to_base64.return_value = "data:image/jpeg;base64,test"
@@ -71,7 +150,11 @@ def test_analyze_content():
             "alt_text": "Test alt text",
         }
         mock_embed.return_value = [0.1] * 1024
+        yield
+
 
+def test_analyze_content():
+    with analysis_mocks():
         response = client.post(
             "/api/analyze/content",
             json={"content_uri": "ipfs://test", "caption": "Test", "post_id": "test123"},
@@ -82,6 +165,29 @@ def test_analyze_content():
         assert data["description"] == "A test image"
         assert "sceneType" in data
         assert "safetyScore" in data
+        assert len(data["embedding"]) == 1024
+
+
+def test_analyze_content_compact_embedding():
+    with analysis_mocks():
+        response = client.post(
+            "/api/analyze/content",
+            json={"content_uri": "ipfs://test", "post_id": "test123"},
+            headers={"Accept": "application/json; embedding=f16"},
+        )
+        data = response.json()
+        assert data["embedding"] is None and data["embeddingEncoding"] == "f16"
+        assert embedding_codec.decode(data["embeddingBase64"], "f16") == pytest.approx([0.1] * 1024, rel=1e-3)
+
+        # The request flag wins over the Accept header
+        response = client.post(
+            "/api/analyze/content",
+            json={"content_uri": "ipfs://test", "post_id": "test123", "embedding_format": "none"},
+            headers={"Accept": "application/json; embedding=f32"},
+        )
+        data = response.json()
+        assert data["embedding"] is None and data["embeddingBase64"] is None
+        assert data["description"] == "A test image"
 
 
 def test_semantic_search():
@@ -113,9 +219,8 @@ def test_recommend_feed_cold_start():
         patch("app.services.recommender.vector_db.ensure_collection", new_callable=AsyncMock),
         patch("app.services.recommender.vector_db.search_similar", new_callable=AsyncMock) as mock_search,
     ):
-        mock_search.return_value = [
-            {"post_id": "post1", "score": 0.8}
-        ]
+        # Nothing inside the feed window; older posts fill the feed instead
+        mock_search.side_effect = [[], [{"post_id": "post1", "score": 0.8}]]
 
         response = client.post(
             "/api/recommend/feed",
@@ -126,3 +231,39 @@ def test_recommend_feed_cold_start():
         data = response.json()
         assert len(data["recommendations"]) == 1
         assert "tasteProfile" in data
+        assert mock_search.call_args_list[0].kwargs["since"] is not None
+        assert "since" not in mock_search.call_args_list[1].kwargs
+
+
+def test_model_json_response_matches_pydantic_json():
+    from datetime import datetime, timezone
+    from app.api.responses import ModelJSONResponse
+    from app.models.schemas import AnalyzeJobResponse, AnalyzeResponse, RecommendResult
+
+    now = datetime(2025, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+    job = AnalyzeJobResponse(
+        job_id="j1", status="succeeded", created_at=now, updated_at=now,
+        result=AnalyzeResponse(
+            description="d", tags=["t"], scene_type="s", objects=[], mood="m", colors=[],
+            safety_score=9.5, alt_text="a", embedding=[0.1, -0.25],
+        ),
+    )
+    assert json.loads(ModelJSONResponse(job).body) == json.loads(job.model_dump_json(by_alias=True))
+    assert ModelJSONResponse(job).body.count(b'"2025-01-02T03:04:05.678000Z"') == 2
+
+    results = [RecommendResult(post_id="p1", score=0.5, reason="Similar post")]
+    assert json.loads(ModelJSONResponse(results).body) == [{"postId": "p1", "score": 0.5, "reason": "Similar post"}]
+
+
+def test_metrics_endpoint_reports_routes_by_template():
+    with patch("app.main.get_settings") as settings:
+        settings.return_value.environment = "production"
+        settings.return_value.internal_api_key = "secret"
+        client.get("/api/analyze/jobs/missing-job", headers={"X-Internal-API-Key": "secret"})
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE http_request_seconds histogram" in body
+    assert 'http_request_seconds_count{route="/api/analyze/jobs/{job_id}"}' in body
+    assert 'route="/api/analyze/jobs/missing-job"' not in body
@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_bench(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-m", "bench", "--duration", "1", "--warmup", "0", "--posts", "200", "--images", "4",
+         "--dimensions", "64", "--concurrency", "4", "--gemini", "1", "--gemini-pro", "1", "--voyage", "0",
+         "--ipfs", "0", *args],
+        cwd=SERVICE_ROOT, capture_output=True, text=True, timeout=120,
+    )
+
+
+def test_bench_smoke_run_and_compare(tmp_path):
+    out = tmp_path / "run.json"
+    result = run_bench("--mix", "mixed", "--out", str(out))
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(out.read_text())
+    assert set(summary["endpoints"]) == {"analyze", "check_hash", "feed", "moderate", "search", "similar"}
+    assert summary["overall"]["errors"] == 0
+    assert summary["overall"]["count"] > 0 and summary["overall"]["p99_ms"] > 0
+
+    # A much slower Gemini must be flagged against the fast baseline
+    result = run_bench("--mix", "mixed", "--gemini", "50", "--gemini-pro", "50", "--compare", str(out))
+    assert result.returncode == 1
+    assert "REGRESSION" in result.stdout
+
+
+def test_startup_bench(tmp_path):
+    out = tmp_path / "startup.json"
+    result = subprocess.run(
+        [sys.executable, "-m", "bench", "--startup", "--runs", "1", "--vector-store", "local", "--out", str(out)],
+        cwd=SERVICE_ROOT, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(out.read_text())
+    assert summary["eager_modules"] == []
+    assert 0 < summary["phases"]["import_ms"] <= summary["phases"]["ready_ms"]
+    assert set(summary["components"]) == {"gemini", "voyage", "images", "vector_store"}
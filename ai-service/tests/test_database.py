@@ -0,0 +1,125 @@
+import asyncio
+import time
+from contextlib import ExitStack
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.main import app
+from app.services import database, hash_blocklist
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+def _slow_supabase(delay: float, rows: list[dict]):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json=rows)
+
+    return httpx.AsyncClient(base_url="http://supabase.test/rest/v1", transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture
+def slow_supabase():
+    """Point the data-access layer at a fake Supabase that answers after `delay` seconds."""
+    with ExitStack() as stack:
+        def install(delay: float, rows: list[dict] | None = None):
+            for p in (
+                patch.object(database, "is_configured", return_value=True),
+                patch.object(database, "_http_client", _slow_supabase(delay, rows or [])),
+                patch.object(database, "_breaker", CircuitBreaker("supabase", failure_threshold=2, reset_timeout=60)),
+                patch.object(database, "_hash_cache", TTLCache()),
+                patch.object(hash_blocklist, "_loaded", False),
+            ):
+                stack.enter_context(p)
+        yield install
+
+
+@pytest.mark.asyncio
+async def test_slow_hash_check_does_not_block_other_endpoints(slow_supabase):
+    slow_supabase(0.5, [{"image_hash": "a1b2c3d4e5f60718", "reason": "nsfw", "blocked_at": "2025-01-01T00:00:00Z"}])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def timed(coro):
+            start = time.perf_counter()
+            response = await coro
+            return response, time.perf_counter() - start
+
+        hash_checks = [
+            timed(client.post("/api/moderate/check-hash", json={"image_hash": "a1b2c3d4e5f60718"}))
+            for _ in range(5)
+        ]
+        health = timed(client.get("/health"))
+        results = await asyncio.gather(*hash_checks, health)
+
+    health_response, health_elapsed = results[-1]
+    assert health_response.status_code == 200
+    assert health_elapsed < 0.25
+    for response, elapsed in results[:-1]:
+        assert response.json()["knownBad"] is True
+        assert elapsed >= 0.45
+
+
+@pytest.mark.asyncio
+async def test_hash_lookup_is_cached(slow_supabase):
+    slow_supabase(0.2)
+    await database.check_blocked_hash("a1b2c3d4e5f60718")
+    start = time.perf_counter()
+    result = await database.check_blocked_hash("a1b2c3d4e5f60718")
+    assert time.perf_counter() - start < 0.05
+    assert result["known_bad"] is False
+
+
+@pytest.mark.asyncio
+async def test_breaker_serves_snapshot_when_supabase_is_slow(slow_supabase, monkeypatch):
+    monkeypatch.setattr(database.get_settings(), "supabase_timeout_seconds", 0.1)
+    slow_supabase(1.0)
+    for i in range(2):
+        result = await hash_blocklist.check_hash(f"a1b2c3d4e5f6071{i}")
+        assert result["known_bad"] is False
+
+    assert database.get_breaker().state == "open"
+    start = time.perf_counter()
+    result = await hash_blocklist.check_hash("a1b2c3d4e5f60719")
+    assert time.perf_counter() - start < 0.05
+    assert result["known_bad"] is False
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_probe_does_not_wedge_breaker(slow_supabase):
+    slow_supabase(1.0)
+    breaker = database.get_breaker()
+    breaker._trip()
+    breaker._opened_at -= breaker.reset_timeout
+
+    probe = asyncio.create_task(database.check_blocked_hash("a1b2c3d4e5f60718"))
+    await asyncio.sleep(0.05)
+    assert breaker.state == "half_open"
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    # The probe slot is free again, so the next call can settle the breaker
+    assert breaker.allow_request()
+
+
+@pytest.mark.asyncio
+async def test_large_batch_lookup_is_chunked():
+    urls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        urls.append(str(request.url))
+        return httpx.Response(200, json=[{"image_hash": "0" * 127 + "7", "reason": "nsfw", "blocked_at": None}])
+
+    client = httpx.AsyncClient(base_url="http://supabase.test/rest/v1", transport=httpx.MockTransport(handler))
+    hashes = [f"{i:0128x}" for i in range(250)]
+    with (
+        patch.object(database, "is_configured", return_value=True),
+        patch.object(database, "_http_client", client),
+        patch.object(database, "_breaker", CircuitBreaker("supabase")),
+        patch.object(database, "_hash_cache", TTLCache()),
+    ):
+        results = await database.check_blocked_hashes(hashes)
+
+    assert len(urls) == 3 and max(len(url) for url in urls) < 16_000
+    assert len(results) == 250 and results["0" * 127 + "7"]["known_bad"] is True
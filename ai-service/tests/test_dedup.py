@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services import dedup, vector_db
+from app.services.vector_stores.local import LocalVectorStore
+
+DIM = 16
+PHASH = "f0f0f0f0f0f0f0f0"
+
+
+def unit(seed):
+    v = np.random.default_rng(seed).normal(size=DIM)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+def nudge(vector, amount, seed=99):
+    v = np.asarray(vector) + amount * np.asarray(unit(seed))
+    return (v / np.linalg.norm(v)).tolist()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(str(tmp_path), DIM, ivf_min_points=4096, nprobe=8, snapshot_seconds=60)
+    with patch("app.services.vector_stores._store", store):
+        yield store
+
+
+def test_is_duplicate_needs_both_signals():
+    settings = dedup.get_settings()
+    close_hash = "f0f0f0f0f0f0f0f1"
+    far_hash = "0f0f0f0f0f0f0f0f"
+    assert dedup.is_duplicate(settings.dedup_similarity_threshold, PHASH, close_hash)
+    assert not dedup.is_duplicate(settings.dedup_similarity_threshold, PHASH, far_hash)
+    assert not dedup.is_duplicate(settings.dedup_similarity_threshold - 0.01, PHASH, close_hash)
+    # Hash widths that differ never match
+    assert not dedup.is_duplicate(1.0, PHASH, PHASH * 2)
+    # Without a hash only near-identical embeddings count
+    assert dedup.is_duplicate(settings.dedup_similarity_only_threshold, PHASH, None)
+    assert not dedup.is_duplicate(settings.dedup_similarity_threshold, None, None)
+
+
+@pytest.mark.asyncio
+async def test_reposts_join_the_original_cluster(store):
+    original = unit(0)
+    await store.upsert("original", original, {"phash": PHASH, "cluster_id": "original"})
+    await store.upsert("other", unit(1), {"phash": "0123456789abcdef", "cluster_id": "other"})
+
+    repost = await dedup.assign_cluster("repost", nudge(original, 0.1), "f0f0f0f0f0f0f0f1")
+    assert repost.cluster_id == "original" and repost.duplicate_of == "original"
+    await store.upsert("repost", nudge(original, 0.1), {"phash": "f0f0f0f0f0f0f0f1", "cluster_id": "original"})
+
+    # A repost of the repost still joins the original's cluster
+    again = await dedup.assign_cluster("again", nudge(original, 0.1, seed=7), PHASH)
+    assert again.cluster_id == "original"
+
+    # Similar description, different picture: not a duplicate
+    lookalike = await dedup.assign_cluster("lookalike", nudge(original, 0.1), "0f0f0f0f0f0f0f0f")
+    assert lookalike.cluster_id == "lookalike" and lookalike.duplicate_of is None
+
+    results = await vector_db.search_similar(original, limit=10, collapse=True)
+    assert [r["post_id"] for r in results] == ["original", "other"]
+    assert len(await vector_db.search_similar(original, limit=10)) == 3
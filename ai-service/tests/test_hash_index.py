@@ -0,0 +1,38 @@
+import random
+from app.utils.hash_index import MultiIndexHash, HashIndex, hamming_distance
+
+
+def test_multi_index_matches_brute_force():
+    rng = random.Random(42)
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    tree = MultiIndexHash(64)
+    for i, v in enumerate(values):
+        tree.add(v, i)
+
+    for _ in range(200):
+        base = rng.choice(values)
+        # Flip a few random bits to simulate a re-encoded copy
+        query = base
+        for bit in rng.sample(range(64), rng.randint(0, 10)):
+            query ^= 1 << bit
+
+        expected = min(hamming_distance(query, v) for v in values)
+        match = tree.find_nearest(query, 8)
+        if expected <= 8:
+            assert match is not None
+            assert match[0] == expected
+            assert hamming_distance(query, values[match[1]]) == expected
+        else:
+            assert match is None
+
+
+def test_hash_index_exact_and_widths():
+    index = HashIndex()
+    index.add("00000000000000FF", "short")
+    index.add("0" * 62 + "ff", "long")
+
+    assert index.find_nearest("00000000000000ff", 0) == (0, "short")
+    assert index.find_nearest("00000000000000fe", 2) == (1, "short")
+    # Hashes of different widths never match each other
+    assert index.find_nearest("0" * 62 + "fe", 2) == (1, "long")
+    assert index.find_nearest("0000000000000000", 4) is None
@@ -0,0 +1,117 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.main import app
+from app.services import health, llm
+from app.utils import startup
+from app.utils.errors import UpstreamUnavailableError
+
+
+class Probe:
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+        self.error: Exception | None = None
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def probes():
+    fakes = {"vector_store": Probe(), "gemini": Probe(), "voyage": Probe()}
+    health.reset()
+    startup.reset()
+    startup._components["warm"] = startup.Component(ready=True)
+    with patch.dict(health.PROBES, fakes, clear=True):
+        yield fakes
+    health.reset()
+    startup.reset()
+
+
+@pytest.mark.asyncio
+async def test_dependency_marked_down_sheds_calls_and_required_ones_fail_readiness(probes):
+    await health.probe_all()
+    assert health.readiness()[0] == 200
+
+    # Gemini is not required by default: the instance stays in rotation
+    probes["gemini"].error = ConnectionError("connection refused")
+    for _ in range(get_settings().health_down_after):
+        await health.probe_all()
+    status_code, body = health.readiness()
+    assert status_code == 200 and "failing" not in body
+    gemini = body["dependencies"]["gemini"]
+    assert gemini["status"] == "down" and gemini["lastError"] == "connection refused"
+    assert gemini["errorRate"] == pytest.approx(3 / 4)
+    assert body["dependencies"]["voyage"]["status"] == "up"
+
+    # Calls fail fast instead of queueing for a slot
+    with patch.object(llm, "_client", None), pytest.raises(UpstreamUnavailableError) as excinfo:
+        await llm.generate_text("hello")
+    assert excinfo.value.status_code == 503 and "Retry-After" in excinfo.value.headers
+
+    probes["gemini"].error = None
+    await health.probe_all()
+    assert health.readiness()[0] == 200
+    assert health.status("gemini") == "degraded"  # still erroring over the window
+    health.check_available("gemini")
+
+    probes["vector_store"].error = ConnectionError("connection refused")
+    for _ in range(get_settings().health_down_after):
+        await health.probe_all()
+    status_code, body = health.readiness()
+    assert status_code == 503 and body["failing"] == ["vector_store"]
+
+
+@pytest.mark.asyncio
+async def test_slow_and_timed_out_probes(probes):
+    probes["voyage"].delay = 0.05
+    probes["vector_store"].delay = 1.0
+    with (
+        patch.object(get_settings(), "health_slow_seconds", 0.01),
+        patch.object(get_settings(), "health_probe_timeout_seconds", 0.1),
+    ):
+        await health.probe_all()
+    deps = health.readiness()[1]["dependencies"]
+    assert deps["voyage"]["status"] == "degraded" and deps["voyage"]["p95Ms"] >= 50
+    assert deps["vector_store"]["lastError"] == "timeout"
+    assert deps["vector_store"]["errorRate"] == 1.0
+
+
+def test_ready_endpoint_answers_from_cache(probes):
+    client = TestClient(app)
+    for _ in range(5):
+        response = client.get("/ready")
+        assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+    assert all(p.calls == 0 for p in probes.values())
+
+
+@pytest.mark.asyncio
+async def test_voyage_is_probed_only_when_idle_or_not_up(probes):
+    await health.probe_all()
+    assert probes["voyage"].calls == 1
+
+    # Real traffic keeps it current; further rounds skip the paid probe
+    health.record("voyage", True, 0.05)
+    for _ in range(3):
+        await health.probe_all()
+    assert probes["voyage"].calls == 1 and probes["gemini"].calls == 4
+
+    with patch.object(get_settings(), "health_idle_probe_seconds", 0.0):
+        await health.probe_all()
+    assert probes["voyage"].calls == 2
+
+    # Failing real calls mark it down; then it is probed every round to see it recover
+    for _ in range(get_settings().health_down_after):
+        health.record("voyage", False, 0.05, "503 Service Unavailable")
+    assert health.status("voyage") == "down"
+    await health.probe_all()
+    assert probes["voyage"].calls == 3
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from google.genai import errors
+
+from app.services import llm
+from app.utils.limiter import AdaptiveLimiter
+from tests.fake_gemini import FakeGemini
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Install a FakeGemini with fresh per-model limiters and breakers."""
+    settings = llm.get_settings()
+    monkeypatch.setattr(settings, "gemini_initial_concurrency", 4)
+    monkeypatch.setattr(settings, "gemini_max_queue_seconds", 5.0)
+    monkeypatch.setattr(settings, "gemini_breaker_failure_threshold", 3)
+    monkeypatch.setattr(settings, "gemini_breaker_reset_seconds", 0.2)
+
+    def install(**kwargs) -> FakeGemini:
+        fake = FakeGemini(**kwargs)
+        monkeypatch.setattr(llm, "_client", fake)
+        return fake
+
+    with patch.object(llm, "_limiters", {}), patch.object(llm, "_breakers", {}):
+        yield install
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(gemini):
+    fake = gemini(latency=0.1)
+    await asyncio.gather(*(llm.generate_text("hi") for _ in range(20)))
+    assert fake.calls == 20
+    # Starts at 4 and grows slowly while latency stays under target
+    assert fake.max_in_flight <= 6
+
+
+@pytest.mark.asyncio
+async def test_sheds_with_503_when_queue_time_exceeds_target(gemini, monkeypatch):
+    monkeypatch.setattr(llm.get_settings(), "gemini_max_queue_seconds", 0.2)
+    fake = gemini(latency=1.0)
+
+    async def call():
+        start = time.perf_counter()
+        try:
+            await llm.generate_text("hi")
+            return None, time.perf_counter() - start
+        except llm.UpstreamUnavailableError as e:
+            return e, time.perf_counter() - start
+
+    results = await asyncio.gather(*(call() for _ in range(12)))
+    shed = [(e, elapsed) for e, elapsed in results if e is not None]
+    assert len(shed) == 8
+    assert fake.calls == 4
+    for e, elapsed in shed:
+        assert e.status_code == 503
+        assert int(e.headers["Retry-After"]) >= 1
+        assert elapsed < 0.5
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_shrink_the_limit(gemini, monkeypatch):
+    monkeypatch.setattr(llm.get_settings(), "gemini_target_latency_seconds", 0.05)
+    gemini(latency=0.1)
+    await asyncio.gather(*(llm.generate_text("hi") for _ in range(4)))
+    assert llm.get_limiter(llm.get_settings().gemini_flash_model).limit < 4
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_then_recovers_through_half_open_probe(gemini):
+    fake = gemini(error_rate=1.0)
+    for _ in range(3):
+        with pytest.raises(errors.ServerError):
+            await llm.generate_text("hi")
+
+    with pytest.raises(llm.UpstreamUnavailableError):
+        await llm.generate_text("hi")
+    assert fake.calls == 3
+
+    await asyncio.sleep(0.25)
+    fake.error_rate = 0.0
+    await llm.generate_text("hi")
+    assert llm.get_breaker(llm.get_settings().gemini_flash_model).state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_trip_the_breaker(gemini):
+    fake = gemini(error_rate=1.0, error_code=400)
+    breaker = llm.get_breaker(llm.get_settings().gemini_flash_model)
+    for _ in range(5):
+        with pytest.raises(errors.ClientError):
+            await llm.generate_text("hi")
+    assert breaker.state == "closed" and fake.calls == 5
+
+    # Rate limiting is the upstream's distress signal and does count
+    fake.error_code = 429
+    for _ in range(3):
+        with pytest.raises(errors.ClientError):
+            await llm.generate_text("hi")
+    assert breaker.is_open()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_calls_leave_limit_and_breaker_intact(gemini):
+    gemini(latency=1.0)
+    model = llm.get_settings().gemini_flash_model
+    limiter, breaker = llm.get_limiter(model), llm.get_breaker(model)
+
+    async def cancel_call():
+        task = asyncio.create_task(llm.generate_text("hi"))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    for _ in range(5):
+        await cancel_call()
+    assert limiter.limit == 4 and limiter.in_flight == 0
+
+    # A cancelled half-open probe is handed back, so the next call can close the breaker
+    breaker._trip()
+    breaker._opened_at -= breaker.reset_timeout
+    await cancel_call()
+    assert breaker.state == "half_open" and breaker.allow_request()
+    breaker.release_probe()
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_as_the_queue_timeout_fires_is_kept():
+    limiter = AdaptiveLimiter("test", initial_limit=1, max_queue_time=0.05)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    # Block the loop past both timers so the grant and the timeout run in the
+    # same iteration, grant first
+    asyncio.get_running_loop().call_later(0.01, limiter.release, 0.0)
+    time.sleep(0.1)
+    await waiter
+    assert limiter.in_flight == 1 and limiter.shed_count == 0
+    limiter.release(0.0)
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_rerank_falls_back_when_shed(gemini):
+    gemini(error_rate=1.0)
+    items = [{"post_id": str(i), "description": "x"} for i in range(5)]
+    for _ in range(3):
+        with pytest.raises(errors.ServerError):
+            await llm.rerank_results("q", items, top_k=3)
+    assert await llm.rerank_results("q", items, top_k=3) == items[:3]
+
+
+def test_open_breaker_returns_503_from_endpoint(gemini):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    gemini()
+    breaker = llm.get_breaker(llm.get_settings().gemini_flash_model)
+    for _ in range(3):
+        breaker.record_failure()
+
+    response = TestClient(app).post("/api/search/semantic", json={"query": "cats", "rerank": False})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
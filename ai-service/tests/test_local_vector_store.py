@@ -0,0 +1,151 @@
+import threading
+import uuid
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.config import get_settings
+from app.services import vector_db
+from app.services.vector_stores.local import LocalIndex, LocalVectorStore
+
+DIM = 32
+
+
+def random_vectors(n, seed=0, clusters=20):
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIM))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, DIM))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_search_filter_and_exclude(tmp_path):
+    index = LocalIndex(str(tmp_path), DIM)
+    vectors = random_vectors(50)
+    for i, v in enumerate(vectors):
+        index.upsert(f"p{i}", v.tolist(), {"creator_wallet": "alice" if i % 2 else "bob"})
+
+    results = index.search(vectors[3].tolist(), limit=5)
+    assert results[0]["post_id"] == "p3"
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+    results = index.search(vectors[3].tolist(), limit=5, creator_filter="bob")
+    assert results and all(r["creator_wallet"] == "bob" for r in results)
+
+    results = index.search(vectors[3].tolist(), limit=5, exclude_ids=["p3"])
+    assert "p3" not in {r["post_id"] for r in results}
+    assert len(results) == 5
+
+
+def test_since_filter_and_recency_boost(tmp_path):
+    index = LocalIndex(str(tmp_path), DIM)
+    vectors = random_vectors(20)
+    for i, v in enumerate(vectors):
+        index.upsert(f"p{i}", v.tolist(), {"timestamp": 1000 + i, "creator_wallet": "alice" if i % 2 else "bob"})
+
+    results = index.search(vectors[0].tolist(), limit=20, since=1010)
+    assert {r["post_id"] for r in results} == {f"p{i}" for i in range(10, 20)}
+    results = index.search(vectors[0].tolist(), limit=20, since=1010, creator_filter="bob")
+    assert {r["post_id"] for r in results} == {f"p{i}" for i in range(10, 20, 2)}
+
+    # Equal similarity: the newer post wins; much older posts decay away
+    half_life = get_settings().recency_half_life_seconds
+    now = 1_000_000_000
+    results = [
+        {"post_id": "old", "score": 0.8, "timestamp": now - 10 * half_life},
+        {"post_id": "new", "score": 0.8, "timestamp": now - half_life},
+        {"post_id": "unknown", "score": 0.8},
+    ]
+    boosted = vector_db.recency_boost(results, now=now)
+    assert [r["post_id"] for r in boosted] == ["new", "old", "unknown"]
+    weight = get_settings().recency_weight
+    assert boosted[0]["score"] == pytest.approx((1 - weight) * 0.8 + weight * 0.5)
+
+
+def test_upsert_replaces_existing_post(tmp_path):
+    index = LocalIndex(str(tmp_path), DIM)
+    vectors = random_vectors(2)
+    index.upsert("p", vectors[0].tolist(), {"creator_wallet": "alice"})
+    index.upsert("p", vectors[1].tolist(), {"creator_wallet": "bob"})
+    assert len(index) == 1
+    assert index.search(vectors[1].tolist(), limit=1, creator_filter="alice") == []
+    [post] = index.retrieve(["p", "missing"])
+    assert np.allclose(post["embedding"], vectors[1], atol=1e-6)
+
+
+def test_ivf_recall_against_exact(tmp_path):
+    index = LocalIndex(str(tmp_path), DIM, ivf_min_points=500, nprobe=8)
+    vectors = random_vectors(3000, seed=1)
+    for i, v in enumerate(vectors):
+        index.upsert(str(i), v.tolist(), {})
+    index.wait_for_training()
+    assert index._centroids is not None
+
+    recalls = []
+    for q in random_vectors(20, seed=2):
+        exact = {r["post_id"] for r in index.search(q.tolist(), limit=10, exact=True)}
+        approx = {r["post_id"] for r in index.search(q.tolist(), limit=10)}
+        recalls.append(len(exact & approx) / 10)
+    assert np.mean(recalls) >= 0.9
+
+
+def test_ivf_trains_on_a_tiny_store(tmp_path):
+    index = LocalIndex(str(tmp_path), DIM, ivf_min_points=4)
+    vectors = random_vectors(6, seed=3)
+    for i, v in enumerate(vectors):
+        index.upsert(str(i), v.tolist(), {})
+    index.wait_for_training()
+    assert index._centroids is not None and len(index._centroids) <= 6
+    assert index.search(vectors[5].tolist(), limit=1)[0]["post_id"] == "5"
+
+
+def test_training_runs_once_in_the_background(tmp_path):
+    index = LocalIndex(str(tmp_path), DIM, ivf_min_points=4)
+    vectors = random_vectors(20, seed=4)
+    runs = []
+    release = threading.Event()
+    train = index.train
+
+    def slow_train():
+        runs.append(len(index))
+        release.wait(5)
+        train()
+
+    with patch.object(index, "train", side_effect=slow_train):
+        # Every upsert past the threshold returns while the first run is still going
+        for i, v in enumerate(vectors):
+            index.upsert(str(i), v.tolist(), {})
+        assert runs == [4] and index._centroids is None
+        release.set()
+        index.wait_for_training()
+    assert index._centroids is not None
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = LocalIndex(str(tmp_path), DIM, ivf_min_points=100)
+    vectors = random_vectors(1500)  # grows past the initial capacity
+    for i, v in enumerate(vectors):
+        index.upsert(str(i), v.tolist(), {"creator_wallet": f"c{i % 3}"})
+    index.close()
+
+    reloaded = LocalIndex(str(tmp_path), DIM, ivf_min_points=100)
+    assert len(reloaded) == 1500
+    assert reloaded._centroids is not None
+    results = reloaded.search(vectors[1200].tolist(), limit=3, creator_filter="c0")
+    assert results[0]["post_id"] == "1200"
+
+
+@pytest.mark.asyncio
+async def test_vector_db_facade_uses_local_store(tmp_path):
+    store = LocalVectorStore(str(tmp_path), DIM, ivf_min_points=4096, nprobe=8, snapshot_seconds=60)
+    with patch("app.services.vector_stores._store", store):
+        await vector_db.ensure_collection()
+        post_id = str(uuid.uuid4())
+        vector = random_vectors(1)[0].tolist()
+        await vector_db.upsert_post(post_id, vector, {"description": "sunset"})
+        [hit] = await vector_db.search_similar(vector, limit=1)
+        assert hit["post_id"] == post_id and hit["description"] == "sunset"
+        assert (await vector_db.get_posts_by_ids([post_id]))[0]["post_id"] == post_id
+        await vector_db.close()
+    assert (tmp_path / "state.json").exists()
@@ -0,0 +1,62 @@
+import asyncio
+import socket
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import metrics
+from app.utils.image import validate_url_for_ssrf
+from app.utils.loop_monitor import LoopMonitor
+
+
+def slow_dns(host, port, *args, **kwargs):
+    time.sleep(0.25)
+    return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", ("93.184.216.34", port))]
+
+
+async def download_with_blocking_dns():
+    await asyncio.sleep(0.05)
+    validate_url_for_ssrf("https://gateway.example/ipfs/cid")
+
+
+@pytest.mark.asyncio
+async def test_stall_is_attributed_to_the_blocking_app_frame():
+    metrics.reset()
+    monitor = LoopMonitor(interval=0.01, threshold=0.05)
+    heartbeat = asyncio.create_task(monitor.run())
+    try:
+        with patch("socket.getaddrinfo", slow_dns):
+            await asyncio.create_task(download_with_blocking_dns(), name="analyze-request")
+        await asyncio.sleep(0.05)
+    finally:
+        heartbeat.cancel()
+
+    report = monitor.report()
+    assert report["slow_callbacks"] == 1
+    stall = report["recent"][0]
+    assert stall["duration_ms"] >= 150
+    assert stall["task"] == "analyze-request (download_with_blocking_dns)"
+    assert stall["site"].startswith("app/utils/image.py:") and stall["site"].endswith("in validate_url_for_ssrf")
+    # Frames below our code show what it was stuck in
+    assert stall["samples"][0][-1].endswith("in slow_dns")
+    assert report["sites"][0]["site"] == stall["site"]
+    assert metrics.counter("event_loop_slow_callbacks_total").value == 1
+    assert metrics.histogram("event_loop_lag_seconds").count > 0
+
+
+@pytest.mark.asyncio
+async def test_healthy_loop_records_no_stalls():
+    monitor = LoopMonitor(interval=0.01, threshold=0.05)
+    heartbeat = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.2)
+    heartbeat.cancel()
+    assert monitor.report()["slow_callbacks"] == 0
+
+
+def test_debug_endpoint():
+    response = TestClient(app).get("/api/debug/event-loop")
+    assert response.status_code == 200
+    assert {"maxLagMs", "slowCallbacks", "sites", "recent"} <= response.json().keys()
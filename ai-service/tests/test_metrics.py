@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils import metrics
+from app.utils.cache import TTLCache
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.mark.asyncio
+async def test_instrument_records_latency_and_error_kinds():
+    @metrics.instrument("llm.test")
+    async def call(exc=None):
+        if exc:
+            raise exc
+        return "ok"
+
+    assert await call() == "ok"
+    for exc in (asyncio.TimeoutError(), HTTPException(504), HTTPException(503), ValueError()):
+        with pytest.raises(type(exc)):
+            await call(exc)
+
+    assert metrics.histogram("stage_seconds", stage="llm.test").count == 5
+    assert metrics.gauge("stage_in_flight", stage="llm.test").value == 0
+    errors = {dict(labels)["kind"]: c.value for labels, c in metrics.collect("stage_errors_total").items()}
+    assert errors == {"timeout": 2, "unavailable": 1, "error": 1}
+
+
+def test_instrument_wraps_sync_functions():
+    double = metrics.instrument("phash")(lambda x: x * 2)
+    assert double(2) == 4
+    assert metrics.histogram("stage_seconds", stage="phash").count == 1
+
+
+def test_render_prometheus_text_format():
+    metrics.counter("requests_total", route='/a"b').inc(3)
+    metrics.histogram("stage_seconds", stage="x").observe(0.003)
+    cache = TTLCache(name="test")
+    cache.set("k", 1, ttl=60)
+    cache.get("k")
+    cache.get("missing")
+
+    text = metrics.render_prometheus()
+    assert "# TYPE requests_total counter\nrequests_total{route=\"/a\\\"b\"} 3\n" in text
+    assert 'stage_seconds_bucket{stage="x",le="0.001"} 0' in text
+    assert 'stage_seconds_bucket{stage="x",le="0.005"} 1' in text
+    assert 'stage_seconds_bucket{stage="x",le="+Inf"} 1' in text
+    assert 'stage_seconds_count{stage="x"} 1' in text
+    assert 'cache_hit_ratio{cache="test"} 0.5' in text
+    assert text.endswith("\n")
@@ -0,0 +1,155 @@
+import asyncio
+import base64
+import time
+from io import BytesIO
+from unittest.mock import patch, AsyncMock
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services import moderator
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.hash_index import HashIndex
+
+SAFE = {"nsfw": 0.0, "violence": 0.0, "hate": 0.0, "child_safety": 0.0,
+        "spam": 0.0, "drugs_weapons": 0.0, "explanation": "Safe"}
+
+
+def _image(quality: int = 90, shift: int = 0) -> str:
+    img = Image.new("RGB", (128, 128), "white")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((20 + shift, 20, 100 + shift, 100), fill="navy")
+    draw.rectangle((60, 10, 120, 50), fill="orange")
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+@pytest.fixture(autouse=True)
+def fresh_cascade():
+    metrics.reset()
+    with (
+        patch.object(moderator, "_decision_cache", TTLCache()),
+        patch.object(moderator, "_known_allowed", HashIndex()),
+        patch.object(moderator, "_known_blocked", HashIndex()),
+        patch.object(moderator, "_escalated", HashIndex()),
+    ):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_repeat_and_near_duplicate_skip_gemini():
+    with patch("app.services.moderator.llm.analyze_image", new_callable=AsyncMock) as mock_analyze:
+        mock_analyze.return_value = SAFE
+
+        first = await moderator.moderate_content(_image(), "sunset")
+        assert first.tier == "flash"
+
+        again = await moderator.moderate_content(_image(), "sunset")
+        assert again.tier == "hash"
+        assert again.verdict == "allow"
+
+        # Re-encoded copy with a different caption: near match on the allowed set
+        reencoded = await moderator.moderate_content(_image(quality=40), "same pic")
+        assert reencoded.tier == "hash"
+
+        assert mock_analyze.await_count == 1
+
+    stats = moderator.tier_stats()
+    assert stats["total"] == 3
+    assert stats["gemini_calls_avoided"] == 2
+    assert stats["tiers"]["hash"]["hit_rate"] == pytest.approx(2 / 3)
+
+
+@pytest.mark.asyncio
+async def test_risky_caption_still_goes_to_gemini():
+    with patch("app.services.moderator.llm.analyze_image", new_callable=AsyncMock) as mock_analyze:
+        mock_analyze.return_value = SAFE
+
+        await moderator.moderate_content(_image(), "sunset")
+        result = await moderator.moderate_content(_image(), "free sol airdrop, dm me")
+        assert result.tier == "flash"
+        assert mock_analyze.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_escalation_to_pro():
+    risky = {**SAFE, "violence": 5.0}
+    with patch("app.services.moderator.llm.analyze_image", new_callable=AsyncMock) as mock_analyze:
+        mock_analyze.side_effect = [risky, {**risky, "violence": 7.0}]
+
+        result = await moderator.moderate_content(_image())
+        assert result.tier == "pro"
+        assert result.verdict == "block"
+        assert [c.kwargs["use_thinking"] for c in mock_analyze.await_args_list] == [False, True]
+
+
+@pytest.mark.asyncio
+async def test_caption_driven_block_does_not_mark_the_image():
+    hateful = {**SAFE, "hate": 9.0}
+    with patch("app.services.moderator.llm.analyze_image", new_callable=AsyncMock) as mock_analyze:
+        mock_analyze.side_effect = [hateful, hateful, SAFE]
+
+        blocked = await moderator.moderate_content(_image(), "hateful caption")
+        assert blocked.verdict == "block" and blocked.blocked_category == "hate"
+        # Same image, clean caption: the model decides again
+        clean = await moderator.moderate_content(_image(), "sunset")
+        assert clean.tier == "flash" and clean.verdict == "allow"
+
+
+@pytest.mark.asyncio
+async def test_image_driven_block_marks_near_duplicates():
+    nsfw = {**SAFE, "nsfw": 9.0}
+    with patch("app.services.moderator.llm.analyze_image", new_callable=AsyncMock) as mock_analyze:
+        mock_analyze.side_effect = [nsfw, nsfw]
+
+        blocked = await moderator.moderate_content(_image(), "beach")
+        assert blocked.verdict == "block" and blocked.blocked_category == "nsfw"
+        again = await moderator.moderate_content(_image(quality=40), "other caption")
+        assert again.tier == "hash" and again.verdict == "block"
+        assert mock_analyze.await_count == 2
+
+
+def _fake_gemini(flash: dict, pro: dict, flash_delay: float, pro_delay: float, calls: list):
+    async def analyze_image(image_base64, prompt, use_thinking=False, **kwargs):
+        calls.append(("pro" if use_thinking else "flash", kwargs.get("response_schema")))
+        try:
+            await asyncio.sleep(pro_delay if use_thinking else flash_delay)
+        except asyncio.CancelledError:
+            calls.append(("cancelled", None))
+            raise
+        return pro if use_thinking else flash
+    return analyze_image
+
+
+@pytest.mark.asyncio
+async def test_speculative_escalation_runs_pro_in_parallel(monkeypatch):
+    monkeypatch.setattr(moderator.get_settings(), "moderation_speculative_escalation", True)
+    risky = {**SAFE, "spam": 6.0}
+    calls: list = []
+    fake = _fake_gemini(risky, {**risky, "spam": 8.0}, flash_delay=0.2, pro_delay=0.3, calls=calls)
+    with patch("app.services.moderator.llm.analyze_image", side_effect=fake):
+        start = time.perf_counter()
+        result = await moderator.moderate_content(_image(), "giveaway, dm me")
+        elapsed = time.perf_counter() - start
+
+    assert result.tier == "pro"
+    assert result.verdict == "block"
+    # Sequential would be ~0.5s
+    assert elapsed < 0.45
+    assert all(schema is moderator.ModerationModelOutput for _, schema in calls)
+
+
+@pytest.mark.asyncio
+async def test_speculative_pro_cancelled_when_flash_is_clean(monkeypatch):
+    monkeypatch.setattr(moderator.get_settings(), "moderation_speculative_escalation", True)
+    calls: list = []
+    fake = _fake_gemini(SAFE, SAFE, flash_delay=0.05, pro_delay=1.0, calls=calls)
+    with patch("app.services.moderator.llm.analyze_image", side_effect=fake):
+        result = await moderator.moderate_content(_image(), "free sol airdrop")
+        await asyncio.sleep(0)
+
+    assert result.tier == "flash"
+    assert sorted(c[0] for c in calls[:2]) == ["flash", "pro"]
+    assert calls[-1][0] == "cancelled"
@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services import neighbors
+from app.services.neighbors import NeighborIndex, compute_neighbors
+from app.services.vector_stores.local import LocalVectorStore
+
+DIM = 16
+K = 5
+
+
+def random_vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(str(tmp_path / "vectors"), DIM, ivf_min_points=4096, nprobe=8, snapshot_seconds=60)
+    with (
+        patch("app.services.vector_stores._store", store),
+        patch.object(neighbors, "_index", NeighborIndex(K)),
+        patch.object(neighbors.get_settings(), "neighbor_k", K),
+        patch.object(neighbors.get_settings(), "neighbor_index_path", str(tmp_path / "neighbors.npz")),
+    ):
+        yield store
+
+
+def test_compute_neighbors_matches_brute_force_across_chunks():
+    vectors = random_vectors(200)
+    ids, scores = compute_neighbors(vectors, K, chunk_rows=7)
+
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    expected = np.argsort(-sims, axis=1)[:, :K]
+    assert ids.dtype == np.int32 and scores.dtype == np.float16
+    assert (ids == expected).all()
+    assert np.allclose(scores, np.take_along_axis(sims, expected, axis=1), atol=1e-2)
+
+
+def test_compute_neighbors_pads_small_collections():
+    ids, _ = compute_neighbors(random_vectors(3), K, chunk_rows=10)
+    assert (ids[:, 2:] == -1).all()
+    assert set(ids[0, :2]) == {1, 2}
+
+
+def test_offer_keeps_best_k():
+    index = NeighborIndex(2)
+    index.set_neighbors("a", [("b", 0.5), ("c", 0.4)])
+    index.set_neighbors("d", [("a", 0.9)])
+    # d beats a's weakest entry (c) and is inserted in score order
+    assert index.similar("a", 10) == [("d", pytest.approx(0.9, abs=1e-3)), ("b", pytest.approx(0.5, abs=1e-3))]
+    # b only appears in other lists, so it has no list of its own yet
+    assert "b" not in index and "a" in index
+
+
+def test_merge_ranks_shared_neighbors_first():
+    index = NeighborIndex(3)
+    index.set_neighbors("x", [("shared", 0.6), ("only_x", 0.9)])
+    index.set_neighbors("y", [("shared", 0.6), ("only_y", 0.5)])
+    merged = index.merge(["x", "y"], limit=10, exclude={"only_y"})
+    assert [post_id for post_id, _ in merged] == ["shared", "only_x"]
+    assert merged[0][1] == pytest.approx(0.6, abs=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_then_incremental_add(store):
+    vectors = random_vectors(40)
+    for i, v in enumerate(vectors[:39]):
+        await store.upsert(f"p{i}", v.tolist(), {})
+
+    index = await neighbors.rebuild()
+    assert len(index) == 39
+    sims = vectors[:39] @ vectors[0]
+    sims[0] = -np.inf
+    assert [post_id for post_id, _ in index.similar("p0", K)] == [f"p{i}" for i in np.argsort(-sims)[:K]]
+
+    # A new post close to p0 enters p0's list without a rebuild
+    near = vectors[0] + 0.01 * vectors[39]
+    near /= np.linalg.norm(near)
+    await store.upsert("new", near.tolist(), {})
+    await neighbors.add_post("new", near.tolist())
+    assert (await neighbors.similar_posts("p0", 1)) == [("new", pytest.approx(1.0, abs=1e-2))]
+    assert (await neighbors.similar_posts("new", 1))[0][0] == "p0"
+    assert await neighbors.similar_posts("missing", 5) is None
+
+    # The saved snapshot is the rebuilt index, before "new" was added
+    reloaded = NeighborIndex.load(neighbors.get_settings().neighbor_index_path)
+    assert len(reloaded) == 39 and "new" not in reloaded
+    expected, _ = compute_neighbors(vectors[:39], K, chunk_rows=39)
+    assert [post_id for post_id, _ in reloaded.similar("p5", K)] == [f"p{i}" for i in expected[5]]
+
+
+@pytest.mark.asyncio
+async def test_posts_indexed_elsewhere_are_added_on_demand(store):
+    vectors = random_vectors(12)
+    for i, v in enumerate(vectors[:10]):
+        await store.upsert(f"p{i}", v.tolist(), {})
+    await neighbors.rebuild()
+
+    # Written by another instance after the rebuild: no lists yet
+    for i in (10, 11):
+        await store.upsert(f"p{i}", vectors[i].tolist(), {})
+    assert await neighbors.ensure_indexed(["p10", "p11", "missing"]) == ["p10", "p11"]
+    assert len(neighbors.get_index().similar("p11", K)) == K
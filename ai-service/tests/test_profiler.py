@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import profiler
+
+
+def spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_cpu_profile_collapses_busy_thread_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        stacks, samples = profiler.sample_cpu(0.2, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert samples >= 10
+    lines = stacks.splitlines()
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy
+    stack, count = busy[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert "spin (tests/test_profiler.py:" in stack
+    # Parked threads are left out by default; this one waits in join()
+    assert not any(line.startswith("MainThread;") for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_memory_profile_weights_stacks_by_bytes():
+    kept = []
+
+    async def allocate():
+        await asyncio.sleep(0.02)
+        kept.append([bytearray(4096) for _ in range(100)])
+
+    task = asyncio.create_task(allocate())
+    stacks, total = await profiler.profile_memory(0.1)
+    await task
+
+    assert total >= 400_000
+    top, size = stacks.splitlines()[0].rsplit(" ", 1)
+    assert top.split(";")[-1] == "tests/test_profiler.py:44"
+    assert int(size) >= 400_000
+
+
+@pytest.mark.asyncio
+async def test_only_one_profile_runs_at_a_time():
+    running = asyncio.create_task(profiler.profile_memory(0.1))
+    await asyncio.sleep(0.01)
+    with pytest.raises(HTTPException) as excinfo:
+        await profiler.profile_cpu(0.1, 0.01)
+    assert excinfo.value.status_code == 409
+    await running
+    await profiler.profile_cpu(0.02, 0.01)
+
+
+def test_profile_endpoint():
+    client = TestClient(app)
+    response = client.get("/api/debug/profile/cpu", params={"seconds": 0.05, "include_idle": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["x-profile-samples"]) > 0
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in response.text.splitlines())
+
+    assert client.get("/api/debug/profile/memory", params={"seconds": 3600}).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_cancelled_profile_keeps_the_claim_until_its_thread_ends():
+    request = asyncio.create_task(profiler.profile_cpu(0.2, 0.01))
+    await asyncio.sleep(0.02)
+    request.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await request
+
+    # The sampler thread is still running, so a second profile is refused
+    with pytest.raises(HTTPException) as excinfo:
+        await profiler.profile_memory(0.01)
+    assert excinfo.value.status_code == 409
+    await asyncio.sleep(0.3)
+    await profiler.profile_memory(0.01)
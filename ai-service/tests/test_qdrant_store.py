@@ -0,0 +1,171 @@
+import uuid
+from unittest.mock import patch
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import BinaryQuantization, Disabled, Distance, ScalarQuantization, VectorParams
+
+from app.config import get_settings
+from app.services.vector_stores import qdrant as qdrant_store
+
+
+@pytest.fixture
+def qdrant():
+    client = AsyncQdrantClient(location=":memory:")
+    with (
+        patch.object(qdrant_store, "_client", client),
+        patch.object(qdrant_store, "_named_vectors", {}),
+        patch.object(qdrant_store, "_ensured", set()),
+    ):
+        yield client
+
+
+def test_quantization_config_from_settings():
+    assert isinstance(qdrant_store.quantization_config("scalar"), ScalarQuantization)
+    assert qdrant_store.quantization_config("scalar").scalar.always_ram
+    assert isinstance(qdrant_store.quantization_config("binary"), BinaryQuantization)
+    assert qdrant_store.quantization_config("none") is None
+
+    params = qdrant_store.search_params()
+    settings = get_settings()
+    assert params.hnsw_ef == settings.qdrant_hnsw_ef
+    assert params.quantization.oversampling == settings.qdrant_oversampling
+    assert params.quantization.rescore is True
+
+
+@pytest.mark.asyncio
+async def test_search_filters_by_creator_time_and_excludes_ids(qdrant):
+    await qdrant_store.ensure_collection()
+    dims = get_settings().voyage_dimensions
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    for i, (post_id, creator) in enumerate(zip(ids, ["alice", "bob", "alice"])):
+        vector = [0.0] * dims
+        vector[i] = 1.0
+        vector[3] = 1.0
+        await qdrant_store.upsert_post(post_id, vector, {"creator_wallet": creator, "timestamp": 100 * (i + 1)})
+
+    query = [0.0] * dims
+    query[0] = 1.0
+    results = await qdrant_store.search_similar(query, limit=10, creator_filter="alice")
+    assert [r["post_id"] for r in results] == [ids[0], ids[2]]
+
+    results = await qdrant_store.search_similar(query, limit=10, exclude_ids=[ids[0]])
+    assert ids[0] not in {r["post_id"] for r in results}
+    assert len(results) == 2
+
+    results = await qdrant_store.search_similar(query, limit=10, since=200)
+    assert {r["post_id"] for r in results} == {ids[1], ids[2]}
+
+
+@pytest.mark.asyncio
+async def test_migrate_applies_settings(qdrant):
+    await qdrant_store.ensure_collection()
+    with patch.object(get_settings(), "qdrant_quantization", "none"):
+        with patch.object(qdrant, "update_collection", wraps=qdrant.update_collection) as update:
+            await qdrant_store.migrate_collection()
+    kwargs = update.call_args.kwargs
+    assert kwargs["quantization_config"] == Disabled.DISABLED
+    assert kwargs["hnsw_config"].m == get_settings().qdrant_hnsw_m
+
+
+def test_coarse_vector_is_normalized_prefix():
+    dims = get_settings().qdrant_coarse_dimensions
+    coarse = qdrant_store.coarse_vector([3.0, 4.0] + [0.0] * 2000)
+    assert len(coarse) == dims
+    assert coarse[:2] == [0.6, 0.8]
+
+
+@pytest.mark.asyncio
+async def test_new_collections_store_full_and_coarse_vectors(qdrant):
+    settings = get_settings()
+    await qdrant_store.ensure_collection()
+    info = await qdrant.get_collection(settings.qdrant_collection)
+    vectors = info.config.params.vectors
+    assert vectors[qdrant_store.FULL_VECTOR].size == settings.voyage_dimensions
+    assert vectors[qdrant_store.COARSE_VECTOR].size == settings.qdrant_coarse_dimensions
+
+    post_id = str(uuid.uuid4())
+    embedding = [1.0] * settings.voyage_dimensions
+    await qdrant_store.upsert_post(post_id, embedding, {})
+    [post] = await qdrant_store.get_posts_by_ids([post_id])
+    assert len(post["embedding"]) == settings.voyage_dimensions
+
+
+@pytest.mark.asyncio
+async def test_legacy_single_vector_collection_still_served(qdrant):
+    settings = get_settings()
+    await qdrant.create_collection(
+        settings.qdrant_collection,
+        vectors_config=VectorParams(size=settings.voyage_dimensions, distance=Distance.COSINE),
+    )
+    await qdrant_store.ensure_collection()
+
+    post_id = str(uuid.uuid4())
+    await qdrant_store.upsert_post(post_id, [1.0] * settings.voyage_dimensions, {})
+    results = await qdrant_store.search_similar([1.0] * settings.voyage_dimensions, limit=5)
+    assert [r["post_id"] for r in results] == [post_id]
+
+
+@pytest.mark.asyncio
+async def test_collapse_groups_by_cluster_and_migrate_backfills_it(qdrant):
+    await qdrant_store.ensure_collection()
+    dims = get_settings().voyage_dimensions
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    for i, post_id in enumerate(ids):
+        vector = [0.0] * dims
+        vector[0] = 1.0
+        vector[i + 1] = 0.1 * (i + 1)
+        # ids[1] reposts ids[0]; ids[2] predates dedup and has no cluster
+        payload = {"cluster_id": ids[0]} if i < 2 else {}
+        await qdrant_store.upsert_post(post_id, vector, payload)
+
+    query = [0.0] * dims
+    query[0] = 1.0
+    results = await qdrant_store.search_similar(query, limit=10, collapse=True)
+    assert [r["post_id"] for r in results] == [ids[0]]
+
+    await qdrant_store.migrate_collection()
+    results = await qdrant_store.search_similar(query, limit=10, collapse=True)
+    assert [r["post_id"] for r in results] == [ids[0], ids[2]]
+    assert results[1]["cluster_id"] == ids[2]
+
+
+@pytest.mark.asyncio
+async def test_backfill_timestamps_from_lookup(qdrant):
+    await qdrant_store.ensure_collection()
+    dims = get_settings().voyage_dimensions
+    legacy, unknown, current = (str(uuid.uuid4()) for _ in range(3))
+    await qdrant_store.upsert_post(legacy, [1.0] * dims, {"timestamp": 0})
+    await qdrant_store.upsert_post(unknown, [1.0] * dims, {})
+    await qdrant_store.upsert_post(current, [1.0] * dims, {"timestamp": 123})
+    looked_up = []
+
+    async def lookup(post_ids):
+        looked_up.extend(post_ids)
+        return {legacy: "2025-01-01T00:00:00+00:00"} if legacy in post_ids else {}
+
+    collection = get_settings().qdrant_collection
+    assert await qdrant_store.backfill_timestamps(qdrant, collection, lookup, batch_size=1) == 1
+    assert sorted(looked_up) == sorted([legacy, unknown])
+    posts = {p["post_id"]: p for p in await qdrant_store.get_posts_by_ids([legacy, unknown, current])}
+    assert posts[legacy]["timestamp"] == 1735689600
+    assert "timestamp" not in posts[unknown]
+    assert posts[current]["timestamp"] == 123
+
+
+@pytest.mark.asyncio
+async def test_ensure_collection_backfills_clusters_of_existing_collection(qdrant):
+    await qdrant_store.ensure_collection()
+    dims = get_settings().voyage_dimensions
+    legacy = str(uuid.uuid4())
+    await qdrant_store.upsert_post(legacy, [1.0] * dims, {})
+
+    # Next process start: the collection exists and holds a pre-dedup point.
+    # A search that learns the vector layout first must not skip the backfill
+    qdrant_store._named_vectors.clear()
+    qdrant_store._ensured.clear()
+    await qdrant_store.search_similar([1.0] * dims, limit=5)
+    await qdrant_store.ensure_collection()
+    results = await qdrant_store.search_similar([1.0] * dims, limit=5, collapse=True)
+    assert [r["post_id"] for r in results] == [legacy]
+    assert results[0]["cluster_id"] == legacy
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import scheduler
+from app.utils.errors import UpstreamUnavailableError
+from app.utils.request_context import Priority, priority_for_request
+
+
+def make_scheduler(capacity=4, reserved=None, weights=None):
+    return scheduler.WeightedFairScheduler(
+        capacity=capacity,
+        reserved=reserved or {},
+        weights=weights or {Priority.INTERACTIVE: 8, Priority.STANDARD: 4, Priority.BACKGROUND: 1},
+    )
+
+
+@pytest.mark.asyncio
+async def test_reserved_slots_keep_interactive_unblocked():
+    sched = make_scheduler(capacity=4, reserved={Priority.INTERACTIVE: 1})
+    for _ in range(3):
+        await sched.acquire(Priority.BACKGROUND, max_wait=1)
+
+    # Shared pool (3 slots) is full: more background work has to queue
+    with pytest.raises(UpstreamUnavailableError):
+        await sched.acquire(Priority.BACKGROUND, max_wait=0.05)
+
+    # ...but moderation still gets its reserved slot immediately
+    await asyncio.wait_for(sched.acquire(Priority.INTERACTIVE, max_wait=1), timeout=0.1)
+    assert sched.in_flight[Priority.INTERACTIVE] == 1
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_weighted_fair_order():
+    sched = make_scheduler(capacity=1)
+    await sched.acquire(Priority.STANDARD, max_wait=1)
+    order = []
+
+    async def call(priority):
+        await sched.acquire(priority, max_wait=5)
+        order.append(priority)
+        sched.release(priority)
+
+    tasks = [asyncio.create_task(call(Priority.BACKGROUND)) for _ in range(2)]
+    tasks += [asyncio.create_task(call(Priority.INTERACTIVE)) for _ in range(8)]
+    await asyncio.sleep(0)
+    sched.release(Priority.STANDARD)
+    await asyncio.gather(*tasks)
+
+    # Background is behind, not starved: its first call is served among the
+    # interactive ones and its second once interactive's share is used up
+    first_background = order.index(Priority.BACKGROUND)
+    assert 0 < first_background < 9
+    assert order[-1] == Priority.BACKGROUND
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped():
+    sched = make_scheduler(capacity=1)
+    await sched.acquire(Priority.STANDARD, max_wait=1)
+    cancelled = asyncio.create_task(sched.acquire(Priority.BACKGROUND, max_wait=5))
+    waiting = asyncio.create_task(sched.acquire(Priority.BACKGROUND, max_wait=5))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    sched.release(Priority.STANDARD)
+    await asyncio.wait_for(waiting, timeout=0.5)
+    assert sched.in_flight[Priority.BACKGROUND] == 1
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_as_the_deadline_passes_is_not_leaked():
+    sched = make_scheduler(capacity=1)
+    await sched.acquire(Priority.STANDARD, max_wait=1)
+    waiter = asyncio.create_task(sched.acquire(Priority.BACKGROUND, max_wait=0.05))
+    await asyncio.sleep(0)
+
+    # Block the loop past both timers so the grant and the deadline run in the
+    # same iteration, grant first
+    asyncio.get_running_loop().call_later(0.01, sched.release, Priority.STANDARD)
+    time.sleep(0.1)
+    # Python 3.11 returns the grant; 3.12 raises the timeout instead
+    try:
+        await waiter
+        held = 1
+    except UpstreamUnavailableError:
+        held = 0
+    assert sched.in_flight[Priority.BACKGROUND] == held
+
+
+def test_priority_header_overrides_route():
+    assert priority_for_request("/api/analyze", None) == Priority.BACKGROUND
+    assert priority_for_request("/api/analyze", "interactive") == Priority.INTERACTIVE
+    assert priority_for_request("/api/moderate", "Background") == Priority.BACKGROUND
+    assert priority_for_request("/api/moderate", "urgent") == Priority.INTERACTIVE
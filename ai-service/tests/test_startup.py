@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import embeddings, llm, vector_db
+from app.utils import startup
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_importing_the_app_defers_heavy_sdks():
+    code = (
+        "import json, sys, app.main\n"
+        "from app.utils import startup\n"
+        "print(json.dumps([m for m in startup.HEAVY_MODULES if m in sys.modules]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=os.environ.copy(),
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    assert json.loads(result.stdout) == []
+
+
+@pytest.mark.asyncio
+async def test_warm_up_retries_failed_components_then_reports_ready():
+    startup.reset()
+    ensure = AsyncMock(side_effect=[ConnectionError("refused"), None])
+    build_gemini = MagicMock(side_effect=[RuntimeError("transient"), object()])
+    with (
+        patch.object(vector_db, "ensure_collection", ensure),
+        patch.object(startup, "RETRY_INITIAL_SECONDS", 0.01),
+        patch.object(llm, "_get_client", build_gemini),
+        patch.object(embeddings, "_client", object()),
+    ):
+        background = AsyncMock()
+        waiting = asyncio.create_task(startup.after_warm_up(background))
+        await startup.warm_up()
+        await waiting
+
+    report = startup.report()
+    assert report["ready"] and report["ready_ms"] is not None
+    assert report["components"]["vector_store"]["attempts"] == 2
+    assert report["components"]["vector_store"]["error"] is None
+    assert report["components"]["gemini"]["attempts"] == 2
+    background.assert_awaited_once()
+    startup.reset()
+
+
+def test_liveness_and_readiness():
+    startup.reset()
+    client = TestClient(app)
+    assert client.get("/health").status_code == 200
+
+    startup._components["vector_store"] = startup.Component()
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting", "components": {"vector_store": False}}
+
+    startup._components["vector_store"].ready = True
+    assert client.get("/ready").status_code == 200
+    assert client.get("/api/debug/startup").json()["ready"] is True
+    startup.reset()
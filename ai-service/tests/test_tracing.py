@@ -0,0 +1,91 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import tracing
+
+client = TestClient(app)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    tracing._get_buffer().clear()
+    yield
+    tracing._get_buffer().clear()
+
+
+def test_parse_traceparent():
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+    assert tracing.parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert tracing.parse_traceparent(f"ff-{TRACE_ID}-{PARENT_ID}-01") is None
+    assert tracing.parse_traceparent("00-xyz-abc-01") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_request_id_becomes_trace_id():
+    trace = tracing.start_trace("GET /x", None, "8c1d5d5e-0a3c-4a4e-9d2a-6a1e3c4b5f60")
+    assert trace.trace_id == "8c1d5d5e0a3c4a4e9d2a6a1e3c4b5f60"
+    assert tracing.start_trace("GET /x", None, "not-a-uuid").trace_id != "not-a-uuid"
+
+
+def search_pipeline():
+    store = MagicMock()
+    store.search = AsyncMock(return_value=[{"post_id": "post1", "score": 0.9, "description": "Test post"}])
+    store.ensure_collection = AsyncMock()
+    return (
+        patch("app.services.llm._generate", new_callable=AsyncMock, return_value=SimpleNamespace(text="Expanded")),
+        patch("app.services.embeddings._embed", new_callable=AsyncMock, return_value=[[0.1] * 8]),
+        patch("app.services.vector_db.get_store", return_value=store),
+    )
+
+
+def test_sampled_search_is_traced_and_exported(tmp_path):
+    llm_patch, embed_patch, store_patch = search_pipeline()
+    export = tmp_path / "traces.jsonl"
+    with llm_patch, embed_patch, store_patch:
+        response = client.post(
+            "/api/search/semantic",
+            json={"query": "test query", "limit": 10, "rerank": False},
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01", "X-Request-ID": "req-1"},
+        )
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == "req-1"
+    timing = response.headers["Server-Timing"]
+    for stage in ("total", "semantic_search.search", "llm.generate_text", "embeddings.generate_query_embedding",
+                  "vector_db.search_similar"):
+        assert f"{stage};dur=" in timing
+
+    spans = {s["name"]: s for s in tracing._get_buffer()}
+    root = spans["POST /api/search/semantic"]
+    assert root["traceId"] == TRACE_ID and root["parentId"] == PARENT_ID and root["kind"] == "SERVER"
+    assert spans["semantic_search.search"]["parentId"] == root["id"]
+    assert spans["llm.generate_text"]["parentId"] == spans["semantic_search.search"]["id"]
+    assert spans["vector_db.search_similar"]["tags"]["size"] == "1"
+    assert spans["semantic_search.search"]["tags"]["results"] == "1"
+
+    settings = SimpleNamespace(trace_export_path=str(export), trace_export_url="")
+    with patch("app.utils.tracing.get_settings", return_value=settings):
+        assert asyncio.run(tracing.flush()) == len(spans)
+    lines = [json.loads(line) for line in export.read_text().splitlines()]
+    assert {s["traceId"] for s in lines} == {TRACE_ID}
+
+
+def test_unsampled_requests_still_get_server_timing():
+    llm_patch, embed_patch, store_patch = search_pipeline()
+    with llm_patch, embed_patch, store_patch, patch("app.utils.tracing.random.random", return_value=1.0):
+        response = client.post(
+            "/api/search/semantic",
+            json={"query": "test query", "limit": 10, "rerank": False},
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"},
+        )
+    assert "llm.generate_text;dur=" in response.headers["Server-Timing"]
+    assert len(tracing._get_buffer()) == 0
@@ -2,7 +2,7 @@ import { Response } from 'express';
 import { AuthenticatedRequest } from '../types/index.js';
 import { supabase } from '../config/supabase.js';
 import { cacheService } from '../services/cache.service.js';
-import { aiService } from '../services/ai.service.js';
+import { aiService, aiRequestContext } from '../services/ai.service.js';
 import { AppError } from '../middleware/errorHandler.js';
 import { logger } from '../utils/logger.js';
 
@@ -53,7 +53,8 @@ export const feedController = {
         wallet,
         likedPostIds,
         limit * 2, // Request more to account for filtering
-        seenPostIds
+        seenPostIds,
+        aiRequestContext(req)
       );
       
       recommendedPostIds = recommendations.recommendations.map(r => r.postId);
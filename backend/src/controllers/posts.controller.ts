@@ -4,7 +4,7 @@ import { AuthenticatedRequest } from '../types/index.js';
 import { supabase } from '../config/supabase.js';
 import { cacheService } from '../services/cache.service.js';
 import { ipfsService } from '../services/ipfs.service.js';
-import { aiService } from '../services/ai.service.js';
+import { aiService, aiRequestContext } from '../services/ai.service.js';
 import { solanaService } from '../services/solana.service.js';
 import { realtimeService } from '../services/realtime.service.js';
 import { AppError } from '../middleware/errorHandler.js';
@@ -39,14 +39,14 @@ export const postsController = {
       throw new AppError(400, 'CONTENT_BLOCKED', `Content blocked: ${blocked.reason}`);
     }
     
-    const hashCheck = await aiService.checkHash(imageHash);
+    const hashCheck = await aiService.checkHash(imageHash, aiRequestContext(req));
     if (hashCheck.knownBad) {
       throw new AppError(400, 'CONTENT_BLOCKED', `Content blocked: ${hashCheck.reason}`);
     }
     
     const base64 = file.buffer.toString('base64');
     const imageBase64 = `data:${file.mimetype};base64,${base64}`;
-    const moderationResult = await aiService.moderateContent(imageBase64, req.body.caption, wallet);
+    const moderationResult = await aiService.moderateContent(imageBase64, req.body.caption, wallet, aiRequestContext(req));
     
     if (moderationResult.verdict === 'block') {
       await supabase.from('content_violations').insert({
@@ -109,7 +109,7 @@ export const postsController = {
     
     await supabase.rpc('increment_user_stat', { wallet_addr: wallet, stat_name: 'post_count' });
     
-    await addJob('ai-analysis' as const, { postId, contentUri, caption, creatorWallet: wallet });
+    await addJob('ai-analysis' as const, { postId, contentUri, caption, creatorWallet: wallet, requestId: req.id });
     await addJob('notification' as const, { type: 'new_post', postId, creatorWallet: wallet });
     
     await cacheService.invalidateUser(wallet);
@@ -1,7 +1,7 @@
 import { Response } from 'express';
 import { AuthenticatedRequest } from '../types/index.js';
 import { supabase } from '../config/supabase.js';
-import { aiService } from '../services/ai.service.js';
+import { aiService, aiRequestContext } from '../services/ai.service.js';
 import { cacheService } from '../services/cache.service.js';
 import { AppError } from '../middleware/errorHandler.js';
 import { logger } from '../utils/logger.js';
@@ -22,7 +22,7 @@ export const searchController = {
       return;
     }
     
-    const searchResults = await aiService.semanticSearch(query, limit, rerank);
+    const searchResults = await aiService.semanticSearch(query, limit, rerank, aiRequestContext(req));
     
     logger.debug({ 
       query, 
@@ -9,10 +9,12 @@ interface AIAnalysisData {
   contentUri: string;
   caption?: string;
   creatorWallet?: string;
+  // X-Request-ID of the upload, so the analysis shows up in the same trace
+  requestId?: string;
 }
 
 export async function processAIAnalysis(job: Job<AIAnalysisData>) {
-  const { postId, contentUri, caption, creatorWallet } = job.data;
+  const { postId, contentUri, caption, creatorWallet, requestId } = job.data;
   
   logger.info({ postId, contentUri }, 'Processing AI analysis');
   
@@ -28,7 +30,7 @@ export async function processAIAnalysis(job: Job<AIAnalysisData>) {
   }
   
   try {
-    const analysis = await aiService.analyzeContent(contentUri, caption, postId, wallet);
+    const analysis = await aiService.analyzeContent(contentUri, caption, postId, wallet, { requestId });
     
     // Update post with AI analysis results
     await supabase
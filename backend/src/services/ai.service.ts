@@ -1,3 +1,4 @@
+import type { Request } from 'express';
 import { env } from '../config/env.js';
 import { logger } from '../utils/logger.js';
 import type { 
@@ -9,11 +10,32 @@ import type {
 
 const AI_SERVICE_TIMEOUT = 30000; // 30 seconds
 
+/**
+ * Correlation IDs of the request that triggered an AI service call.
+ * The AI service uses them as its trace context, so its logs and spans
+ * line up with the backend request.
+ */
+export interface AIRequestContext {
+  requestId?: string;
+  traceparent?: string;
+}
+
+/**
+ * Correlation IDs of an incoming Express request (see requestIdMiddleware).
+ */
+export function aiRequestContext(req: Request): AIRequestContext {
+  return {
+    requestId: req.id,
+    traceparent: req.headers['traceparent'] as string | undefined,
+  };
+}
+
 /**
  * Build headers for AI service requests.
- * Includes internal API key for service-to-service authentication if configured.
+ * Includes internal API key for service-to-service authentication if configured,
+ * and the caller's X-Request-ID and traceparent when given.
  */
-function getAIServiceHeaders(): Record<string, string> {
+function getAIServiceHeaders(context?: AIRequestContext): Record<string, string> {
   const headers: Record<string, string> = { 
     'Content-Type': 'application/json' 
   };
@@ -22,6 +44,13 @@ function getAIServiceHeaders(): Record<string, string> {
     headers['X-Internal-API-Key'] = env.AI_SERVICE_API_KEY;
   }
   
+  if (context?.requestId) {
+    headers['X-Request-ID'] = context.requestId;
+  }
+  if (context?.traceparent) {
+    headers['traceparent'] = context.traceparent;
+  }
+  
   return headers;
 }
 
@@ -102,7 +131,12 @@ export const aiService = {
    * 
    * Includes retry logic for transient failures before failing closed.
    */
-  async moderateContent(imageBase64: string, caption?: string, wallet?: string): Promise<ModerationResult> {
+  async moderateContent(
+    imageBase64: string,
+    caption?: string,
+    wallet?: string,
+    context?: AIRequestContext
+  ): Promise<ModerationResult> {
     const startTime = Date.now();
     const maxRetries = 2;
     
@@ -110,7 +144,7 @@ export const aiService = {
       try {
         const response = await fetchWithTimeout(`${env.AI_SERVICE_URL}/api/moderate/check`, {
           method: 'POST',
-          headers: getAIServiceHeaders(),
+          headers: getAIServiceHeaders(context),
           body: JSON.stringify({ 
             image_base64: imageBase64, 
             caption: caption || null,
@@ -123,8 +157,11 @@ export const aiService = {
           
           // Retry on 5xx server errors, but not on 4xx client errors
           if (response.status >= 500 && attempt < maxRetries) {
-            logger.warn({ status: response.status, attempt }, 'AI moderation service error, retrying...');
-            await new Promise(resolve => setTimeout(resolve, 1000 * attempt)); // Exponential backoff
+            // A shed request (503) says when to come back; cap it so uploads are not held for long
+            const retryAfter = Number(response.headers.get('retry-after'));
+            const delayMs = retryAfter > 0 ? Math.min(retryAfter * 1000, 5000) : 1000 * attempt;
+            logger.warn({ status: response.status, attempt, delayMs }, 'AI moderation service error, retrying...');
+            await new Promise(resolve => setTimeout(resolve, delayMs));
             continue;
           }
           
@@ -181,12 +218,13 @@ export const aiService = {
     contentUri: string, 
     caption?: string, 
     postId?: string, 
-    creatorWallet?: string
+    creatorWallet?: string,
+    context?: AIRequestContext
   ): Promise<AIAnalysis> {
     try {
       const response = await fetchWithTimeout(`${env.AI_SERVICE_URL}/api/analyze/content`, {
         method: 'POST',
-        headers: getAIServiceHeaders(),
+        headers: getAIServiceHeaders(context),
         body: JSON.stringify({ 
           content_uri: contentUri, 
           caption: caption || null, 
@@ -230,12 +268,13 @@ export const aiService = {
   async semanticSearch(
     query: string, 
     limit = 50, 
-    rerank = true
+    rerank = true,
+    context?: AIRequestContext
   ): Promise<SemanticSearchResult> {
     try {
       const response = await fetchWithTimeout(`${env.AI_SERVICE_URL}/api/search/semantic`, {
         method: 'POST',
-        headers: getAIServiceHeaders(),
+        headers: getAIServiceHeaders(context),
         body: JSON.stringify({ query, limit, rerank }),
       });
       
@@ -273,12 +312,13 @@ export const aiService = {
     userWallet: string,
     likedPostIds: string[] = [],
     limit = 50,
-    excludeSeen: string[] = []
+    excludeSeen: string[] = [],
+    context?: AIRequestContext
   ): Promise<RecommendationResult> {
     try {
       const response = await fetchWithTimeout(`${env.AI_SERVICE_URL}/api/recommend/feed`, {
         method: 'POST',
-        headers: getAIServiceHeaders(),
+        headers: getAIServiceHeaders(context),
         body: JSON.stringify({
           user_wallet: userWallet,
           liked_post_ids: likedPostIds,
@@ -316,11 +356,11 @@ export const aiService = {
   /**
    * Check perceptual hash against blocked content database
    */
-  async checkHash(imageHash: string): Promise<{ knownBad: boolean; reason?: string; blockedAt?: string }> {
+  async checkHash(imageHash: string, context?: AIRequestContext): Promise<{ knownBad: boolean; reason?: string; blockedAt?: string }> {
     try {
       const response = await fetchWithTimeout(`${env.AI_SERVICE_URL}/api/moderate/check-hash`, {
         method: 'POST',
-        headers: getAIServiceHeaders(),
+        headers: getAIServiceHeaders(context),
         body: JSON.stringify({ image_hash: imageHash }),
       }, 5000); // Shorter timeout for hash check
       
@@ -341,11 +381,14 @@ export const aiService = {
   },
 
   /**
-   * Health check for AI service
+   * Health check for AI service. Uses /ready, which fails while the service
+   * is warming up or its vector store is down; /health only shows that the
+   * process is up. Gemini or Voyage outages do not fail it: calls that need
+   * them get a 503 instead.
    */
   async healthCheck(): Promise<boolean> {
     try {
-      const response = await fetchWithTimeout(`${env.AI_SERVICE_URL}/health`, {
+      const response = await fetchWithTimeout(`${env.AI_SERVICE_URL}/ready`, {
         method: 'GET',
       }, 5000);
       return response.ok;